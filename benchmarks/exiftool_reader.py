@@ -0,0 +1,84 @@
+"""
+    Micro benchmark of the ExifTool.execute output reader
+
+    Compares the previous reader, which concatenated bytes objects and re-stripped
+    the tail after every 4096 byte read, with modules.exiftool.OutputReader.
+    Output is simulated by a writer thread feeding a pipe, like a exiftool process would.
+
+    Run from the repository root:
+        python -m benchmarks.exiftool_reader [--skip-legacy-above BYTES]
+"""
+import argparse
+import os
+import threading
+from time import perf_counter
+
+from modules.exiftool import OutputReader, sentinel
+
+SIZES = (('1 KB', 1024), ('1 MB', 1024 ** 2), ('50 MB', 50 * 1024 ** 2))
+WRITE_SIZE = 64 * 1024
+
+
+def legacy_reader(fd):
+    output = b""
+    while not output[-32:].strip().endswith(sentinel):
+        output += os.read(fd, 4096)
+    return output.strip()[:-len(sentinel)]
+
+
+def buffer_reader(fd):
+    reader = OutputReader(sentinel)
+    while not reader.feed(os.read(fd, reader.block_size)):
+        pass
+    return reader.getvalue()
+
+
+def _writer(fd, payload):
+    with memoryview(payload) as view:
+        for pos in range(0, len(view), WRITE_SIZE):
+            os.write(fd, view[pos:pos + WRITE_SIZE])
+
+
+def measure(read_func, payload: bytes) -> float:
+    read_fd, write_fd = os.pipe()
+    writer = threading.Thread(target=_writer, args=(write_fd, payload))
+
+    try:
+        start = perf_counter()
+        writer.start()
+        result = read_func(read_fd)
+        elapsed = perf_counter() - start
+        writer.join()
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+    assert len(result) == len(payload) - len(sentinel) - 1, 'Reader returned unexpected output'
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--skip-legacy-above', type=int, default=0,
+                        help='Do not run the legacy reader for outputs larger than this many bytes')
+    args = parser.parse_args()
+
+    print(f'{"Output":>8} {"legacy":>12} {"buffer":>12} {"speedup":>9}')
+
+    for name, size in SIZES:
+        # JSON like content without any sentinel, terminated by the sentinel line
+        line = b'"XMP:Title": "Lorem ipsum dolor sit amet",\n'
+        payload = (line * (size // len(line) + 1))[:size] + sentinel + b'\n'
+
+        buffer_time = measure(buffer_reader, payload)
+
+        if args.skip_legacy_above and size > args.skip_legacy_above:
+            print(f'{name:>8} {"skipped":>12} {buffer_time:>11.4f}s {"-":>9}')
+            continue
+
+        legacy_time = measure(legacy_reader, payload)
+        print(f'{name:>8} {legacy_time:>11.4f}s {buffer_time:>11.4f}s {legacy_time / buffer_time:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
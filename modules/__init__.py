@@ -4,19 +4,26 @@
     Imported only -ONCE- from main.
 """
 from multiprocessing import Queue
+from modules.app_globals import HEADLESS
 from modules.settings import TiffySettings
-from modules.log import init_logging, setup_logging
+from modules.log import init_logging, setup_cli_logging, setup_logging
 
-logging_queue = Queue(-1)
-setup_logging(logging_queue)
-LOGGER = init_logging('knecht_init')
+if HEADLESS:
+    # Command line runs are configured by their arguments, see modules.cli
+    logging_queue = None
+    setup_cli_logging()
+    LOGGER = init_logging('knecht_init')
+else:
+    logging_queue = Queue(-1)
+    setup_logging(logging_queue)
+    LOGGER = init_logging('knecht_init')
 
-TiffySettings.log_queue = logging_queue
-TiffySettings.load_ui_resources()
+    TiffySettings.log_queue = logging_queue
+    TiffySettings.load_ui_resources()
 
-try:
-    TiffySettings.load()
-except Exception as e:
-    LOGGER.error('Error loading settings from file!\n%s', e)
+    try:
+        TiffySettings.load()
+    except Exception as e:
+        LOGGER.error('Error loading settings from file!\n%s', e)
 
 LOGGER.info('Knecht modules initialisation method finished.')
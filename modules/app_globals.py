@@ -14,6 +14,9 @@ LOG_FILE_NAME = 'tiffy.log'
 SETTINGS_FILE = 'settings.json'
 SETTINGS_DIR_NAME = 'tiffy'
 
+# Set by the command line entry point, skips GUI resources, Qt logging and translation catalogs
+HEADLESS = bool(os.environ.get('TIFFY_HEADLESS'))
+
 
 def get_exif_executable():
     if os.name == 'nt':
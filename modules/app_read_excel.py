@@ -1,11 +1,10 @@
 from pathlib import Path
 from time import time
-from openpyxl import load_workbook, worksheet
-from openpyxl.utils import column_index_from_string
 from PyQt5.QtCore import QThread, QObject, pyqtSignal
 from PyQt5.QtWidgets import QTreeWidgetItem
 
 from modules import TiffySettings
+from modules.excel_reader import ExcelReader
 from modules.exif_worker import Exif
 from modules.widgets.file_dialog import FileDialog
 from modules.detect_language import get_translation
@@ -113,55 +112,5 @@ class ReadExcel(QObject):
         super(ReadExcel, self).__init__()
 
     def get_data(self, file):
-        ws = self.load(file)
-        return self.read_worksheet(ws)
-
-    def read_worksheet(self, ws):
-        # Find start row behind header
-        for start_row in range(ws.min_row, ws.max_row):
-            row_value = ws.cell(start_row, ws.min_column).value
-            if row_value:
-                break
-        else:
-            start_row = 1
-
-        self.num_items.emit(ws.max_row - start_row)
-        excel_data = dict()
-        file_name = ''
-
-        for row in range(start_row, ws.max_row + 1):
-            for result in self._read_columns(row, ws):
-                key, value = result
-
-                if key == 'file':
-                    file_name = value
-                    excel_data[file_name] = dict()
-                    continue
-
-                if not file_name:
-                    continue
-
-                excel_data[file_name].update({key: value})
-
-            LOGGER.debug('%s - %s', file_name, excel_data[file_name])
-            self.progress.emit()
-
-        return excel_data
-
-    @staticmethod
-    def load(file) -> worksheet:
-        wb = load_workbook(file)
-        return wb.active
-
-    @staticmethod
-    def _read_columns(row, ws):
-        for sheet_map in Exif.spreadsheet_map.items():
-            key, column = sheet_map
-
-            if not column:
-                yield key, None
-                continue
-
-            col = column_index_from_string(column)
-
-            yield key, ws.cell(row, col).value
+        reader = ExcelReader(Exif.spreadsheet_map, self.progress.emit, self.num_items.emit)
+        return reader.get_data(file)
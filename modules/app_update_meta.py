@@ -1,12 +1,13 @@
-import fnmatch
-import re
-from typing import Union
 from pathlib import Path
 from PyQt5.QtWidgets import QTreeWidgetItem
-from PyQt5.QtCore import QObject, QTimer, pyqtSignal, QThread
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal
 
+from modules import engine
 from modules.widgets.message_box import GenericMsgBox, QuestionBox
 from modules.exif_worker import Exif
+from modules.exif_result import ExifResult, ExifRunSummary
+from modules.job_planner import JobPlanner
+from modules.run_journal import RunJournal
 from modules.detect_language import get_translation
 from modules.log import init_logging
 
@@ -19,23 +20,62 @@ _ = lang.gettext
 
 
 class ImgMetaDataApp(QObject):
+    # Emitted once the run was finished by close_exif_worker
+    closed = pyqtSignal()
+
     update_dpi = False
     dpi_res_x = '300.0'
     dpi_res_y = '300.0'
     dpi_unit = '2'  # 3=cm 2=inches
-    dpi_tags = ['-ResolutionUnit', '-XResolution', '-YResolution']
+    dpi_tags = JobPlanner.dpi_tags
 
     ignored_name_patterns = ('_VERSO?$', '_RECTO?$')
     ignore_last_digits = True
 
+    # Only write files whose current values differ from the values to write
+    skip_unchanged = True
+
+    # Skip files unmodified since Tiffy wrote the same values to them, see StateCache
+    use_state_cache = True
+
+    # Apply all files with a single exiftool -json= import per thread instead of batched round trips
+    bulk_import = False
+
+    # Start the exiftool processes in the background when the window is shown or the image path changes
+    warm_up_exiftool = True
+
+    # Record planned and completed files to resume interrupted runs, see RunJournal
+    use_journal = True
+
+    # Write files on network shares as local copies and copy them back, see Stager
+    stage_network_files = False
+    # Bytes of local scratch space for staged files
+    staging_budget = 4 * 1024 ** 3
+
+    # Milliseconds between pulling the results of a run and maximum number of results per pull
+    poll_interval = 50
+    poll_items = 500
+
     def __init__(self, ui):
         super(ImgMetaDataApp, self).__init__(ui)
         self.ui = ui
 
-        self.exif_worker = None
+        # Running engine.Run
+        self.exif_run = None
+        self.progress_ready = False
         self.update_from_excel = True
+        self.closing = False
+
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(self.poll_interval)
+        self.poll_timer.timeout.connect(self.poll_results)
 
         self.ui.startBtn.pressed.connect(self.start_exif_worker)
+        self.ui.img_dir.path_changed.connect(self.warm_up)
+
+    def warm_up(self, *args):
+        if self.warm_up_exiftool:
+            Exif.warm_up(QThread.idealThreadCount())
 
     def start_exif_worker(self):
         self.ui.tabWidget.setCurrentIndex(0)
@@ -49,9 +89,7 @@ class ImgMetaDataApp(QObject):
 
     def finish_exif_worker(self):
         self.ui.tabWidget.setCurrentIndex(1)
-
-        if self.exif_worker:
-            self.exif_worker.exit()
+        self.poll_timer.stop()
 
         self.ui.startBtn.setEnabled(True)
         self.ui.progress_widget.progress.hide()
@@ -88,15 +126,103 @@ class ImgMetaDataApp(QObject):
 
         return True
 
-    def run_exif_app(self):
-        self.exif_worker = ImgMetaDataWorker(self, self.ui.img_dir.path, self.ui.excel_data, self.update_from_excel)
+    def is_running(self) -> bool:
+        return bool(self.exif_run and not self.exif_run.finished)
+
+    def is_paused(self) -> bool:
+        return self.is_running() and self.exif_run.paused
+
+    def pause_exif_worker(self, paused: bool):
+        if not self.is_running():
+            return
+
+        if paused:
+            self.exif_run.pause()
+            self.ui.statusBar().showMessage(_('Vorgang pausiert.'))
+        else:
+            self.exif_run.resume()
+            self.ui.statusBar().showMessage(_('Vorgang fortgesetzt.'), 8000)
+
+    def cancel_exif_worker(self):
+        """ Drop the queued files, files in progress are completed """
+        if not self.is_running():
+            return
+
+        self.ui.statusBar().showMessage(_('Vorgang wird abgebrochen ...'))
+        self.exif_run.cancel()
+
+    def close_exif_worker(self) -> bool:
+        """
+            Cancel the run, the files in progress are completed and the journal is closed
+            in the background. Returns True if the run is still finishing, closed is emitted
+            once it finished.
+        """
+        self.closing = True
+        if not self.is_running():
+            return False
+
+        self.cancel_exif_worker()
+        return True
+
+    def resume_last_run(self):
+        """ Start a run with the files of the last interrupted run that did not complete """
+        if self.is_running():
+            return
 
-        self.exif_worker.num_items.connect(self.setup_progress)
-        self.exif_worker.result.connect(self.update_progress)
-        self.exif_worker.finish_process.connect(self.finish_exif_worker)
-        self.exif_worker.msg.connect(self.message)
+        try:
+            journal_file = RunJournal.last_unfinished()
+        except OSError as e:
+            LOGGER.error('Could not read run journals: %s', e)
+            journal_file = None
 
-        self.exif_worker.start()
+        if not journal_file:
+            self.message(_('Es wurde kein unvollständiger Vorgang gefunden.'))
+            return
+
+        self.ui.tabWidget.setCurrentIndex(0)
+        self.ui.startBtn.setEnabled(False)
+        self.run_exif_app(journal_file)
+
+    def run_exif_app(self, resume_journal: Path=None):
+        self.exif_run = engine.run(self.create_job(resume_journal))
+        self.progress_ready = False
+        self.poll_timer.start()
+
+    def create_job(self, resume_journal: Path=None) -> engine.Job:
+        """ Engine job of the current data and settings """
+        rows = self.ui.excel_data if self.update_from_excel and not resume_journal else None
+        images = (self.ui.img_dir.path,) if not resume_journal else ()
+
+        return engine.Job(
+            rows, images, dpi=(self.dpi_res_x, self.dpi_res_y) if self.update_dpi else None, dpi_unit=self.dpi_unit,
+            ignored_name_patterns=self.ignored_name_patterns, ignore_last_digits=self.ignore_last_digits,
+            recursive=Exif.recursive, include=Exif.include_patterns, exclude=Exif.exclude_patterns,
+            skip_unchanged=self.skip_unchanged, use_state_cache=self.use_state_cache, journal=self.use_journal,
+            resume_journal=resume_journal, bulk_import=self.bulk_import,
+            stage_network_files=self.stage_network_files, staging_budget=self.staging_budget,
+            workers=Exif.thread_count(QThread.idealThreadCount()), min_workers=Exif.min_threads,
+            max_workers=Exif.max_threads, adaptive_workers=Exif.adaptive_threads, batch_size=Exif.batch_size,
+            native_write=Exif.native_write, native_read=Exif.native_read, read_chunk_size=Exif.read_chunk_size,
+            shared_pool=Exif.keep_exiftool_running)
+
+    def poll_results(self):
+        """ Pull the results of the run, the run stalls while its results are not pulled """
+        if not self.progress_ready and self.exif_run.total is not None:
+            self.progress_ready = True
+            self.setup_progress(self.exif_run.total)
+        elif self.progress_ready and self.exif_run.total != self.ui.progress_widget.progress.maximum():
+            # Files are still being discovered
+            self.ui.progress_widget.progress.setMaximum(self.exif_run.total)
+
+        for result in self.exif_run.poll(self.poll_items):
+            self.update_progress(result)
+
+        if self.exif_run.finished:
+            self.show_summary(self.exif_run.summary)
+            self.finish_exif_worker()
+
+            if self.closing:
+                self.closed.emit()
 
     def setup_progress(self, value):
         self.ui.treeWidgetImg.clear()
@@ -104,13 +230,20 @@ class ImgMetaDataApp(QObject):
         self.ui.progress_widget.progress.setValue(0)
         self.ui.progress_widget.progress.setMaximum(value)
 
-    def update_progress(self, file_name, msg):
+    def update_progress(self, result: ExifResult):
         v = self.ui.progress_widget.progress.value() + 1
         self.ui.progress_widget.progress.setValue(v)
 
-        item = QTreeWidgetItem((file_name, msg))
+        item = QTreeWidgetItem((result.file, result.message()))
         self.ui.treeWidgetImg.addTopLevelItem(item)
 
+    def show_summary(self, summary: ExifRunSummary):
+        msg = summary.message()
+        LOGGER.info('Image process finished: %s', summary.as_dict())
+
+        self.ui.treeWidgetImg.insertTopLevelItem(0, QTreeWidgetItem((_('Zusammenfassung'), msg)))
+        self.ui.statusBar().showMessage(msg, 20000)
+
     def message(self, msg):
         msg_box = GenericMsgBox(self.ui, _("Bildprozessor"), msg)
         msg_box.exec()
@@ -140,130 +273,3 @@ class ImgMetaDataApp(QObject):
             return False
 
         return True
-
-
-class ImgMetaDataWorker(QThread):
-    result = pyqtSignal(str, str)
-    num_items = pyqtSignal(int)
-    msg = pyqtSignal(str)
-    finish_process = pyqtSignal()
-
-    def __init__(self, parent_app: ImgMetaDataApp, path: Union[Path, None], excel_data, update_from_excel: bool):
-        super(ImgMetaDataWorker, self).__init__()
-
-        # Store dpi settings
-        self.update_dpi = parent_app.update_dpi
-        self.dpi_tags = parent_app.dpi_tags
-        self.dpi_unit = parent_app.dpi_unit
-        self.dpi_res_x = parent_app.dpi_res_x
-        self.dpi_res_y = parent_app.dpi_res_y
-
-        # Name settings
-        self.ignored_name_patterns = parent_app.ignored_name_patterns
-        self.ignore_last_digits = parent_app.ignore_last_digits
-
-        self.path = path
-        self.excel_data = excel_data
-        self.update_from_excel = update_from_excel
-
-        self.exif = Exif(self.path, self.idealThreadCount())
-        self.exif.result.connect(self.exif_result)
-
-        self.img_work_queue = list()
-        self.missing_imgs = list()
-        self.cmd_list = list()
-
-        self.exif_timeout = QTimer()
-        self.exif_timeout.setSingleShot(True)
-        self.exif_timeout.setInterval(500)
-        self.exif_timeout.timeout.connect(self.work)
-
-        self.started.connect(self.init_process)
-
-    def run(self):
-        self.exec()
-        LOGGER.debug('Img Worker Thread ended.')
-
-    def init_process(self):
-        for img_file in self.exif.get_img_files():
-            if not self.update_from_excel:
-                # No excel data to update
-                self.img_work_queue.append((img_file, None))
-                continue
-
-            file_match = self.match_file_name(img_file.stem, self.excel_data.keys())
-
-            if file_match:
-                file_match = file_match[0]
-
-                self.img_work_queue.append(
-                    (img_file, self.excel_data[file_match])
-                                      )
-            else:
-                self.missing_imgs.append(img_file)
-
-        self.num_items.emit(len(self.img_work_queue))
-        self.work()
-
-    def match_file_name(self, name, excel_keys):
-        # Create search pattern for ignored name parts
-        pattern = ''
-        for pattern_part in self.ignored_name_patterns:
-            pattern += f'{pattern_part}|'
-
-        # Remove Name parts to ignore eg. _RECTO
-        file_name = re.sub(pattern, '', name)
-
-        if self.ignore_last_digits:
-            # Last two digits of file name indicate page number and are ignored
-            file_name = re.sub(r'\d\d$', '', file_name)
-
-        # Match name against excel row entries
-        file_match = fnmatch.filter(excel_keys, f'{file_name}*')
-
-        return file_match
-
-    def work(self):
-        if not len(self.img_work_queue):
-            self.finish_work()
-            return
-
-        img_file, img_dict = self.img_work_queue.pop(0)
-        command = list()
-
-        if self.update_dpi:
-            # Update units from user settings and update resolution, eg 300dpi or 118,11 ppc
-            for tag, value in zip(self.dpi_tags, (self.dpi_unit, self.dpi_res_x, self.dpi_res_y)):
-                command.append(f'{tag}={value}')
-
-        if self.update_from_excel:
-            # Update image tags from excel data
-            for tag, dict_value in zip(Exif.exiftool_tags, img_dict.values()):
-                if not dict_value:
-                    continue
-                command.append(f'{tag}={dict_value}')
-
-        # command.append('-v3')
-        # Do not back up files
-        command.append('-overwrite_original')
-        command.append(f'{img_file.as_posix()}')
-
-        LOGGER.debug('Appending command: %s', command)
-        self.exif.update_meta_data(command, img_file.name)
-        self.exif_timeout.start()
-
-    def finish_work(self):
-        if self.exif.thread_pool.activeThreadCount():
-            self.exif_timeout.start()
-            return
-
-        self.exif_timeout.stop()
-
-        for img in self.missing_imgs:
-            self.result.emit(img.name, _("ACHTUNG! Bilddatei -NICHT- in Excel gefunden!"))
-
-        self.finish_process.emit()
-
-    def exif_result(self, *result):
-        self.result.emit(*result)
-        self.work()
@@ -0,0 +1,160 @@
+"""
+    Headless Tiffy
+
+    Runs the spreadsheet to metadata pipeline of modules.engine without Qt. Progress is written
+    to stdout as one JSON object per line, log messages go to stderr and the log file.
+    Needs TIFFY_HEADLESS set before any application module is imported, see tiffy_cli.py
+
+        tiffy_cli.py --xlsx list.xlsx --images /archive/1998 --map title=K,keywords=B --dpi 300
+
+    Image files are found in all subdirectories of --images unless --no-recursive is given.
+
+    Exit code 0 if every file was written or already up to date, 1 if files failed, the run
+    was cancelled or could not start and 2 on invalid arguments. Image files without a row in
+    the spreadsheet are reported as failed results but only fail the run with --strict.
+"""
+import argparse
+import json
+import re
+import sys
+from pathlib import Path
+
+from modules.engine import Job, default_workers, run
+from modules.excel_reader import ExcelReader
+from modules.exif_result import ExifResult
+from modules.file_scanner import FileScanner
+from modules.log import init_logging
+
+LOGGER = init_logging(__name__)
+
+EXIT_OK, EXIT_FAILED = 0, 1
+
+# Spreadsheet column letters, empty for columns not to read
+COLUMN_PATTERN = re.compile(r'^[A-Za-z]{0,3}$')
+
+
+def parse_map(value: str) -> dict:
+    """ Parse key=column pairs eg. title=K,author=,keywords=B """
+    spreadsheet_map = dict()
+
+    for pair in value.split(','):
+        key, sep, column = pair.partition('=')
+        key, column = key.strip(), column.strip()
+
+        if not sep or key not in ExcelReader.spreadsheet_map:
+            raise argparse.ArgumentTypeError(
+                f'Invalid mapping {pair!r}, expected key=column with a key of: '
+                f'{", ".join(ExcelReader.spreadsheet_map)}')
+        if not COLUMN_PATTERN.match(column):
+            raise argparse.ArgumentTypeError(f'Invalid spreadsheet column {column!r} of {key}')
+
+        spreadsheet_map[key] = column.upper() or None
+
+    return spreadsheet_map
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='tiffy-cli', description='Write spreadsheet values and resolution to the metadata of image files.')
+    parser.add_argument('--xlsx', type=Path, help='Spreadsheet with one row per image file')
+    parser.add_argument('--images', type=Path, required=True, help='Directory of the image files')
+    parser.add_argument('--no-recursive', dest='recursive', action='store_false',
+                        help='Only process the image files directly inside --images, not its subdirectories')
+    parser.add_argument('--include', action='append', metavar='GLOB',
+                        help='Glob pattern of the image files to process, may be repeated '
+                             f'(default: {" ".join(FileScanner.include)})')
+    parser.add_argument('--exclude', action='append', metavar='GLOB',
+                        help='Glob pattern of files and directories to skip in addition to '
+                             f'{" ".join(FileScanner.exclude)}, patterns with a slash match the path relative '
+                             'to --images eg. 1998/box_*, may be repeated')
+    parser.add_argument('--map', type=parse_map, default=dict(),
+                        help='Spreadsheet columns eg. file=B,title=K,author=,keywords=B. Keys: '
+                             f'{", ".join(ExcelReader.spreadsheet_map)}. Unmapped keys use the defaults: '
+                             f'{",".join(f"{k}={v or str()}" for k, v in ExcelReader.spreadsheet_map.items())}')
+    parser.add_argument('--dpi', type=float, help='Resolution in pixels per inch to write, eg. 300')
+    parser.add_argument('--jobs', type=int, default=default_workers(),
+                        help='Number of concurrent exiftool processes (default: %(default)s)')
+    parser.add_argument('--force', action='store_true',
+                        help='Write files already containing the values to write')
+    parser.add_argument('--strict', action='store_true',
+                        help='Exit with an error if image files have no row in the spreadsheet')
+
+    args = parser.parse_args(argv)
+
+    if not args.xlsx and args.dpi is None:
+        parser.error('Nothing to update, provide --xlsx and/or --dpi.')
+    if not args.images.is_dir():
+        parser.error(f'Image directory {args.images} does not exist.')
+    if args.dpi is not None and args.dpi <= 0:
+        parser.error('--dpi has to be a positive resolution.')
+    if args.jobs < 1:
+        parser.error('--jobs has to be at least 1.')
+
+    return args
+
+
+class JsonLines:
+    """ Writes progress events as JSON lines """
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def event(self, event: str, **data):
+        data = dict(event=event, **data)
+        self.stream.write(json.dumps(data, ensure_ascii=False, default=str) + '\n')
+        self.stream.flush()
+
+    def result(self, result: ExifResult):
+        self.event('result', file=result.file, status=result.status, warnings=list(result.warnings),
+                   errors=list(result.errors), exec_time=round(result.exec_time, 4))
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    output = JsonLines()
+
+    exclude = FileScanner.exclude + tuple(args.exclude or ())
+
+    options = dict(dpi=args.dpi, recursive=args.recursive, include=args.include, exclude=exclude,
+                   workers=args.jobs, max_workers=args.jobs, adaptive_workers=False,
+                   skip_unchanged=not args.force, use_state_cache=not args.force)
+
+    if args.xlsx:
+        try:
+            job = Job.from_xlsx(args.xlsx, [args.images], args.map, **options)
+        except Exception as e:
+            LOGGER.error('Could not read spreadsheet %s: %s', args.xlsx, e)
+            output.event('error', message=f'Could not read spreadsheet {args.xlsx}: {e}')
+            return EXIT_FAILED
+
+        if not job.rows:
+            output.event('error', message='Spreadsheet contains no rows with file names, check the file column.')
+            return EXIT_FAILED
+    else:
+        job = Job(None, [args.images], **options)
+
+    with run(job) as results:
+        # Files are written while the image directory is still being scanned
+        output.event('start', images=args.images.as_posix(), jobs=args.jobs)
+        planned = False
+
+        while not results.finished:
+            try:
+                for result in results:
+                    output.result(result)
+
+                    if not planned and results.planned:
+                        planned = True
+                        output.event('planned', files=results.total)
+            except KeyboardInterrupt:
+                # Complete the files in progress, the dropped files are reported in the summary
+                LOGGER.warning('Run cancelled.')
+                results.cancel()
+
+    if not planned:
+        output.event('planned', files=results.total)
+    output.event('summary', **results.summary.as_dict())
+
+    summary = results.summary
+    failed = summary.failed if args.strict else summary.failed - summary.missing
+
+    return EXIT_FAILED if failed or summary.cancelled else EXIT_OK
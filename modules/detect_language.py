@@ -24,9 +24,9 @@
 import os
 import locale
 import ctypes
-from gettext import translation
+from gettext import NullTranslations, translation
 
-from modules.app_globals import BASE_PATH
+from modules.app_globals import BASE_PATH, HEADLESS
 
 
 def get_ms_windows_language():
@@ -62,6 +62,10 @@ def setup_translation(language=None):
 
 
 def get_translation():
+    if HEADLESS:
+        # Untranslated messages, without looking up the catalogs
+        return NullTranslations()
+
     # Set OS language if not already set
     lang = os.environ.get('LANGUAGE')
     if not lang:
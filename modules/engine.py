@@ -0,0 +1,731 @@
+"""
+    Qt-free metadata engine
+
+    Runs the spreadsheet to metadata pipeline described by a Job in a background thread.
+    Results are pulled from the returned Run, either by iterating it, by polling or with
+    arun from an asyncio event loop:
+
+        job = Job.from_xlsx('list.xlsx', ['/archive/box_01'], dpi=300)
+
+        with run(job) as results:
+            for result in results:
+                print(result.file, result.status)
+
+        async for result in arun(job):
+            ...
+
+    Nothing in here may import PyQt5, the GUI and the command line are adapters of this module.
+"""
+import asyncio
+import os
+import queue
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from time import perf_counter
+
+from modules.excel_reader import ExcelReader
+from modules.exif_import import ExifImport
+from modules.exif_job import group_jobs
+from modules.exif_pool import ExifToolPool
+from modules.exif_reader import ExifReader
+from modules.exif_result import ExifResult, ExifRunSummary
+from modules.exif_scheduler import ConcurrencyController, JobScheduler
+from modules.exif_writer import BatchSize, ExifWriter
+from modules.file_scanner import FileScanner
+from modules.job_planner import JobPlanner
+from modules.run_journal import RunJournal
+from modules.staging import Stager
+from modules.state_cache import StateCache
+from modules.detect_language import get_translation
+from modules.log import init_logging
+
+LOGGER = init_logging(__name__)
+
+# translate strings
+lang = get_translation()
+lang.install()
+_ = lang.gettext
+
+# End of the results of a run
+_FINISHED = object()
+
+# Message of the planner thread to the run thread
+_PLANNED = object()
+
+# Planned files of a chunk, cached and unchanged files are skipped, work is written
+_PlannedFiles = namedtuple('_PlannedFiles', ('jobs', 'missing', 'cached', 'unchanged', 'work'))
+
+
+def default_workers(max_workers: int=4) -> int:
+    """ Initial number of concurrent exiftool processes for this machine """
+    return max(1, min(max_workers, round((os.cpu_count() or 2) * 0.75)))
+
+
+class Job:
+    """
+        Description of a metadata run
+
+        Spreadsheet rows are matched to the image files below the image roots by file name,
+        see JobPlanner. Without rows every image file gets only its resolution updated.
+    """
+    def __init__(self, rows: dict=None, images=(), tag_map: dict=None, dpi=None, dpi_unit: str='2',
+                 ignored_name_patterns=('_VERSO?$', '_RECTO?$'), ignore_last_digits: bool=True,
+                 recursive: bool=True, include=None, exclude=None, scan_workers: int=None,
+                 skip_unchanged: bool=True, use_state_cache: bool=True, journal: bool=False,
+                 resume_journal: Path=None, bulk_import: bool=False, stage_network_files: bool=False,
+                 staging_budget: int=4 * 1024 ** 3, workers: int=None, min_workers: int=1, max_workers: int=4,
+                 adaptive_workers: bool=True, batch_size: int=0, native_write: bool=True, native_read: bool=True,
+                 read_chunk_size: int=500, shared_pool: bool=False):
+        """
+            :param rows: spreadsheet file name: dict of column key: value, see ExcelReader
+            :param images: root directories of the image files
+            :param tag_map: spreadsheet column key: Exiftool tag, defaults to JobPlanner.tag_map
+            :param dpi: resolution to write eg. 300, x and y resolution eg. (300, 600) or None to keep it
+            :param dpi_unit: resolution unit '2' inches or '3' centimeters
+            :param ignored_name_patterns: regular expressions of file name parts to ignore when matching rows
+            :param ignore_last_digits: ignore the last two digits of file names indicating the page
+            :param recursive: find image files in the subdirectories of the image roots
+            :param include: glob patterns of the image files, defaults to FileScanner.include
+            :param exclude: glob patterns of files and directories to skip, defaults to FileScanner.exclude
+            :param scan_workers: number of directories scanned in parallel, defaults to FileScanner.workers
+            :param skip_unchanged: do not write files already containing the values
+            :param use_state_cache: skip files unmodified since the same values were written, see StateCache
+            :param journal: record the run to resume it if it gets interrupted, see RunJournal
+            :param resume_journal: journal file of an interrupted run to complete, rows and images are not used
+            :param bulk_import: apply all files with a single exiftool -json= import per process
+            :param stage_network_files: write local copies of files on network shares, see Stager
+            :param staging_budget: bytes of local scratch space for staged files
+            :param workers: initial number of concurrent exiftool processes, defaults to default_workers
+            :param min_workers: lower bound of the adaptive number of processes
+            :param max_workers: upper bound of the adaptive number of processes
+            :param adaptive_workers: adapt the number of processes to the throughput, see ConcurrencyController
+            :param batch_size: files per exiftool round trip, 0 picks the size from the latency, see BatchSize
+            :param native_write: write supported files and tags with the built-in writers
+            :param native_read: read supported files with the built-in header parser
+            :param read_chunk_size: maximum number of files per exiftool call when reading values
+            :param shared_pool: use the application wide ExifToolPool and keep its processes running
+        """
+        self.rows = rows
+        self.images = [Path(img_path) for img_path in images]
+        self.tag_map = tag_map
+        self.dpi = dpi
+        self.dpi_unit = dpi_unit
+        self.ignored_name_patterns = ignored_name_patterns
+        self.ignore_last_digits = ignore_last_digits
+        self.recursive = recursive
+        self.include = include
+        self.exclude = exclude
+        self.scan_workers = scan_workers
+
+        self.skip_unchanged = skip_unchanged
+        self.use_state_cache = use_state_cache
+        self.journal = journal
+        self.resume_journal = Path(resume_journal) if resume_journal else None
+        self.bulk_import = bulk_import
+        self.stage_network_files = stage_network_files
+        self.staging_budget = staging_budget
+
+        self.max_workers = max(1, max_workers)
+        self.min_workers = max(1, min(min_workers, self.max_workers))
+        self.workers = max(1, min(self.max_workers, workers or default_workers(self.max_workers)))
+        self.adaptive_workers = adaptive_workers
+        self.batch_size = batch_size
+        self.native_write = native_write
+        self.native_read = native_read
+        self.read_chunk_size = read_chunk_size
+        self.shared_pool = shared_pool
+
+    @classmethod
+    def from_xlsx(cls, file, images, spreadsheet_map: dict=None, **options) -> 'Job':
+        """ Job with the rows of a spreadsheet, spreadsheet_map updates ExcelReader.spreadsheet_map """
+        excel_map = ExcelReader.spreadsheet_map.copy()
+        excel_map.update(spreadsheet_map or dict())
+
+        rows = ExcelReader(excel_map).get_data(Path(file).as_posix())
+        return cls({k: v for k, v in rows.items() if k}, images, **options)
+
+    @property
+    def pool_size(self) -> int:
+        return self.max_workers if self.adaptive_workers else self.workers
+
+    def dpi_values(self):
+        """ Resolution unit, x and y resolution to write or None """
+        if self.dpi is None:
+            return None
+
+        res_x, res_y = self.dpi if isinstance(self.dpi, (tuple, list)) else (self.dpi, self.dpi)
+        res_x, res_y = (res if isinstance(res, str) else f'{res:.2f}' for res in (res_x, res_y))
+        return self.dpi_unit, res_x, res_y
+
+    def planner(self) -> JobPlanner:
+        return JobPlanner(self.rows, self.dpi_values(), self.ignored_name_patterns, self.ignore_last_digits,
+                          self.tag_map)
+
+    def scanner(self) -> FileScanner:
+        return FileScanner(self.images, self.include, self.exclude, self.recursive, self.scan_workers)
+
+
+class Run:
+    """
+        A Job running in a background thread
+
+        Iterate the run, call poll or use arun to pull the ExifResult of every file. Up to
+        max_pending results are buffered, the run stalls while its consumer falls behind.
+
+        Image files are planned in chunks by a planner thread while they are discovered, the
+        first files are written while the tree is still being scanned. Discovery stalls while
+        max_backlog planned files wait to be written. total counts the files found so far and
+        is final once planned, summary is complete once finished.
+
+        cancel drops the queued files and completes the files in progress, pause stops
+        dispatching new files. close cancels the run and waits for it, a Run used as
+        context manager is closed on exit.
+    """
+    # Results buffered for the consumer
+    max_pending = 1000
+
+    # Seconds arun waits for results per executor call
+    async_poll_interval = 0.25
+
+    # Maximum number of files planned at once, a chunk is planned as soon as a file was found
+    plan_chunk_size = 500
+
+    # Planned files waiting to be written
+    max_backlog = 5000
+
+    def __init__(self, job: Job):
+        self.job = job
+        self.total = None
+        self.summary = ExifRunSummary()
+        self.journal_file = None
+        self.finished = False
+
+        self.exif_pool = None
+        self.writer = None
+        self.reader = None
+        self.scanner = None
+        self.state_cache = None
+        self.journal = None
+        self.scheduler = None
+        self.executor = None
+
+        self.queued_jobs = dict()
+        self.concurrency = dict()
+        self.pool_counters = dict()
+
+        self._results = queue.Queue(self.max_pending)
+        self._buffer = deque()
+        # Finished batches, planned files and wake ups of the run thread
+        self._control = queue.Queue()
+        self._cancel = threading.Event()
+        self._pause = threading.Event()
+        self._planned = threading.Event()
+        self._closing = threading.Event()
+        self._cancel_applied = False
+        self._failed = False
+        self._discovering = False
+
+        # Planned files not written yet, the planner waits above max_backlog
+        self._backlog = 0
+        self._backlog_changed = threading.Condition()
+
+        self._thread = threading.Thread(target=self._run, name='TiffyRun', daemon=True)
+        self._planner = threading.Thread(target=self._discover, name='TiffyPlanner', daemon=True)
+
+    def start(self) -> 'Run':
+        self._thread.start()
+        return self
+
+    # ---- Consumer interface ----
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> ExifResult:
+        if self._buffer:
+            return self._buffer.popleft()
+        if self.finished:
+            raise StopIteration
+
+        result = self._results.get()
+        if result is _FINISHED:
+            self.finished = True
+            raise StopIteration
+        return result
+
+    def poll(self, max_items: int=None, timeout: float=0.0) -> list:
+        """
+            Return the available results, empty once the run finished
+
+            :param max_items: maximum number of results to return
+            :param timeout: seconds to wait for the first result, None waits until one is available
+        """
+        results = list()
+
+        while self._buffer and (max_items is None or len(results) < max_items):
+            results.append(self._buffer.popleft())
+
+        while not self.finished and (max_items is None or len(results) < max_items):
+            try:
+                if results or timeout == 0:
+                    result = self._results.get_nowait()
+                else:
+                    result = self._results.get(timeout=timeout)
+            except queue.Empty:
+                break
+
+            if result is _FINISHED:
+                self.finished = True
+                break
+            results.append(result)
+
+        return results
+
+    async def apoll(self, max_items: int=None) -> list:
+        """ Wait for results in the executor of the running event loop, empty once the run finished """
+        loop = asyncio.get_running_loop()
+
+        while not self.finished:
+            results = await loop.run_in_executor(None, self.poll, max_items, self.async_poll_interval)
+            if results:
+                return results
+
+        return self.poll(max_items)
+
+    @property
+    def planned(self) -> bool:
+        """ True once all files are discovered and total is final """
+        return self._planned.is_set()
+
+    def wait_planned(self, timeout: float=None):
+        """
+            Wait until all files of the run are discovered and return their number
+
+            Results have to be pulled by another thread meanwhile, the discovery stalls
+            while the results are not pulled.
+        """
+        self._planned.wait(timeout)
+        return self.total
+
+    def pause(self):
+        """ Stop dispatching files, files in progress are completed """
+        self._pause.set()
+        self._wake()
+
+    def resume(self):
+        self._pause.clear()
+        self._wake()
+
+    @property
+    def paused(self) -> bool:
+        return self._pause.is_set() and not self.cancelled
+
+    def cancel(self):
+        """ Drop the queued files and finish once the files in progress completed """
+        self._cancel.set()
+        self._stop_discovery()
+        self._wake()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def close(self):
+        """ Cancel the run and wait for it, remaining results are discarded """
+        self.cancel()
+
+        while self._thread.is_alive() or not self._results.empty():
+            try:
+                if self._results.get(timeout=0.1) is _FINISHED:
+                    self.finished = True
+            except queue.Empty:
+                pass
+
+        self._thread.join()
+        self._buffer.clear()
+        self.finished = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # ---- Run thread ----
+    def _wake(self):
+        self._control.put((None, ()))
+
+    def _run(self):
+        try:
+            self._open()
+            self._open_journal()
+            self.total = 0
+            self._discovering = True
+            self._planner.start()
+            self._write()
+        except Exception as e:
+            LOGGER.exception('Run failed: %s', e)
+            self._failed = True
+
+            for job in list(self.queued_jobs.values()):
+                self._result(ExifResult.failure(job.name, _('Unerwarteter Fehler: {}').format(e)))
+        finally:
+            self._closing.set()
+            self._stop_discovery()
+            with self._backlog_changed:
+                self._backlog_changed.notify_all()
+            if self._planner.ident:
+                self._planner.join()
+
+            self._planned.set()
+            self._close()
+            self._results.put(_FINISHED)
+
+    def _open(self):
+        job = self.job
+
+        if job.shared_pool:
+            self.exif_pool = ExifToolPool.shared(job.pool_size)
+        else:
+            self.exif_pool = ExifToolPool(job.pool_size)
+        self.pool_counters = self.exif_pool.counters()
+
+        stager = None
+        if job.stage_network_files:
+            try:
+                stager = Stager(job.staging_budget, native_write=job.native_write)
+            except OSError as e:
+                LOGGER.error('Could not create the staging directory: %s', e)
+
+        self.writer = ExifWriter(self.exif_pool, BatchSize(job.batch_size), job.native_write, stager)
+        self.reader = ExifReader(self.exif_pool, job.workers, job.native_read, job.read_chunk_size)
+
+        if job.use_state_cache:
+            try:
+                self.state_cache = StateCache()
+            except Exception as e:
+                LOGGER.error('Could not open state cache: %s', e)
+
+        self.executor = ThreadPoolExecutor(max_workers=job.pool_size, thread_name_prefix='TiffyWriter')
+
+    def _open_journal(self):
+        try:
+            if self.job.resume_journal:
+                self.journal = RunJournal(self.job.resume_journal)
+            elif self.job.journal:
+                self.journal = RunJournal.create(self.job.images[0] if self.job.images else None)
+        except OSError as e:
+            LOGGER.error('Could not open run journal: %s', e)
+
+        if self.journal:
+            self.journal_file = self.journal.journal_file
+
+    def _write(self):
+        if self.job.bulk_import:
+            # Bulk imports send all files of a device to a single exiftool import
+            self.scheduler = JobScheduler(self._dispatch_import, lambda remaining, workers: remaining)
+        else:
+            self.scheduler = JobScheduler(self._dispatch, self.writer.batch_sizer.get, self.job.workers,
+                                          self.job.pool_size)
+
+        while self._discovering or not self.scheduler.finished:
+            batch, results = self._control.get()
+
+            if batch is _PLANNED:
+                self._add_planned(results)
+            else:
+                for result in results:
+                    self._runner_result(result)
+
+                if batch is not None:
+                    self.scheduler.done(batch)
+
+            self._apply_control()
+            self.scheduler.fill()
+
+    def _add_planned(self, planned: _PlannedFiles):
+        """ Report the skipped files of a planned chunk and queue its files to write """
+        if planned is None:
+            # Discovery finished
+            self._discovering = False
+            self._planned.set()
+            LOGGER.info('Planned %s files, %s unchanged files skipped.', self.total, self.summary.unchanged)
+            return
+
+        self.total += len(planned.jobs) + len(planned.missing)
+        if self.journal and not self.job.resume_journal:
+            # Resumed jobs are already planned in the journal
+            self.journal.plan(planned.jobs)
+
+        self.summary.missing += len(planned.missing)
+        for name in planned.missing:
+            self._emit(ExifResult.failure(name, _("ACHTUNG! Bilddatei -NICHT- in Excel gefunden!")))
+
+        for job in planned.cached:
+            if self.journal:
+                self.journal.done(job.file)
+            self._emit(ExifResult(job.name, ExifResult.UNCHANGED, unchanged=1))
+
+        for job in planned.unchanged:
+            result = ExifResult(job.name, ExifResult.UNCHANGED, unchanged=1)
+            self._record(job, result)
+            self._emit(result)
+
+        if self._cancel_applied:
+            # Files planned while the run got cancelled are dropped as well
+            self.summary.cancelled += len(planned.work)
+            self._release(len(planned.work))
+            return
+
+        # Remember queued jobs to record results in the state cache and the journal
+        for job in planned.work:
+            self.queued_jobs[job.name] = job
+
+        # Files with identical values get written by a single exiftool command
+        self.scheduler.extend(group_jobs(planned.work))
+
+    def _apply_control(self):
+        if self.cancelled and not self._cancel_applied:
+            self._cancel_applied = True
+            dropped = self.scheduler.clear()
+
+            for job in dropped:
+                self.queued_jobs.pop(job.name, None)
+            self._release(len(dropped))
+            self.summary.cancelled += len(dropped)
+            LOGGER.info('Run cancelled, %s queued files dropped.', len(dropped))
+
+            if self.journal:
+                self.journal.flush()
+
+        paused = self.paused
+        if paused != self.scheduler.paused:
+            self.scheduler.paused = paused
+            LOGGER.info('Run %s with %s files queued.', 'paused' if paused else 'resumed', len(self.scheduler))
+
+            if paused and self.journal:
+                self.journal.flush()
+
+    def _dispatch(self, batch: list):
+        queued = perf_counter()
+
+        def write():
+            return self.writer.write(batch, perf_counter() - queued)
+
+        future = self.executor.submit(write)
+        future.add_done_callback(lambda f: self._control.put((batch, f.result())))
+
+    def _dispatch_import(self, batch: list):
+        queued = perf_counter()
+        exif_import = ExifImport(self.job.workers, self.exif_pool.executable)
+
+        def write():
+            try:
+                for result in self.writer.import_jobs(batch, exif_import, perf_counter() - queued):
+                    self._control.put((None, (result,)))
+            finally:
+                self._control.put((batch, ()))
+
+        self.executor.submit(write)
+
+    def _runner_result(self, result: ExifResult):
+        """ Result of a file written by the writers """
+        job = self.queued_jobs.get(result.file)
+        if job and self.job.adaptive_workers and not self.job.bulk_import:
+            self._device_result(job.device, result)
+
+        self._result(result)
+
+    def _device_result(self, device, result: ExifResult):
+        """ Adapt the window of the device to its observed throughput """
+        if device not in self.concurrency:
+            self.concurrency[device] = ConcurrencyController(self.job.workers, self.job.min_workers,
+                                                             self.job.max_workers)
+        concurrency = self.concurrency[device]
+
+        if concurrency.record(result.exec_time):
+            LOGGER.debug('Concurrency of device %s changed to %s', device, concurrency.limit)
+            self.scheduler.set_window(device, concurrency.limit)
+
+    def _result(self, result: ExifResult):
+        job = self.queued_jobs.pop(result.file, None)
+
+        if job:
+            self._release(1)
+            self._record(job, result)
+
+        self._emit(result)
+
+    def _record(self, job, result: ExifResult):
+        """ Record the result of job in the state cache and the journal """
+        if self.state_cache:
+            if result.ok:
+                self.state_cache.store(job.file, job.tags, job.dpi)
+            else:
+                self.state_cache.discard(job.file)
+
+        if self.journal and result.ok:
+            self.journal.done(job.file)
+
+    def _release(self, count: int):
+        """ Planned files left the backlog """
+        with self._backlog_changed:
+            self._backlog -= count
+            self._backlog_changed.notify()
+
+    def _emit(self, result: ExifResult):
+        self.summary.add(result)
+        self._results.put(result)
+
+    def _close(self):
+        if self.executor:
+            self.executor.shutdown(wait=True)
+
+        if self.journal:
+            # Cancelled and failed runs stay unfinished and can be resumed
+            if self.cancelled or self._failed:
+                self.journal.close()
+            else:
+                self.journal.finish()
+
+        if self.state_cache:
+            self.state_cache.close()
+
+        if self.writer and self.writer.stager:
+            self.writer.stager.close()
+
+        if self.exif_pool:
+            counters = self.exif_pool.counters()
+            if not self.job.shared_pool:
+                self.exif_pool.close()
+
+            self.summary.timeouts = counters['timeouts'] - self.pool_counters['timeouts']
+            self.summary.restarts = counters['restarts'] - self.pool_counters['restarts']
+            self.summary.cold_starts = counters['cold_starts'] - self.pool_counters['cold_starts']
+            self.summary.startup_time = counters['startup_time'] - self.pool_counters['startup_time']
+
+    # ---- Planner thread ----
+    @property
+    def _stop_planning(self) -> bool:
+        return self.cancelled or self._closing.is_set()
+
+    def _discover(self):
+        """ Plan the files of the job in chunks while they are discovered """
+        try:
+            if self.job.resume_journal:
+                self._discover_journal()
+            else:
+                self._discover_files()
+        except Exception as e:
+            LOGGER.exception('Planning failed: %s', e)
+            self._failed = True
+        finally:
+            self._control.put((_PLANNED, None))
+
+    def _discover_journal(self):
+        try:
+            _run, jobs = RunJournal.load(self.job.resume_journal)
+        except (OSError, ValueError, KeyError) as e:
+            LOGGER.error('Could not read run journal %s: %s', self.job.resume_journal, e)
+            return
+
+        for idx in range(0, len(jobs), self.plan_chunk_size):
+            if not self._wait_backlog():
+                break
+
+            chunk = jobs[idx:idx + self.plan_chunk_size]
+            for exif_job in chunk:
+                exif_job.stat()
+            self._plan(chunk, ())
+
+    def _discover_files(self):
+        planner = self.job.planner()
+
+        self.scanner = self.job.scanner()
+        if self._stop_planning:
+            return
+
+        with self.scanner as scanner:
+            for img_files in scanner.chunks(self.plan_chunk_size):
+                if not self._wait_backlog():
+                    break
+
+                jobs, missing = list(), list()
+                for img_file, exif_job in planner.plan(img_files):
+                    if exif_job:
+                        jobs.append(exif_job)
+                    else:
+                        missing.append(img_file.name)
+
+                self._plan(jobs, missing)
+
+    def _stop_discovery(self):
+        if self.scanner:
+            self.scanner.stop()
+
+    def _wait_backlog(self) -> bool:
+        """ Wait while max_backlog planned files wait to be written, False once planning has to stop """
+        with self._backlog_changed:
+            while self._backlog >= self.max_backlog and not self._stop_planning:
+                self._backlog_changed.wait(0.25)
+
+        return not self._stop_planning
+
+    def _plan(self, jobs: list, missing):
+        """ Sort out the files to skip and hand the chunk to the run thread """
+        cached, unchanged, work = list(), list(), jobs
+
+        if self.state_cache:
+            # Files unmodified since the same values were written are skipped without reading them
+            work = list()
+            for job in jobs:
+                if self.state_cache.is_current(job.file, job.tags, job.dpi):
+                    cached.append(job)
+                else:
+                    work.append(job)
+
+        tags = sorted({tag for job in work for tag in job.read_tags()}) if self.job.skip_unchanged else None
+        if tags and not self._stop_planning:
+            # Files already containing the values to write are skipped
+            current_values = self.reader.read_tags([job.file for job in work], tags)
+            remaining = list()
+            for job in work:
+                if job.matches(current_values.get(job.file.as_posix())):
+                    unchanged.append(job)
+                else:
+                    remaining.append(job)
+            work = remaining
+
+        LOGGER.debug('Planned %s files, %s cached, %s unchanged, %s not found in the spreadsheet.',
+                     len(jobs), len(cached), len(unchanged), len(missing))
+
+        with self._backlog_changed:
+            self._backlog += len(work)
+        self._control.put((_PLANNED, _PlannedFiles(jobs, missing, cached, unchanged, work)))
+
+
+def run(job: Job) -> Run:
+    """ Start job, the returned Run yields the ExifResult of every file """
+    return Run(job).start()
+
+
+async def arun(job: Job):
+    """
+        Yield the ExifResult of every file of job in an asyncio event loop
+
+        Leaving the loop early or cancelling the consuming task cancels the run,
+        files in progress are completed before the generator returns.
+    """
+    results = run(job)
+
+    try:
+        while True:
+            batch = await results.apoll()
+            if not batch:
+                break
+
+            for result in batch:
+                yield result
+    finally:
+        await asyncio.get_running_loop().run_in_executor(None, results.close)
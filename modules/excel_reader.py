@@ -0,0 +1,84 @@
+from collections import OrderedDict
+
+from openpyxl import load_workbook, worksheet
+from openpyxl.utils import column_index_from_string
+
+from modules.log import init_logging
+
+LOGGER = init_logging(__name__)
+
+
+class ExcelReader:
+    """
+        Reads the rows of the active worksheet of a spreadsheet
+
+        Rows are keyed by the value of the file column, the other columns of spreadsheet_map
+        are read in order. Columns mapped to None are read as None.
+    """
+    # Key: spreadsheet column letter, the keys following 'file' map to JobPlanner.exiftool_tags
+    spreadsheet_map = OrderedDict()
+    spreadsheet_map.update({
+        'file': 'B', 'title': 'K', 'author': None, 'description': None, 'keywords': 'B', 'copyright': 'EG'})
+
+    def __init__(self, spreadsheet_map: OrderedDict=None, progress=None, num_items=None):
+        """
+            :param spreadsheet_map: key: column letter, defaults to ExcelReader.spreadsheet_map
+            :param progress: callable called after every row
+            :param num_items: callable receiving the number of rows to read
+        """
+        self.map = spreadsheet_map if spreadsheet_map is not None else self.spreadsheet_map
+        self.progress = progress or (lambda: None)
+        self.num_items = num_items or (lambda value: None)
+
+    def get_data(self, file) -> dict:
+        ws = self.load(file)
+        return self.read_worksheet(ws)
+
+    def read_worksheet(self, ws) -> dict:
+        # Find start row behind header
+        for start_row in range(ws.min_row, ws.max_row):
+            row_value = ws.cell(start_row, ws.min_column).value
+            if row_value:
+                break
+        else:
+            start_row = 1
+
+        self.num_items(ws.max_row - start_row)
+        excel_data = dict()
+        file_name = ''
+
+        for row in range(start_row, ws.max_row + 1):
+            for result in self._read_columns(row, ws):
+                key, value = result
+
+                if key == 'file':
+                    file_name = value
+                    excel_data[file_name] = dict()
+                    continue
+
+                if not file_name:
+                    continue
+
+                excel_data[file_name].update({key: value})
+
+            LOGGER.debug('%s - %s', file_name, excel_data[file_name])
+            self.progress()
+
+        return excel_data
+
+    @staticmethod
+    def load(file) -> worksheet:
+        wb = load_workbook(file)
+        return wb.active
+
+    def _read_columns(self, row, ws):
+        for sheet_map in self.map.items():
+            key, column = sheet_map
+
+            if not column:
+                yield key, None
+                continue
+
+            col = column_index_from_string(column)
+
+            yield key, ws.cell(row, col).value
@@ -0,0 +1,115 @@
+import json
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from time import perf_counter
+
+from modules.app_globals import get_exif_executable
+from modules.exif_result import ExifResult
+from modules.detect_language import get_translation
+from modules.log import init_logging
+
+LOGGER = init_logging(__name__)
+
+# translate strings
+lang = get_translation()
+lang.install()
+_ = lang.gettext
+
+
+class ExifImport:
+    """
+        Apply many ExifJob's with a single exiftool invocation per shard
+
+        The values of all jobs of a shard are written to a temporary JSON database with
+        SourceFile keys which exiftool applies with -json=FILE. The file list is passed as
+        argument file. Per file outcomes are parsed from the -v0 file headers and the
+        messages on stderr, which exiftool suffixes with the file name.
+    """
+    # Seconds per file a shard may take before its exiftool process is killed
+    file_timeout = 10.0
+
+    # Do not split the jobs into shards smaller than this
+    min_shard_size = 50
+
+    def __init__(self, max_shards: int=1, executable: str=None):
+        self.max_shards = max(1, max_shards)
+        self.executable = executable or get_exif_executable()
+
+    def shards(self, jobs: list) -> list:
+        num_shards = max(1, min(self.max_shards, len(jobs) // self.min_shard_size))
+        size = -(-len(jobs) // num_shards)
+        return [jobs[idx:idx + size] for idx in range(0, len(jobs), size)]
+
+    def run(self, jobs: list, queue_time: float=0.0):
+        """ Apply jobs and yield an ExifResult per job, shards run in parallel """
+        if not jobs:
+            return
+
+        shards = self.shards(jobs)
+
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            futures = [executor.submit(self.run_shard, shard, queue_time) for shard in shards]
+            for future in as_completed(futures):
+                yield from future.result()
+
+    @staticmethod
+    def import_data(jobs: list) -> list:
+        """ JSON database rows of jobs """
+        rows = list()
+
+        for job in jobs:
+            row = {'SourceFile': job.file.as_posix()}
+            row.update({tag: f'{value}' for tag, value in job.dpi.items()})
+            row.update({tag: f'{value}' for tag, value in job.tags.items()})
+            rows.append(row)
+
+        return rows
+
+    def command(self, json_file: str, args_file: str) -> list:
+        command = [self.executable, f'-json={json_file}', '-overwrite_original', '-n', '-v0']
+
+        if os.name == 'nt':
+            # File names of the argument file and the JSON database are both UTF-8
+            command += ['-charset', 'filename=utf8']
+
+        return command + ['-@', args_file]
+
+    def run_shard(self, jobs: list, queue_time: float=0.0) -> list:
+        LOGGER.debug('Importing metadata of %s files with one exiftool process.', len(jobs))
+
+        with tempfile.TemporaryDirectory(prefix='tiffy_import_') as tmp_dir:
+            json_file = os.path.join(tmp_dir, 'import.json')
+            args_file = os.path.join(tmp_dir, 'files.args')
+
+            with open(json_file, 'w', encoding='utf-8') as f:
+                json.dump(self.import_data(jobs), f, ensure_ascii=False)
+
+            with open(args_file, 'wb') as f:
+                for job in jobs:
+                    name = job.file.as_posix()
+                    f.write((name.encode('utf-8') if os.name == 'nt' else os.fsencode(name)) + b'\n')
+
+            start = perf_counter()
+
+            try:
+                process = subprocess.run(self.command(json_file, args_file), stdin=subprocess.DEVNULL,
+                                         stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                         timeout=self.file_timeout * len(jobs),
+                                         creationflags=0x08000000 if os.name == 'nt' else 0)
+            except (OSError, subprocess.SubprocessError) as e:
+                LOGGER.error('Exiftool import of %s files failed: %s', len(jobs), e)
+                error = _('Exiftool ist abgestürzt oder hat nicht rechtzeitig geantwortet.')
+                return [ExifResult.failure(job.name, error, queue_time) for job in jobs]
+
+            exec_time = (perf_counter() - start) / len(jobs)
+
+        return self.parse_output(jobs, process.stdout.decode('utf-8', 'replace'),
+                                 process.stderr.decode('utf-8', 'replace'), queue_time, exec_time)
+
+    @staticmethod
+    def parse_output(jobs: list, stdout: str, stderr: str, queue_time: float=0.0, exec_time: float=0.0) -> list:
+        """ Create per file results of the output of an import run """
+        return ExifResult.from_verbose_output([(job.name, job.file.as_posix()) for job in jobs], stdout, stderr,
+                                              queue_time, exec_time)
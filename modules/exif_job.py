@@ -0,0 +1,138 @@
+import os
+from collections import OrderedDict
+from pathlib import Path
+
+# Resolution values are set with two decimals
+RESOLUTION_TOLERANCE = 0.005
+
+# Limits of a command updating several files with the same values. Keeps a single
+# command well within the command timeout and below command line length limits.
+MAX_GROUP_FILES = 100
+MAX_GROUP_BYTES = 32000
+
+# Image data per grouped command, large files are left to separate commands running in parallel
+MAX_GROUP_DATA = 512 * 1024 * 1024
+
+
+def _same_number(current, value) -> bool:
+    try:
+        return abs(float(f'{current}'.replace(',', '.')) - float(f'{value}'.replace(',', '.'))) < RESOLUTION_TOLERANCE
+    except ValueError:
+        return False
+
+
+def _same_text(current, value) -> bool:
+    if current is None or isinstance(current, (list, dict)):
+        # Several list items are never written by a single value
+        return False
+    return f'{current}' == f'{value}'
+
+
+class ExifJob:
+    """ Metadata update of a single image file """
+    __slots__ = ('file', 'tags', 'dpi', 'name', 'size', 'device')
+
+    def __init__(self, file: Path, tags: dict=None, dpi: dict=None, name: str=None):
+        """
+            :param file: image file to update
+            :param tags: exiftool tag name: value, eg. {'Title': 'Lorem'}
+            :param dpi: exiftool resolution tag name: value, eg. {'XResolution': '300.00'}
+            :param name: name of the results of the file, unique within a run, defaults to the file name
+        """
+        self.file = file
+        self.tags = tags or dict()
+        self.dpi = dpi or dict()
+        self.name = name or file.name
+
+        # File size and st_dev for scheduling, see stat
+        self.size = 0
+        self.device = None
+
+    def stat(self):
+        """ Record size and device of the file """
+        try:
+            st = os.stat(self.file)
+        except OSError:
+            return
+        self.size, self.device = st.st_size, st.st_dev
+
+    def payload(self) -> tuple:
+        """ Exiftool arguments setting the values of this update """
+        return tuple(f'-{tag}={value}' for tag, value in self.dpi.items()) + \
+            tuple(f'-{tag}={value}' for tag, value in self.tags.items())
+
+    def command(self) -> list:
+        """ Exiftool arguments of this update """
+        command = list(self.payload())
+
+        # command.append('-v3')
+        # Do not back up files
+        command.append('-overwrite_original')
+        command.append(f'{self.file.as_posix()}')
+
+        return command
+
+    def read_tags(self) -> list:
+        """ Exiftool group:tag names holding the current values of this update """
+        return [f'EXIF:{tag}' for tag in self.dpi] + [f'XMP:{tag}' for tag in self.tags]
+
+    def matches(self, current: dict) -> bool:
+        """ Return True if the current group:tag values of the file already equal the values of this update """
+        if not current:
+            return False
+
+        for tag, value in self.dpi.items():
+            if not _same_number(current.get(f'EXIF:{tag}'), value):
+                return False
+
+        for tag, value in self.tags.items():
+            if not _same_text(current.get(f'XMP:{tag}'), value):
+                return False
+
+        return True
+
+    def __repr__(self):
+        return f'ExifJob({self.name!r})'
+
+
+def group_command(jobs: list) -> list:
+    """ Exiftool arguments of one command applying the identical payload of jobs to all their files """
+    # -v0 prints a header per file, messages are suffixed with the file name
+    return list(jobs[0].payload()) + ['-overwrite_original', '-v0'] + [job.file.as_posix() for job in jobs]
+
+
+def group_jobs(jobs: list, max_files: int=MAX_GROUP_FILES, max_bytes: int=MAX_GROUP_BYTES,
+               max_data: int=MAX_GROUP_DATA) -> list:
+    """
+        Group jobs of the same device with identical payload, eg. DPI only runs or the
+        _RECTO/_VERSO files of a record
+
+        Groups are ordered largest first by the size of their files. Scheduling the longest
+        jobs first keeps large files from becoming a serial tail at the end of a run.
+
+        :returns: list of job lists, every list fits into one group_command
+    """
+    groups = OrderedDict()
+    for job in sorted(jobs, key=lambda j: j.size, reverse=True):
+        groups.setdefault((job.device, job.payload()), list()).append(job)
+
+    chunks = list()
+
+    for (_device, payload), group in groups.items():
+        payload_size = sum(len(os.fsencode(arg)) + 1 for arg in payload)
+        chunk, size, data = list(), payload_size, 0
+
+        for job in group:
+            file_size = len(os.fsencode(job.file.as_posix())) + 1
+            if chunk and (len(chunk) >= max_files or size + file_size > max_bytes or data + job.size > max_data):
+                chunks.append(chunk)
+                chunk, size, data = list(), payload_size, 0
+
+            chunk.append(job)
+            size += file_size
+            data += job.size
+
+        chunks.append(chunk)
+
+    chunks.sort(key=lambda c: sum(job.size for job in c), reverse=True)
+    return chunks
@@ -0,0 +1,342 @@
+import os
+import queue
+import tempfile
+import threading
+from contextlib import contextmanager
+from time import monotonic, perf_counter
+from uuid import uuid4
+
+from modules.exiftool import ExifToolError, ExifToolTimeout, PipelinedExifTool
+from modules.app_globals import get_exif_executable
+from modules.log import init_logging
+
+LOGGER = init_logging(__name__)
+
+
+def get_process_rss(pid: int):
+    """ Return the resident memory of process pid in bytes or None if it can not be determined """
+    if os.name == 'nt':
+        return _get_process_rss_nt(pid)
+
+    try:
+        with open(f'/proc/{pid}/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _get_process_rss_nt(pid: int):
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    process_query_limited_information = 0x1000
+    handle = ctypes.windll.kernel32.OpenProcess(process_query_limited_information, False, pid)
+    if not handle:
+        return None
+
+    try:
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.WorkingSetSize
+    finally:
+        ctypes.windll.kernel32.CloseHandle(handle)
+
+
+class PooledExifTool(PipelinedExifTool):
+    """ Pipelined exiftool instance that counts the commands it executed and measures its cold start """
+    def __init__(self, executable_=None, timeout_=None, window=8):
+        super(PooledExifTool, self).__init__(executable_, timeout_, window)
+        self.command_count = 0
+        self.started = None
+
+        # Started while a job was waiting for it
+        self.on_demand = False
+
+        # Seconds from process start until the first command returned
+        self.startup_latency = None
+
+    def start(self):
+        self.started = perf_counter()
+        self.startup_latency = None
+        super(PooledExifTool, self).start()
+
+    def execute(self, *params):
+        self.command_count += 1
+        result = super(PooledExifTool, self).execute(*params)
+        self._measure_startup()
+        return result
+
+    def execute_batch(self, *commands):
+        self.command_count += len(commands)
+        result = super(PooledExifTool, self).execute_batch(*commands)
+        self._measure_startup()
+        return result
+
+    def _measure_startup(self):
+        if self.startup_latency is None:
+            self.startup_latency = perf_counter() - self.started
+
+    @property
+    def pid(self):
+        if not self.running:
+            return None
+        return self._process.pid
+
+
+class ExifToolPool:
+    """
+        Pool of long-lived -stay_open exiftool processes
+
+        Instances are started lazily up to the pool size, checked out for a
+        single job and returned afterwards. Instances get recycled after
+        max_commands commands or if their resident memory exceeds max_rss.
+
+        Commands running longer than command_timeout get their process killed.
+        Instances that crashed or timed out are replaced by a fresh process.
+
+        warm_up starts the instances in the background ahead of a run. Their first
+        command loads Perl, Image::ExifTool and its write modules, which otherwise
+        delays the first files of every run.
+    """
+    # Recycle an exiftool instance after this number of commands, 0 disables
+    max_commands = 2000
+
+    # Recycle an exiftool instance above this resident memory in bytes, 0 disables
+    max_rss = 256 * 1024 * 1024
+
+    # Seconds a single command may take before its exiftool process is killed, None waits forever
+    command_timeout = 120.0
+
+    # Numbered commands kept in flight per exiftool process
+    pipeline_window = 8
+
+    # Preloads the TIFF/JPEG writer modules, the file does not exist and nothing gets written
+    warm_up_command = ('-ResolutionUnit=2', '-XResolution=300', '-YResolution=300', '-Title=Tiffy',
+                       '-overwrite_original')
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, size: int, executable: str=None):
+        self.size = max(1, size)
+        self.executable = executable or get_exif_executable()
+
+        # Last in, first out keeps recently used and therefore hot processes busy
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._instances = set()
+        self._closed = False
+
+        self.recycled = 0
+        self.timeouts = 0
+        self.restarts = 0
+
+        # Instances started on demand and the seconds jobs waited for their first command
+        self.cold_starts = 0
+        self.startup_time = 0.0
+        # Instances started by warm_up and the seconds their warm up took
+        self.warm_starts = 0
+        self.warm_up_time = 0.0
+
+    @classmethod
+    def shared(cls, size: int) -> 'ExifToolPool':
+        """ Application wide pool that keeps its instances between runs, replaced if size changes """
+        with cls._shared_lock:
+            pool = cls._shared
+            if pool is None or pool._closed or pool.size != max(1, size):
+                if pool is not None:
+                    pool.close()
+                cls._shared = pool = cls(size)
+
+        return pool
+
+    @classmethod
+    def close_shared(cls):
+        with cls._shared_lock:
+            if cls._shared is not None:
+                cls._shared.close()
+                cls._shared = None
+
+    def counters(self) -> dict:
+        with self._lock:
+            return {k: getattr(self, k) for k in ('recycled', 'timeouts', 'restarts', 'cold_starts', 'startup_time',
+                                                  'warm_starts', 'warm_up_time')}
+
+    def warm_up(self, count: int=None):
+        """ Start up to count or pool size instances in background threads, returns the number of instances started """
+        count = self.size if count is None else min(self.size, count)
+
+        with self._lock:
+            if self._closed:
+                return 0
+
+            instances = [self._new_instance() for _idx in range(count - len(self._instances))]
+
+        for et in instances:
+            threading.Thread(target=self._warm_up_instance, args=(et,), daemon=True).start()
+
+        if instances:
+            LOGGER.debug('Warming up %s exiftool instances.', len(instances))
+        return len(instances)
+
+    def _warm_up_instance(self, et: PooledExifTool):
+        missing_file = os.path.join(tempfile.gettempdir(), f'tiffy_warm_up_{uuid4().hex}.tif')
+
+        try:
+            et.start()
+            et.execute(*(os.fsencode(arg) for arg in self.warm_up_command + (missing_file,)))
+        except Exception as e:
+            LOGGER.error('Exiftool warm up failed: %s', e)
+            self.discard(et)
+            return
+
+        with self._lock:
+            self.warm_starts += 1
+            self.warm_up_time += et.startup_latency
+
+        LOGGER.debug('Exiftool instance warmed up in %.3fs', et.startup_latency)
+        self.checkin(et)
+
+    def _new_instance(self) -> PooledExifTool:
+        et = PooledExifTool(executable_=self.executable, timeout_=self.command_timeout, window=self.pipeline_window)
+        self._instances.add(et)
+        return et
+
+    @contextmanager
+    def instance(self, timeout: float=None):
+        """ Check out an exiftool instance for the duration of the with block """
+        et = self.checkout(timeout)
+
+        try:
+            yield et
+        except ExifToolError as e:
+            # Exiftool crashed or hung, the next check out starts a fresh process
+            with self._lock:
+                self.restarts += 1
+                if isinstance(e, ExifToolTimeout):
+                    self.timeouts += 1
+
+            LOGGER.error('Exiftool instance failed and will be restarted: %s', e)
+            self.discard(et)
+            raise
+        except Exception:
+            # Process state is unknown after an error, do not hand it out again
+            self.discard(et)
+            raise
+        else:
+            self._record_cold_start(et)
+            self.checkin(et)
+
+    def _record_cold_start(self, et: PooledExifTool):
+        """ Account the first command of an instance started on demand as startup latency of the run """
+        if et.on_demand and et.startup_latency is not None:
+            et.on_demand = False
+            with self._lock:
+                self.cold_starts += 1
+                self.startup_time += et.startup_latency
+
+    def checkout(self, timeout: float=None) -> PooledExifTool:
+        if self._closed:
+            raise ValueError('ExifToolPool is closed.')
+
+        deadline = None if timeout is None else monotonic() + timeout
+
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                if len(self._instances) < self.size:
+                    et = self._new_instance()
+                    et.on_demand = True
+
+                    try:
+                        et.start()
+                    except Exception:
+                        # Leave room to start another instance on the next checkout
+                        self._instances.discard(et)
+                        raise
+                    LOGGER.debug('Started pooled exiftool instance %s/%s', len(self._instances), self.size)
+                    return et
+
+            # Instances still warming up may get discarded, check the pool size again
+            wait = 0.25 if deadline is None else min(0.25, deadline - monotonic())
+            if wait <= 0:
+                raise queue.Empty
+
+            try:
+                return self._idle.get(timeout=wait)
+            except queue.Empty:
+                pass
+
+    def checkin(self, et: PooledExifTool):
+        if self._closed:
+            self.discard(et)
+            return
+
+        if self._needs_recycle(et):
+            LOGGER.debug('Recycling exiftool instance after %s commands.', et.command_count)
+            with self._lock:
+                self.recycled += 1
+
+            try:
+                et.terminate()
+                et.command_count = 0
+                et.on_demand = True
+                et.start()
+            except Exception as e:
+                # The commands of the instance completed, a new one is started on the next checkout
+                LOGGER.error('Could not restart recycled exiftool instance: %s', e)
+                self.discard(et)
+                return
+
+        self._idle.put(et)
+
+    def discard(self, et: PooledExifTool):
+        with self._lock:
+            self._instances.discard(et)
+
+        try:
+            et.terminate()
+        except Exception as e:
+            LOGGER.error('Error terminating exiftool instance: %s', e)
+
+    def close(self):
+        """ Terminate all idle instances, checked out instances terminate on check in """
+        self._closed = True
+
+        while True:
+            try:
+                et = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(et)
+
+        LOGGER.debug('ExifToolPool closed. Recycled %s, restarted %s instances, %s timeouts.',
+                     self.recycled, self.restarts, self.timeouts)
+
+    def _needs_recycle(self, et: PooledExifTool) -> bool:
+        if not et.running:
+            return True
+
+        if self.max_commands and et.command_count >= self.max_commands:
+            return True
+
+        if self.max_rss:
+            rss = get_process_rss(et.pid)
+            if rss and rss > self.max_rss:
+                LOGGER.debug('Exiftool instance exceeded memory limit: %s bytes', rss)
+                return True
+
+        return False
@@ -0,0 +1,121 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from modules.exiftool import ExifToolError
+from modules.exif_pool import ExifToolPool
+from modules.native.common import CorruptFileError, NativeWriteError
+from modules.native.reader import read_metadata
+from modules.log import init_logging
+
+LOGGER = init_logging(__name__)
+
+# Image file suffixes processed by Tiffy
+IMG_FILE_TYPES = ['.tif', '.tiff', '.jpg', '.jpeg']
+
+
+class ExifReader:
+    """
+        Reads the metadata of image files
+
+        Files are read from their headers if possible. The remaining files are read by
+        exiftool with -fast2 and tag filtering in chunks, running on several pooled
+        processes in parallel.
+    """
+    # Tags read by default
+    meta_data_tags = ['XMP:Title', 'XMP:Creator', 'XMP:Description', 'XMP:Subject', 'XMP:Rights',
+                      'IPTC:ObjectName', 'IPTC:By-line', 'IPTC:Caption-Abstract', 'IPTC:Keywords',
+                      'IPTC:CopyrightNotice', 'EXIF:Artist', 'EXIF:ImageDescription', 'EXIF:Copyright',
+                      'ResolutionUnit', 'XResolution', 'YResolution', 'ImageWidth', 'ImageHeight']
+
+    def __init__(self, exif_pool: ExifToolPool, workers: int=1, native_read: bool=True, chunk_size: int=500):
+        """
+            :param workers: number of exiftool processes reading in parallel
+            :param native_read: read supported files with the built-in header parser
+            :param chunk_size: maximum number of files per exiftool call
+        """
+        self.exif_pool = exif_pool
+        self.workers = max(1, workers)
+        self.native_read = native_read
+        self.chunk_size = chunk_size
+
+    def iter_meta_data(self, img_files, tags=None):
+        """
+            Yield the metadata of img_files as one dict of group:tag: value per file, in the
+            format of ExifTool.get_metadata_batch. Damaged files yield an 'ExifTool:Error' entry.
+
+            Results of exiftool are yielded as each chunk arrives, so memory stays bounded
+            by the number of chunks in flight.
+
+            :param img_files: iterable of image file paths
+            :param tags: group:tag names for exiftool to read, defaults to meta_data_tags
+        """
+        slow_files = list()
+
+        for img_file in img_files:
+            if not self.native_read:
+                slow_files.append(img_file.as_posix())
+                continue
+
+            try:
+                yield self.read_meta_data_native(img_file)
+            except CorruptFileError as e:
+                # Flag damaged files instead of handing them to exiftool
+                LOGGER.warning('Damaged image file %s: %s', img_file.name, e)
+                yield {'SourceFile': img_file.as_posix(), 'ExifTool:Error': f'{e}'}
+            except (NativeWriteError, OSError, ValueError) as e:
+                LOGGER.debug('Native read of %s not possible, using exiftool: %s', img_file.name, e)
+                slow_files.append(img_file.as_posix())
+
+        if slow_files:
+            yield from self._iter_exiftool_meta_data(slow_files, tags or self.meta_data_tags)
+
+    def _iter_exiftool_meta_data(self, files: list, tags: list):
+        workers = self.workers
+        params = ['-fast2'] + [f'-{tag}' for tag in tags]
+
+        # Spread small file lists across all processes
+        chunk_size = max(1, min(self.chunk_size, -(-len(files) // workers)))
+        chunks = (files[idx:idx + chunk_size] for idx in range(0, len(files), chunk_size))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+
+            for chunk in chunks:
+                pending.add(executor.submit(self._read_chunk, chunk, params))
+
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from future.result()
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+
+    def _read_chunk(self, chunk: list, params: list) -> list:
+        try:
+            with self.exif_pool.instance() as et:
+                return et.execute_json(*params, *chunk)
+        except (ExifToolError, ValueError) as e:
+            LOGGER.error('Could not read metadata of %s files: %s', len(chunk), e)
+            return [{'SourceFile': file, 'ExifTool:Error': f'{e}'} for file in chunk]
+
+    def read_tags(self, img_files, tags) -> dict:
+        """
+            Read the current values of tags eg. ['XMP:Title'] of all img_files
+
+            :returns: posix path: dict of group:tag: value
+        """
+        return {metadata.get('SourceFile'): metadata for metadata in self.iter_meta_data(img_files, tags)}
+
+    @staticmethod
+    def read_meta_data_native(img_file: Path) -> dict:
+        """
+            Read the metadata of Exif.xmp_keys, iptc_keys, exif_keys, resolution and dimensions
+            from the file header without exiftool. Same format as an entry of iter_meta_data.
+
+            :raises CorruptFileError: if the file is truncated or damaged
+            :raises NativeWriteError: if the file needs to be read by exiftool
+        """
+        return read_metadata(img_file)
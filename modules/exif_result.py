@@ -0,0 +1,209 @@
+import re
+
+from modules.detect_language import get_translation
+
+# translate strings
+lang = get_translation()
+lang.install()
+_ = lang.gettext
+
+
+class ExifResult:
+    """ Outcome of the metadata update of a single file """
+    __slots__ = ('file', 'status', 'updated', 'unchanged', 'failed', 'warnings', 'errors', 'queue_time', 'exec_time')
+
+    UPDATED = 'updated'
+    UNCHANGED = 'unchanged'
+    FAILED = 'failed'
+
+    # Counter lines of exiftool eg. '    1 image files updated'
+    count_pattern = re.compile(r'^\s*(\d+) (image files updated|image files unchanged|'
+                               r'files weren\'t updated due to errors)', re.MULTILINE)
+    count_keys = {'image files updated': 'updated', 'image files unchanged': 'unchanged',
+                  'files weren\'t updated due to errors': 'failed'}
+
+    # File headers and unchanged files of -v0 output of commands with several files
+    file_pattern = re.compile(r'^======== (.+?)\r?$', re.MULTILINE)
+    unchanged_pattern = re.compile(r'^Nothing changed in (.+?)\r?$', re.MULTILINE)
+
+    # Messages of commands with several files are suffixed with ' - ' and the file name
+    message_kinds = ('Warning', 'Error')
+
+    def __init__(self, file: str, status: str, updated: int=0, unchanged: int=0, failed: int=0,
+                 warnings: tuple=(), errors: tuple=(), queue_time: float=0.0, exec_time: float=0.0):
+        self.file = file
+        self.status = status
+        self.updated = updated
+        self.unchanged = unchanged
+        self.failed = failed
+        self.warnings = tuple(warnings)
+        self.errors = tuple(errors)
+        self.queue_time = queue_time
+        self.exec_time = exec_time
+
+    @classmethod
+    def from_output(cls, file: str, stdout: str, stderr: str, queue_time: float=0.0, exec_time: float=0.0):
+        """ Create a result from the stdout and stderr output of a exiftool write command """
+        counts = dict(updated=0, unchanged=0, failed=0)
+        for match in cls.count_pattern.finditer(stdout):
+            counts[cls.count_keys[match.group(2)]] += int(match.group(1))
+
+        warnings, errors = list(), list()
+        for line in stderr.splitlines():
+            line = line.strip()
+            if line.startswith('Warning'):
+                warnings.append(line)
+            elif line:
+                errors.append(line)
+
+        if counts['failed'] or (errors and not counts['updated']):
+            status = cls.FAILED
+        elif counts['unchanged'] and not counts['updated']:
+            status = cls.UNCHANGED
+        else:
+            status = cls.UPDATED
+
+        return cls(file, status, warnings=warnings, errors=errors, queue_time=queue_time, exec_time=exec_time,
+                   **counts)
+
+    @classmethod
+    def from_verbose_output(cls, files: list, stdout: str, stderr: str, queue_time: float=0.0,
+                            exec_time: float=0.0) -> list:
+        """
+            Create per file results from the output of a exiftool command with several files and -v0
+
+            :param files: list of (result file name, path as passed to exiftool)
+        """
+        processed = set(cls.file_pattern.findall(stdout))
+        unchanged = set(cls.unchanged_pattern.findall(stdout))
+        messages = cls.file_messages(stderr, [path for _name, path in files])
+
+        # Without per file markers only a command that changed no file is known to be unchanged
+        counts = dict(updated=0, unchanged=0, failed=0)
+        for match in cls.count_pattern.finditer(stdout):
+            counts[cls.count_keys[match.group(2)]] += int(match.group(1))
+        all_unchanged = counts['unchanged'] and not counts['updated']
+
+        results = list()
+
+        for name, path in files:
+            warnings, errors = messages.get(path, ([], []))
+
+            if errors:
+                result = cls(name, cls.FAILED, failed=1, warnings=warnings, errors=errors)
+            elif path not in processed:
+                result = cls.failure(name, _('Exiftool hat die Datei nicht verarbeitet.'))
+            else:
+                status = cls.UNCHANGED if all_unchanged or path in unchanged else cls.UPDATED
+                result = cls(name, status, warnings=warnings, **{status: 1})
+
+            result.queue_time, result.exec_time = queue_time, exec_time
+            results.append(result)
+
+        return results
+
+    @classmethod
+    def file_messages(cls, stderr: str, paths: list) -> dict:
+        """
+            Assign the messages of a command with several files to their file
+
+            The file name is matched against the known paths, longest first, as paths and
+            messages may contain ' - ' themselves.
+
+            :returns: path: (list of warnings, list of errors)
+        """
+        paths = set(paths)
+        messages = dict()
+
+        for line in stderr.splitlines():
+            line = line.strip()
+            kind, sep, msg = line.partition(': ')
+            if not sep or kind not in cls.message_kinds:
+                continue
+
+            # The first separator followed by a known path splits off the longest path
+            idx = msg.find(' - ')
+            while idx != -1 and msg[idx + 3:] not in paths:
+                idx = msg.find(' - ', idx + 1)
+
+            if idx != -1:
+                messages.setdefault(msg[idx + 3:], ([], []))[kind == 'Error'].append(f'{kind}: {msg[:idx]}')
+
+        return messages
+
+    @classmethod
+    def failure(cls, file: str, error: str, queue_time: float=0.0, exec_time: float=0.0):
+        return cls(file, cls.FAILED, failed=1, errors=(error,), queue_time=queue_time, exec_time=exec_time)
+
+    @property
+    def ok(self) -> bool:
+        return self.status != self.FAILED
+
+    def message(self) -> str:
+        """ Human readable summary for the results tree """
+        msg = {self.UPDATED: _('Aktualisiert'), self.UNCHANGED: _('Unverändert'),
+               self.FAILED: _('Fehlgeschlagen')}[self.status]
+
+        details = self.errors + self.warnings
+        if details:
+            msg += ': ' + '; '.join(details)
+
+        return msg
+
+    def __repr__(self):
+        return f'ExifResult({self.file!r}, {self.status!r})'
+
+
+class ExifRunSummary:
+    """ Aggregate counters of all results of a run """
+    __slots__ = ('updated', 'unchanged', 'failed', 'warnings', 'errors', 'queue_time', 'exec_time',
+                 'timeouts', 'restarts', 'cold_starts', 'startup_time', 'cancelled', 'missing')
+
+    def __init__(self):
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.warnings = 0
+        self.errors = 0
+        self.queue_time = 0.0
+        self.exec_time = 0.0
+        self.timeouts = 0
+        self.restarts = 0
+        # Exiftool processes started during the run and the seconds files waited for them
+        self.cold_starts = 0
+        self.startup_time = 0.0
+        # Queued files dropped by cancelling the run
+        self.cancelled = 0
+        # Failed files without a row in the spreadsheet
+        self.missing = 0
+
+    def add(self, result: ExifResult):
+        if result.status == ExifResult.UPDATED:
+            self.updated += 1
+        elif result.status == ExifResult.UNCHANGED:
+            self.unchanged += 1
+        else:
+            self.failed += 1
+
+        self.warnings += len(result.warnings)
+        self.errors += len(result.errors)
+        self.queue_time += result.queue_time
+        self.exec_time += result.exec_time
+
+    @property
+    def total(self) -> int:
+        return self.updated + self.unchanged + self.failed
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def message(self) -> str:
+        msg = _('{0} aktualisiert, {1} unverändert, {2} fehlgeschlagen, {3} Warnungen. '
+                'Exiftool Zeitüberschreitungen: {4} Neustarts: {5} Kaltstarts: {6} ({7:.2f}s)'
+                ).format(self.updated, self.unchanged, self.failed, self.warnings, self.timeouts, self.restarts,
+                         self.cold_starts, self.startup_time)
+
+        if self.cancelled:
+            msg += ' ' + _('Abgebrochen, {0} Dateien nicht bearbeitet.').format(self.cancelled)
+
+        return msg
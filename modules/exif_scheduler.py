@@ -0,0 +1,227 @@
+from collections import OrderedDict, deque
+from time import perf_counter
+
+from modules.log import init_logging
+
+LOGGER = init_logging(__name__)
+
+
+class JobScheduler:
+    """
+        Keeps up to window batches of ExifJob's in flight per storage device
+
+        Jobs are queued as groups which are never split across batches, see group_jobs.
+        Every device has its own queue and window, so a slow network share does not take
+        the budget of a local disk. limit caps the batches in flight of all devices.
+        A new batch is dispatched as soon as a batch finished, the run is complete once
+        the queues are empty and no batch is in flight.
+    """
+    def __init__(self, dispatch, batch_size, window: int=1, limit: int=None):
+        """
+            :param dispatch: callable receiving a list of ExifJob's, has to report completion with done()
+            :param batch_size: callable receiving the number of queued files of the device and its window,
+                               returns the next batch size
+            :param window: default number of batches in flight per device
+            :param limit: number of batches in flight of all devices, None for no limit
+        """
+        self.dispatch = dispatch
+        self.batch_size = batch_size
+        self.window = max(1, window)
+        self.limit = limit
+
+        self.queues = OrderedDict()
+        self.queued = dict()
+        self.windows = dict()
+        self.in_flight = dict()
+        self.queued_files = 0
+        self.paused = False
+
+    def extend(self, groups):
+        for group in groups:
+            device = group[0].device
+            self.queues.setdefault(device, deque()).append(group)
+            self.queued[device] = self.queued.get(device, 0) + len(group)
+            self.queued_files += len(group)
+
+    @property
+    def devices(self) -> list:
+        return list(self.queues)
+
+    def device_window(self, device) -> int:
+        return self.windows.get(device, self.window)
+
+    def set_window(self, device, window: int):
+        self.windows[device] = max(1, window)
+
+    @property
+    def total_in_flight(self) -> int:
+        return sum(self.in_flight.values())
+
+    def fill(self) -> int:
+        """ Dispatch batches round robin over the devices until their windows are full """
+        dispatched, progress = 0, not self.paused
+
+        while progress:
+            progress = False
+
+            for device, queue in self.queues.items():
+                if self.limit and self.total_in_flight >= self.limit:
+                    return dispatched
+
+                window = self.device_window(device)
+                if not queue or self.in_flight.get(device, 0) >= window:
+                    continue
+
+                batch = list()
+                batch_size = self.batch_size(self.queued[device], window)
+
+                # Groups are never split, a single group may exceed the batch size
+                while queue and len(batch) < batch_size:
+                    batch += queue.popleft()
+
+                self.queued[device] -= len(batch)
+                self.queued_files -= len(batch)
+                self.in_flight[device] = self.in_flight.get(device, 0) + 1
+                dispatched += 1
+                progress = True
+                self.dispatch(batch)
+
+        return dispatched
+
+    def clear(self) -> list:
+        """ Remove all queued jobs, batches in flight are not affected. Returns the removed jobs. """
+        jobs = [job for queue in self.queues.values() for group in queue for job in group]
+
+        self.queues.clear()
+        self.queued.clear()
+        self.queued_files = 0
+        return jobs
+
+    def done(self, batch: list):
+        """ Report a finished batch """
+        device = batch[0].device if batch else None
+
+        if self.in_flight.get(device, 0) <= 0:
+            LOGGER.error('Scheduler received more finished batches than it dispatched.')
+            return
+        self.in_flight[device] -= 1
+
+    @property
+    def finished(self) -> bool:
+        return not self.queued_files and not self.total_in_flight
+
+    def __len__(self):
+        return self.queued_files
+
+
+class ConcurrencyController:
+    """
+        Adapts the number of batches in flight to the observed throughput
+
+        Completed files are sampled over windows of at least sample_time seconds.
+        Hill climbing with additive increase, multiplicative decrease: the limit grows
+        by one while files/s improves. It shrinks by decrease_factor when throughput drops
+        or the per file latency rises without a throughput gain, eg. because a network
+        drive is saturated. A change that did not pay off is taken back and the limit
+        is held for probe_interval windows before probing the other direction.
+    """
+    # Seconds and minimum number of files per sample window
+    sample_time = 2.0
+    min_samples = 8
+
+    # Relative change of files/s considered a gain or a loss
+    tolerance = 0.05
+
+    # Per file latency rise considered congestion
+    latency_factor = 1.5
+
+    decrease_factor = 0.5
+
+    # Windows to hold the limit before probing another increase
+    probe_interval = 5
+
+    HOLD, INCREASE, DECREASE = 'hold', 'increase', 'decrease'
+
+    def __init__(self, initial: int, minimum: int=1, maximum: int=4, clock=perf_counter):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(self.maximum, max(self.minimum, initial))
+        self.clock = clock
+
+        self.last_action = self.HOLD
+        self.last_throughput = None
+        self.last_latency = None
+        self.holds = 0
+        self.probe_step = -1
+
+        self._reset_window()
+
+    def _reset_window(self):
+        self.window_start = self.clock()
+        self.window_files = 0
+        self.window_exec_time = 0.0
+
+    def record(self, exec_time: float=0.0) -> bool:
+        """ Record a completed file, returns True if the limit changed """
+        self.window_files += 1
+        self.window_exec_time += exec_time
+
+        elapsed = self.clock() - self.window_start
+        if elapsed < self.sample_time or self.window_files < self.min_samples:
+            return False
+
+        throughput = self.window_files / elapsed
+        latency = self.window_exec_time / self.window_files
+        self._reset_window()
+
+        return self.decide(throughput, latency)
+
+    def _probe(self) -> int:
+        """ Alternate probing more and fewer workers within the bounds """
+        self.probe_step = -self.probe_step
+        if not self.minimum <= self.limit + self.probe_step <= self.maximum:
+            self.probe_step = -self.probe_step
+        return self.probe_step
+
+    def decide(self, throughput: float, latency: float) -> bool:
+        """ Adapt the limit to the throughput and per file latency of the last sample window """
+        previous_limit = self.limit
+        # Steps taking back an unsuccessful change are followed by holding the limit
+        revert = False
+
+        if self.last_throughput is None:
+            step = self._probe()
+        else:
+            gain = throughput > self.last_throughput * (1 + self.tolerance)
+            loss = throughput < self.last_throughput * (1 - self.tolerance) or \
+                (not gain and latency > self.last_latency * self.latency_factor)
+
+            if self.last_action == self.INCREASE:
+                # Keep climbing while it pays off, otherwise take the increase back
+                step, revert = (1, False) if gain else (-1, True)
+            elif self.last_action == self.DECREASE:
+                # Went down too far if throughput dropped
+                step, revert = (1, True) if loss else (-1 if gain else 0, False)
+            elif loss:
+                # Congestion at a stable limit, back off multiplicatively
+                step = int(self.limit * self.decrease_factor) - self.limit or -1
+            else:
+                self.holds += 1
+                step = self._probe() if self.holds >= self.probe_interval else 0
+
+        self.limit = min(self.maximum, max(self.minimum, self.limit + step))
+        self.last_throughput, self.last_latency = throughput, latency
+
+        if self.limit == previous_limit:
+            self.last_action = self.HOLD
+            LOGGER.debug('Concurrency stays at %s at %.1f files/s, %.3fs per file.', self.limit, throughput, latency)
+            return False
+
+        if revert:
+            self.last_action = self.HOLD
+        else:
+            self.last_action = self.INCREASE if self.limit > previous_limit else self.DECREASE
+        self.holds = 0
+        LOGGER.info('Concurrency %s -> %s at %.1f files/s, %.3fs per file.',
+                    previous_limit, self.limit, throughput, latency)
+        return True
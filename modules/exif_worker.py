@@ -1,95 +1,71 @@
-from collections import OrderedDict
-from pathlib import Path
-from PyQt5 import QtCore
+from modules.excel_reader import ExcelReader
+from modules.exif_pool import ExifToolPool
+from modules.exif_reader import ExifReader, IMG_FILE_TYPES
+from modules.job_planner import JobPlanner
 
-from modules.exiftool import ExifTool, fsencode
-from modules.app_globals import get_exif_executable
-from modules.detect_language import get_translation
-from modules.log import init_logging
 
-LOGGER = init_logging(__name__)
+class Exif:
+    """
+        Exiftool settings of the GUI, runs are carried out by modules.engine
 
-# translate strings
-lang = get_translation()
-lang.install()
-_ = lang.gettext
-
-
-class Exif(QtCore.QObject):
-    result = QtCore.pyqtSignal(str, str)
-    file_types = ['.tif', '.tiff', '.jpg', '.jpeg']
+        Settings are stored as class attributes and passed to the engine.Job of a run.
+    """
+    file_types = IMG_FILE_TYPES
 
     xmp_keys = ['XMP:Title', 'XMP:Creator', 'XMP:Description', 'XMP:Subject', 'XMP:Rights']
     iptc_keys = ['IPTC:ObjectName', 'IPTC:By-line', 'IPTC:Caption-Abstract', 'IPTC:Keywords', 'IPTC:CopyrightNotice']
     exif_keys = [None, 'EXIF:Artist', 'EXIF:ImageDescription', None, 'EXIF:Copyright']
 
+    # Tags read by ExifReader.iter_meta_data
+    meta_data_tags = ExifReader.meta_data_tags
+
     # Actual Exiftool tag names
-    exiftool_tags = ['-Title', '-Creator', '-Description', '-Subject', '-Rights']
+    exiftool_tags = JobPlanner.exiftool_tags
 
-    spreadsheet_map = OrderedDict()
-    spreadsheet_map.update({
-        'file': 'B', 'title': 'K', 'author': None, 'description': None, 'keywords': 'B', 'copyright': 'EG'})
+    spreadsheet_map = ExcelReader.spreadsheet_map
 
-    # Maximum number of concurrent exiftool instances (running in QThreadPool)
+    # Maximum number of concurrent exiftool instances
     # Note that performance is mainly influenced by network/drive read and write speed
     # Having to many instances read and write may greatly reduces performance
     max_threads = 4
+    min_threads = 1
 
-    def __init__(self, img_path: Path, ideal_thread_count: int=2):
-        super(Exif, self).__init__()
-        self.img_path = img_path
-        self.current_file_name = None
-
-        self.thread_pool = QtCore.QThreadPool(parent=self)
-        thread_count = max(1, min(self.max_threads, round(ideal_thread_count * 0.75)))
-        self.thread_pool.setMaxThreadCount(thread_count)
-        self.thread_pool.setExpiryTimeout(90000)
-        self.thread_pool.clear()
-
-    def update_meta_data(self, cmd_list, file_name):
-        self.current_file_name = file_name
-
-        exif_runner = ExifRunner(cmd_list, file_name, self.update_result)
-        self.thread_pool.start(exif_runner)
-        LOGGER.debug('Started Exif Runner %s/%s', self.thread_pool.activeThreadCount(), self.max_threads)
-
-    def update_result(self, file_name, result):
-        self.result.emit(file_name, result)
-
-    def read_meta_data(self):
-        with ExifTool(executable_=get_exif_executable()) as et:
-            metadata = et.get_metadata_batch(self.get_img_files().as_posix())
-
-        if not metadata:
-            return
+    # Adapt the number of concurrent instances between min_threads and max_threads
+    # to the observed throughput, see ConcurrencyController
+    adaptive_threads = True
 
-        self.result.emit(metadata)
+    # Number of files per exiftool round trip, 0 picks the size from the observed per file latency
+    batch_size = 0
 
-    def get_img_files(self):
-        for img_file in self.img_path.glob('*.*'):
-            if f'{img_file.suffix}'.casefold() in self.file_types:
-                yield img_file
+    # Write supported files and tags with the built-in writers, exiftool handles everything else
+    native_write = True
 
+    # Read metadata with the built-in header parser, exiftool is only used for files it can not read
+    native_read = True
 
-class ExifRunnerSignals(QtCore.QObject):
-    result = QtCore.pyqtSignal(str, str)
+    # Maximum number of files per exiftool call when reading metadata
+    read_chunk_size = 500
 
+    # Keep the exiftool processes of the application wide pool running between runs
+    keep_exiftool_running = True
 
-class ExifRunner(QtCore.QRunnable):
-    def __init__(self, cmd_list, current_file, result_callback):
-        super(ExifRunner, self).__init__()
-        self.cmd_list = cmd_list
-        self.current_file = current_file
+    # Find image files in the subdirectories of the image directory
+    recursive = True
 
-        self.signals = ExifRunnerSignals()
-        self.signals.result.connect(result_callback)
+    # Glob patterns of image files and of files and directories to skip, None for the FileScanner defaults
+    include_patterns = None
+    exclude_patterns = None
 
-    def run(self):
-        with ExifTool(executable_=get_exif_executable()) as et:
-            LOGGER.debug('Sending commands %s', self.cmd_list)
+    @classmethod
+    def thread_count(cls, ideal_thread_count: int) -> int:
+        return max(1, min(cls.max_threads, round(ideal_thread_count * 0.75)))
 
-            params = map(fsencode, self.cmd_list)
-            result = et.execute(*params).decode('UTF-8')
+    @classmethod
+    def warm_up(cls, ideal_thread_count: int) -> int:
+        """ Start the exiftool processes of the next run in the background """
+        if not cls.keep_exiftool_running:
+            return 0
 
-            LOGGER.debug('Exiftool result: %s %s', self.current_file, result)
-            self.signals.result.emit(self.current_file, result)
+        workers = cls.thread_count(ideal_thread_count)
+        pool_size = cls.max_threads if cls.adaptive_threads else workers
+        return ExifToolPool.shared(pool_size).warm_up(workers)
@@ -0,0 +1,242 @@
+import threading
+from time import perf_counter
+
+from modules.exiftool import ExifToolError, fsencode
+from modules.exif_pool import ExifToolPool
+from modules.exif_result import ExifResult
+from modules.exif_job import ExifJob, group_command, group_jobs
+from modules.exif_import import ExifImport
+from modules.native.common import CorruptFileError, NativeWriteError
+from modules.native.reader import check_file
+from modules.native.writer import can_write_native, write_native
+from modules.staging import Stager, StagingError
+from modules.detect_language import get_translation
+from modules.log import init_logging
+
+LOGGER = init_logging(__name__)
+
+# translate strings
+lang = get_translation()
+lang.install()
+_ = lang.gettext
+
+
+class BatchSize:
+    """
+        Number of files to send to exiftool per round trip
+
+        With a fixed size of 0 the size is picked from the observed per file latency:
+        fast files get packed into larger batches until a round trip takes about target_time.
+    """
+    # Aim for round trips of about this many seconds
+    target_time = 0.5
+
+    # Upper bound of files per round trip
+    max_size = 32
+
+    def __init__(self, size: int=0):
+        self.size = size
+        self.latency = None
+        self._lock = threading.Lock()
+
+    def update(self, elapsed: float, num_files: int):
+        """ Report the duration of a round trip with num_files files """
+        if not num_files:
+            return
+
+        with self._lock:
+            file_latency = elapsed / num_files
+            if self.latency is None:
+                self.latency = file_latency
+            else:
+                # Exponential moving average
+                self.latency = 0.7 * self.latency + 0.3 * file_latency
+
+    def get(self, remaining: int, thread_count: int) -> int:
+        if self.size:
+            return max(1, min(self.size, remaining))
+
+        if not self.latency:
+            # Measure the first round trips with single files
+            return 1
+
+        size = max(1, min(self.max_size, round(self.target_time / self.latency)))
+
+        # Do not starve the thread pool at the end of the queue
+        share = -(-remaining // max(1, thread_count))
+        return max(1, min(size, share))
+
+
+class ExifWriter:
+    """
+        Writes batches of ExifJob's and returns one ExifResult per job
+
+        Supported files and tags are written by the built-in writers, the remaining jobs
+        of a batch share a single round trip to a pooled exiftool process. Safe to call
+        from several threads, every call checks out its own exiftool process.
+    """
+    def __init__(self, exif_pool: ExifToolPool, batch_sizer: BatchSize=None, native_write: bool=True,
+                 stager: Stager=None):
+        self.exif_pool = exif_pool
+        self.batch_sizer = batch_sizer or BatchSize()
+        self.native_write = native_write
+        self.stager = stager
+
+    def write(self, batch: list, queue_time: float=0.0) -> list:
+        """ Write batch, unexpected errors are reported as failures of every job of the batch """
+        try:
+            if self.stager:
+                return self.process_staged(batch, queue_time)
+            return self.process(batch, queue_time)
+        except Exception as e:
+            # Every job needs a result, otherwise the run never completes
+            LOGGER.exception('Exif writer failed: %s', e)
+            return [ExifResult.failure(job.name, _('Unerwarteter Fehler: {}').format(e), queue_time)
+                    for job in batch]
+
+    def process_staged(self, batch: list, queue_time: float) -> list:
+        """ Write local copies of files on network shares and write them back, see Stager """
+        staged = self.stager.stage(batch)
+        staged_by_name = {s.job.name: s for s in staged.values()}
+
+        try:
+            results = self.process([staged[job].job if job in staged else job for job in batch], queue_time)
+
+            for idx, result in enumerate(results):
+                staged_file = staged_by_name.get(result.file)
+                if not staged_file or result.status != ExifResult.UPDATED:
+                    continue
+
+                try:
+                    self.stager.commit(staged_file)
+                except (StagingError, OSError) as e:
+                    LOGGER.error('Could not write back staged file %s: %s', staged_file.source, e)
+                    results[idx] = ExifResult.failure(result.file, _('Zurückschreiben fehlgeschlagen: {}').format(e),
+                                                      queue_time, result.exec_time)
+        finally:
+            self.stager.release(staged.values())
+
+        return results
+
+    def process(self, batch: list, queue_time: float) -> list:
+        results, exif_batch = list(), list()
+
+        for job in batch:
+            result = self.try_native(job, queue_time) if self.native_write else None
+
+            if result:
+                results.append(result)
+            else:
+                exif_batch.append(job)
+
+        if exif_batch:
+            LOGGER.debug('Sending %s commands %s', len(exif_batch), exif_batch)
+
+            try:
+                results += self.execute(exif_batch, queue_time)
+            except ExifToolError as e:
+                # Find the culprit by retrying every file of the batch once on a fresh process
+                LOGGER.error('Exiftool batch of %s files failed, retrying files one by one: %s', len(exif_batch), e)
+                results += [self.retry(job, queue_time) for job in exif_batch]
+
+        return results
+
+    def import_jobs(self, jobs: list, exif_import: ExifImport, queue_time: float=0.0):
+        """ Yield a result per job, jobs not written natively are applied by exif_import, see ExifImport """
+        pending = {job.name for job in jobs}
+
+        try:
+            for result in self._import_jobs(jobs, exif_import, queue_time):
+                pending.discard(result.file)
+                yield result
+        except Exception as e:
+            LOGGER.exception('Exif import failed: %s', e)
+            for name in pending:
+                yield ExifResult.failure(name, _('Unerwarteter Fehler: {}').format(e), queue_time)
+
+    def _import_jobs(self, jobs: list, exif_import: ExifImport, queue_time: float):
+        import_jobs = list()
+
+        for job in jobs:
+            result = self.try_native(job, queue_time) if self.native_write else None
+
+            if result:
+                yield result
+            else:
+                import_jobs.append(job)
+
+        for result in exif_import.run(import_jobs, queue_time):
+            LOGGER.debug('Exiftool import result: %s %s', result.file, result.status)
+            yield result
+
+    @classmethod
+    def try_native(cls, job: ExifJob, queue_time: float):
+        """ Result of a native write, a failure if the file is damaged or None if exiftool needs to handle it """
+        try:
+            return cls.write_native(job, queue_time)
+        except CorruptFileError as e:
+            LOGGER.warning('Damaged image file %s: %s', job.name, e)
+            return ExifResult.failure(job.name, _('Bilddatei ist beschädigt: {}').format(e), queue_time)
+
+    @staticmethod
+    def write_native(job: ExifJob, queue_time: float):
+        """
+            Write with the built-in writers, returns None if exiftool needs to handle the job
+
+            :raises CorruptFileError: if the file is damaged and should not be passed to exiftool
+        """
+        if not can_write_native(job.file, job.tags, job.dpi):
+            # Damaged headers may stall exiftool, check them up front
+            check_file(job.file)
+            return None
+
+        start = perf_counter()
+
+        try:
+            write_native(job.file, job.tags, job.dpi)
+        except CorruptFileError:
+            raise
+        except (NativeWriteError, OSError) as e:
+            LOGGER.debug('Native write of %s not possible, falling back to exiftool: %s', job.name, e)
+            return None
+
+        return ExifResult(job.name, ExifResult.UPDATED, updated=1, queue_time=queue_time,
+                          exec_time=perf_counter() - start)
+
+    def execute(self, batch, queue_time: float):
+        """ Files with identical payload are updated by a single command with several file arguments """
+        groups = group_jobs(batch)
+        commands = [list(map(fsencode, group_command(group) if len(group) > 1 else group[0].command()))
+                    for group in groups]
+
+        with self.exif_pool.instance() as et:
+            start = perf_counter()
+            outputs = et.execute_batch(*commands)
+            errors = et.last_stderr
+            elapsed = perf_counter() - start
+
+        self.batch_sizer.update(elapsed, len(batch))
+
+        # Files of a batch share one round trip, attribute an equal share to every file
+        exec_time = elapsed / len(batch)
+        results = list()
+
+        for group, output, error in zip(groups, outputs, errors):
+            output, error = output.decode('UTF-8', 'replace'), error.decode('UTF-8', 'replace')
+
+            if len(group) > 1:
+                results += ExifResult.from_verbose_output([(job.name, job.file.as_posix()) for job in group],
+                                                          output, error, queue_time, exec_time)
+            else:
+                results.append(ExifResult.from_output(group[0].name, output, error, queue_time, exec_time))
+
+        return results
+
+    def retry(self, job, queue_time: float):
+        try:
+            return self.execute([job], queue_time)[0]
+        except ExifToolError as e:
+            LOGGER.error('Exiftool failed on file %s: %s', job.name, e)
+
+        return ExifResult.failure(job.name, _('Exiftool ist abgestürzt oder hat nicht rechtzeitig geantwortet.'),
+                                  queue_time)
@@ -63,9 +63,18 @@ from __future__ import unicode_literals
 import sys
 import subprocess
 import os
+import asyncio
+import queue
+import selectors
+import threading
 import json
+import re
 import warnings
 import codecs
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from contextlib import asynccontextmanager
+from time import monotonic
 
 try:        # Py3k compatibility
     basestring
@@ -83,10 +92,35 @@ If the executable is not located in one of the paths listed in the
 # The standard value should be fine.
 sentinel = b"{ready}"
 
-# The block size when reading from exiftool.  The standard value
-# should be fine, though other values might give better performance in
-# some cases.
+# Sentinel lines of numbered -executeNUM commands, used to split the
+# output of a batch of commands.
+numbered_sentinel = re.compile(br"^\{ready\d+\}\r?$", re.MULTILINE)
+
+# Complete sentinel line of a numbered command, capturing its number
+_numbered_sentinel_line = re.compile(br"\{ready(\d+)\}\r?\n")
+
+# The initial block size when reading from exiftool.  The block size
+# doubles while reads fill whole blocks, up to max_block_size, so
+# large outputs (e.g. ``-j`` over many files) are read in few calls.
 block_size = 4096
+max_block_size = 1024 * 1024
+
+# Seconds to wait for the output of a single command before the
+# process is considered hung.  ``None`` waits forever.
+timeout = None
+
+
+class ExifToolError(Exception):
+    """Base class of errors while talking to an ``exiftool`` process."""
+
+
+class ExifToolTimeout(ExifToolError):
+    """The ``exiftool`` process did not finish a command in time."""
+
+
+class ExifToolExited(ExifToolError):
+    """The ``exiftool`` process exited or closed its output."""
+
 
 # This code has been adapted from Lib/os.py in the Python source tree
 # (sha1 265e36e277f3)
@@ -117,6 +151,94 @@ def _fscodec():
 fsencode = _fscodec()
 del _fscodec
 
+
+def _batch_params(commands, echo=False):
+    """Join commands, each terminated by a numbered ``-executeNUM``.
+
+    With ``echo`` every command also echoes its sentinel to stderr.
+    """
+    params = []
+    for num, command in enumerate(commands, start=1):
+        params.extend(command)
+        if echo:
+            params.extend((b"-echo4", b"{ready%d}" % num))
+        params.append(b"-execute%d" % num)
+    return b"\n".join(params) + b"\n"
+
+
+def _tags_params(tags, filenames):
+    """Return the parameters of :py:meth:`ExifTool.get_tags_batch()`."""
+    # Explicitly ruling out strings here because passing in a
+    # string would lead to strange and hard-to-find errors
+    if isinstance(tags, basestring):
+        raise TypeError("The argument 'tags' must be "
+                        "an iterable of strings")
+    if isinstance(filenames, basestring):
+        raise TypeError("The argument 'filenames' must be "
+                        "an iterable of strings")
+    params = ["-" + t for t in tags]
+    params.extend(filenames)
+    return params
+
+
+def _process_args(executable_):
+    args = [executable_, "-stay_open", "True", "-@", "-",
+            "-common_args", "-G", "-n"]
+    flags = 0
+    if os.name == 'nt':
+        flags = 0x08000000
+    return args, flags
+
+
+class OutputReader(object):
+    """Collect the output of an ``exiftool`` command up to a sentinel.
+
+    The output is appended to a growable ``bytearray`` and only the
+    newly arrived bytes are searched for the sentinel, so reading is
+    linear in the size of the output.  :py:attr:`block_size` suggests
+    the size of the next read; it grows while reads fill whole blocks.
+    """
+
+    def __init__(self, sentinel_=sentinel):
+        self.sentinel = sentinel_
+        self.block_size = block_size
+        self._buffer = bytearray()
+        self._scan_pos = 0
+        self._end = None
+
+    @property
+    def done(self):
+        return self._end is not None
+
+    def feed(self, data):
+        """Append ``data`` and return ``True`` once the sentinel arrived.
+
+        The sentinel only counts if nothing but whitespace follows it.
+        """
+        buffer = self._buffer
+        buffer += data
+        if len(data) >= self.block_size and self.block_size < max_block_size:
+            self.block_size *= 2
+
+        pos = buffer.find(self.sentinel, self._scan_pos)
+        while pos != -1:
+            end = pos + len(self.sentinel)
+            if len(buffer) - end <= 4 and not buffer[end:].strip():
+                self._end = pos
+                return True
+            pos = buffer.find(self.sentinel, pos + 1)
+
+        # Overlap the next search to find a sentinel split across reads
+        self._scan_pos = max(0, len(buffer) - len(self.sentinel) + 1)
+        return False
+
+    def getvalue(self):
+        """Return the output without the sentinel and leading whitespace."""
+        end = len(self._buffer) if self._end is None else self._end
+        with memoryview(self._buffer) as view:
+            return bytes(view[:end]).lstrip()
+
+
 class ExifTool(object):
     """Run the `exiftool` command-line tool and communicate to it.
 
@@ -141,24 +263,39 @@ class ExifTool(object):
         with ExifTool() as et:
             ...
 
-    .. warning:: Note that there is no error handling.  Nonsensical
+    .. warning:: Note that there is little error handling.  Nonsensical
        options will be silently ignored by exiftool, so there's not
        much that can be done in that regard.  You should avoid passing
        non-existent files to any of the methods, since this will lead
        to undefied behaviour.
 
+    If the process exits while a command is running,
+    :py:class:`ExifToolExited` is raised.  If a command takes longer
+    than ``timeout`` seconds, the process is killed and
+    :py:class:`ExifToolTimeout` is raised.  In both cases the instance
+    is no longer running and may be started again.
+
     .. py:attribute:: running
 
        A Boolean value indicating whether this instance is currently
        associated with a running subprocess.
+
+    .. py:attribute:: last_stderr
+
+       The stderr output of the last command, see :py:meth:`execute()`.
     """
 
-    def __init__(self, executable_=None):
+    def __init__(self, executable_=None, timeout_=None):
         if executable_ is None:
             self.executable = executable
         else:
             self.executable = executable_
+        if timeout_ is None:
+            self.timeout = timeout
+        else:
+            self.timeout = timeout_
         self.running = False
+        self.last_stderr = b""
 
     def start(self):
         """Start an ``exiftool`` process in batch mode for this instance.
@@ -173,30 +310,58 @@ class ExifTool(object):
             warnings.warn("ExifTool already running; doing nothing.")
             return
 
-        with open(os.devnull, "w") as devnull:
-            flags = 0
-            if os.name == 'nt':
-                flags = 0x08000000
-
-            self._process = subprocess.Popen(
-                [self.executable, "-stay_open", "True",  "-@", "-",
-                 "-common_args", "-G", "-n"],
-                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-                stderr=devnull, creationflags=flags
-            )
+        args, flags = _process_args(self.executable)
+        self._process = subprocess.Popen(
+            args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, creationflags=flags
+        )
+        self._fds = (self._process.stdout.fileno(), self._process.stderr.fileno())
+
+        if os.name == 'nt':
+            # Pipes can not be selected on Windows, threads pump
+            # the output into a queue instead
+            self._chunks = queue.Queue()
+            for fd in self._fds:
+                threading.Thread(target=self._pump_output, args=(fd, self._chunks), daemon=True).start()
+        else:
+            self._selector = selectors.DefaultSelector()
+            for fd in self._fds:
+                self._selector.register(fd, selectors.EVENT_READ)
 
         self.running = True
 
-    def terminate(self):
+    def terminate(self, timeout_=10):
         """Terminate the ``exiftool`` process of this instance.
 
         If the subprocess isn't running, this method will do nothing.
+        The process is killed if it does not exit within ``timeout_``
+        seconds.
         """
         if not self.running:
             return
-        self._process.stdin.write(b"-stay_open\nFalse\n")
-        self._process.stdin.flush()
-        self._process.communicate()
+        try:
+            self._process.stdin.write(b"-stay_open\nFalse\n")
+            self._process.stdin.flush()
+            self._process.communicate(timeout=timeout_)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            self._process.kill()
+            self._process.communicate()
+        self._cleanup()
+
+    def kill(self):
+        """Kill the ``exiftool`` process of this instance immediately."""
+        if not self.running:
+            return
+        self._process.kill()
+        try:
+            self._process.communicate(timeout=10)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            pass
+        self._cleanup()
+
+    def _cleanup(self):
+        if os.name != 'nt':
+            self._selector.close()
         del self._process
         self.running = False
 
@@ -220,7 +385,9 @@ class ExifTool(object):
         automatically; see the documentation of :py:meth:`start()` for
         the common options.  The ``exiftool`` output is read up to the
         end-of-output sentinel and returned as a raw ``bytes`` object,
-        excluding the sentinel.
+        excluding the sentinel.  The output of exiftool to stderr,
+        warnings and errors, is read up to a sentinel echoed with
+        ``-echo4`` and stored as raw ``bytes`` in :py:attr:`last_stderr`.
 
         The parameters must also be raw ``bytes``, in whatever
         encoding exiftool accepts.  For filenames, this should be the
@@ -231,13 +398,86 @@ class ExifTool(object):
         """
         if not self.running:
             raise ValueError("ExifTool instance not running.")
-        self._process.stdin.write(b"\n".join(params + (b"-execute\n",)))
-        self._process.stdin.flush()
-        output = b""
-        fd = self._process.stdout.fileno()
-        while not output[-32:].strip().endswith(sentinel):
-            output += os.read(fd, block_size)
-        return output.strip()[:-len(sentinel)]
+        self._send(b"\n".join(params + (b"-echo4", sentinel, b"-execute\n")))
+        output, self.last_stderr = self._read_output(sentinel, self.timeout)
+        return output
+
+    def execute_batch(self, *commands):
+        """Execute several batches of parameters in a single exchange.
+
+        Each command is a sequence of raw ``bytes`` parameters as
+        accepted by :py:meth:`execute()`.  All commands are sent to
+        the ``exiftool`` process at once, terminated by numbered
+        ``-executeNUM`` options, and the output is read up to the
+        sentinel of the last command.  The return value is a list
+        with the raw ``bytes`` output of every command, in the same
+        order as ``commands``.  :py:attr:`last_stderr` is set to a list
+        of the stderr output of every command.  The timeout applies to
+        every single command of the batch.
+        """
+        if not self.running:
+            raise ValueError("ExifTool instance not running.")
+        if not commands:
+            self.last_stderr = []
+            return []
+        self._send(_batch_params(commands, echo=True))
+        timeout_ = None if self.timeout is None else self.timeout * len(commands)
+        output, stderr = self._read_output(b"{ready%d}" % len(commands), timeout_)
+        self.last_stderr = [e.strip() for e in numbered_sentinel.split(stderr)]
+        return [o.strip() for o in numbered_sentinel.split(output)]
+
+    def _send(self, data):
+        try:
+            self._process.stdin.write(data)
+            self._process.stdin.flush()
+        except OSError:
+            self.kill()
+            raise ExifToolExited("ExifTool process closed its input.")
+
+    def _read_output(self, sentinel_, timeout_=None):
+        """Read stdout and stderr up to ``sentinel_``, return both."""
+        readers = {fd: OutputReader(sentinel_) for fd in self._fds}
+        deadline = None if timeout_ is None else monotonic() + timeout_
+        while not all(reader.done for reader in readers.values()):
+            remaining = None if deadline is None else max(0.0, deadline - monotonic())
+            chunks = self._read_chunks(readers, remaining)
+            if not chunks:
+                self.kill()
+                raise ExifToolTimeout("ExifTool did not answer within %s seconds." % timeout_)
+            for fd, data in chunks:
+                if not data:
+                    try:
+                        returncode = self._process.wait(timeout=1)
+                    except subprocess.TimeoutExpired:
+                        returncode = None
+                    self.kill()
+                    raise ExifToolExited("ExifTool process exited with code %s." % returncode)
+                readers[fd].feed(data)
+        return tuple(readers[fd].getvalue() for fd in self._fds)
+
+    def _read_chunks(self, readers, timeout_):
+        """Return (fd, data) pairs of new output, ``b""`` data on EOF.
+
+        An empty list is returned on timeout.
+        """
+        if os.name == 'nt':
+            try:
+                return [self._chunks.get(timeout=timeout_)]
+            except queue.Empty:
+                return []
+        return [(key.fd, os.read(key.fd, readers[key.fd].block_size))
+                for key, _event in self._selector.select(timeout_)]
+
+    @staticmethod
+    def _pump_output(fd, chunks):
+        while True:
+            try:
+                data = os.read(fd, max_block_size)
+            except OSError:
+                data = b""
+            chunks.put((fd, data))
+            if not data:
+                return
 
     def execute_json(self, *params):
         """Execute the given batch of parameters and parse the JSON output.
@@ -291,17 +531,7 @@ class ExifTool(object):
         The format of the return value is the same as for
         :py:meth:`execute_json()`.
         """
-        # Explicitly ruling out strings here because passing in a
-        # string would lead to strange and hard-to-find errors
-        if isinstance(tags, basestring):
-            raise TypeError("The argument 'tags' must be "
-                            "an iterable of strings")
-        if isinstance(filenames, basestring):
-            raise TypeError("The argument 'filenames' must be "
-                            "an iterable of strings")
-        params = ["-" + t for t in tags]
-        params.extend(filenames)
-        return self.execute_json(*params)
+        return self.execute_json(*_tags_params(tags, filenames))
 
     def get_tags(self, tags, filename):
         """Return only specified tags for a single file.
@@ -336,3 +566,478 @@ class ExifTool(object):
         ``None`` if this tag was not found in the file.
         """
         return self.get_tag_batch(tag, [filename])[0]
+
+
+class PipelinedExifTool(ExifTool):
+    """Keep several numbered commands in flight on one ``exiftool`` process.
+
+    Every command sent with :py:meth:`submit()` is terminated by its own
+    ``-executeNUM`` and echoes ``{readyNUM}`` to stderr.  Two reader
+    threads match the ``{readyNUM}`` lines of stdout and stderr to the
+    pending commands and resolve a :py:class:`~concurrent.futures.Future`
+    per command with its ``(stdout, stderr)`` output.  Up to ``window``
+    commands are outstanding, so the next command is already waiting in
+    the input pipe while the output of the previous one is processed on
+    the Python side and the process never idles in between.
+
+    :py:meth:`execute()` and :py:meth:`execute_batch()` behave like the
+    methods of :py:class:`ExifTool`, which also makes all of its
+    convenience methods available.  They may be called from several
+    threads at once.  The timeout applies while waiting for a result:
+    if no command finishes within ``timeout`` seconds the process is
+    killed and all pending commands fail with
+    :py:class:`ExifToolTimeout`.  Futures of :py:meth:`submit()` do not
+    time out by themselves.
+    """
+
+    def __init__(self, executable_=None, timeout_=None, window=8):
+        super(PipelinedExifTool, self).__init__(executable_, timeout_)
+        self.window = max(1, window)
+
+    def start(self):
+        """Start an ``exiftool`` process and its reader threads."""
+        if self.running:
+            warnings.warn("ExifTool already running; doing nothing.")
+            return
+
+        args, flags = _process_args(self.executable)
+        self._process = subprocess.Popen(
+            args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, creationflags=flags
+        )
+        self._lock = threading.Lock()
+        # Serializes writes to stdin, held without _lock so the output readers
+        # can complete commands while a write waits for room in the pipe
+        self._write_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.window)
+        self._pending = OrderedDict()
+        self._num = 0
+        self._error = None
+        self._last_progress = monotonic()
+        self._readers = [
+            threading.Thread(target=self._read_stream, args=(stream, index), daemon=True)
+            for index, stream in enumerate((self._process.stdout, self._process.stderr))]
+        for reader in self._readers:
+            reader.start()
+        self.running = True
+
+    def terminate(self, timeout_=10):
+        """Terminate the ``exiftool`` process, kill it after ``timeout_`` seconds."""
+        if not self.running:
+            return
+        try:
+            self._process.stdin.write(b"-stay_open\nFalse\n")
+            self._process.stdin.flush()
+            self._process.wait(timeout=timeout_)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            self._process.kill()
+        self._cleanup()
+
+    def kill(self):
+        """Kill the ``exiftool`` process immediately."""
+        if not self.running:
+            return
+        self._process.kill()
+        self._cleanup()
+
+    def _cleanup(self):
+        try:
+            self._process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            pass
+        for reader in self._readers:
+            if reader is not threading.current_thread():
+                reader.join(timeout=10)
+        for stream in (self._process.stdin, self._process.stdout, self._process.stderr):
+            try:
+                stream.close()
+            except OSError:
+                pass
+        self._fail_pending(ExifToolExited("ExifTool process was terminated."))
+        del self._process
+        self.running = False
+
+    def submit(self, *params):
+        """Send a command and return a future of its ``(stdout, stderr)`` output.
+
+        Blocks while ``window`` commands are outstanding.
+        """
+        if not self.running:
+            raise ValueError("ExifTool instance not running.")
+        self._acquire_slot()
+        future = Future()
+        with self._lock:
+            if self._error is not None:
+                self._slots.release()
+                raise self._error
+            if not self._pending:
+                self._last_progress = monotonic()
+            self._num += 1
+            num = self._num
+            self._pending[num] = [future, None, None]
+        data = b"\n".join(params + (b"-echo4", b"{ready%d}" % num, b"-execute%d" % num)) + b"\n"
+        with self._write_lock:
+            try:
+                self._process.stdin.write(data)
+                self._process.stdin.flush()
+            except (OSError, ValueError, AttributeError):
+                error = ExifToolExited("ExifTool process closed its input.")
+            else:
+                error = None
+        if error is not None:
+            self._fail_pending(error)
+            self.kill()
+        return future
+
+    def execute(self, *params):
+        """Execute a command and return its stdout, see :py:meth:`ExifTool.execute()`."""
+        output, self.last_stderr = self._result(self.submit(*params))
+        return output
+
+    def execute_batch(self, *commands):
+        """Execute several commands pipelined, see :py:meth:`ExifTool.execute_batch()`."""
+        if not self.running:
+            raise ValueError("ExifTool instance not running.")
+        futures = [self.submit(*command) for command in commands]
+        results = [self._result(future) for future in futures]
+        self.last_stderr = [stderr for _output, stderr in results]
+        return [output for output, _stderr in results]
+
+    def _timed_out(self):
+        return self.timeout is not None and monotonic() - self._last_progress > self.timeout
+
+    def _kill_on_timeout(self):
+        self._fail_pending(ExifToolTimeout(
+            "ExifTool did not answer within %s seconds." % self.timeout))
+        self.kill()
+
+    def _acquire_slot(self):
+        while not self._slots.acquire(timeout=None if self.timeout is None else 0.25):
+            if self._timed_out():
+                self._kill_on_timeout()
+                raise self._error
+
+    def _result(self, future):
+        while True:
+            try:
+                return future.result(timeout=None if self.timeout is None else 0.25)
+            except FutureTimeout:
+                if self._timed_out():
+                    self._kill_on_timeout()
+            except ExifToolError:
+                # Like ExifTool, the instance is no longer running and may be started again
+                if self.running:
+                    self.kill()
+                raise
+
+    def _read_stream(self, stream, index):
+        """Reader thread, resolve pending commands from one output stream."""
+        process = self._process
+        fd = stream.fileno()
+        buffer = bytearray()
+        scan_pos = 0
+        while True:
+            try:
+                data = os.read(fd, max_block_size)
+            except (OSError, ValueError):
+                data = b""
+            if not data:
+                try:
+                    returncode = process.wait(timeout=1)
+                except subprocess.TimeoutExpired:
+                    returncode = None
+                self._fail_pending(ExifToolExited(
+                    "ExifTool process exited with code %s." % returncode))
+                return
+            buffer += data
+            while True:
+                match = _numbered_sentinel_line.search(buffer, scan_pos)
+                if match is None:
+                    # Keep looking at a partially received sentinel
+                    scan_pos = max(0, len(buffer) - 32)
+                    break
+                self._complete(int(match.group(1)), index, bytes(buffer[:match.start()]).strip())
+                del buffer[:match.end()]
+                scan_pos = 0
+
+    def _complete(self, num, index, data):
+        with self._lock:
+            entry = self._pending.get(num)
+            if entry is None:
+                return
+            entry[index + 1] = data
+            if entry[1] is None or entry[2] is None:
+                return
+            del self._pending[num]
+            self._last_progress = monotonic()
+        self._slots.release()
+        entry[0].set_result((entry[1], entry[2]))
+
+    def _fail_pending(self, error):
+        with self._lock:
+            if self._error is None:
+                self._error = error
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for entry in pending:
+            self._slots.release()
+            if not entry[0].done():
+                entry[0].set_exception(self._error)
+
+
+class AsyncExifTool(object):
+    """Run the `exiftool` command-line tool from an :py:mod:`asyncio` event loop.
+
+    This class mirrors :py:class:`ExifTool`, but the process is started
+    with :py:func:`asyncio.create_subprocess_exec` and all methods
+    talking to it are coroutines.  No thread is needed to wait for
+    output, so a single event loop can drive many processes.  Commands
+    sent concurrently to the same instance are executed one after the
+    other.
+
+    Use it as an asynchronous context manager::
+
+        async with AsyncExifTool() as et:
+            metadata = await et.get_tags_batch(["XMP:Title"], files)
+    """
+
+    def __init__(self, executable_=None, timeout_=None):
+        if executable_ is None:
+            self.executable = executable
+        else:
+            self.executable = executable_
+        if timeout_ is None:
+            self.timeout = timeout
+        else:
+            self.timeout = timeout_
+        self.running = False
+        self.last_stderr = b""
+        self._lock = None
+
+    async def start(self):
+        """Start an ``exiftool`` process in batch mode for this instance.
+
+        See :py:meth:`ExifTool.start()`.
+        """
+        if self.running:
+            warnings.warn("AsyncExifTool already running; doing nothing.")
+            return
+
+        args, flags = _process_args(self.executable)
+        kwargs = {"creationflags": flags} if flags else {}
+        self._process = await asyncio.create_subprocess_exec(
+            *args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, **kwargs
+        )
+        self._lock = asyncio.Lock()
+        self.running = True
+
+    async def terminate(self):
+        """Terminate the ``exiftool`` process of this instance.
+
+        If the subprocess isn't running, this method will do nothing.
+        """
+        if not self.running:
+            return
+        self.running = False
+        try:
+            self._process.stdin.write(b"-stay_open\nFalse\n")
+            await self._process.stdin.drain()
+            self._process.stdin.close()
+            await self._process.wait()
+        except (ConnectionError, asyncio.CancelledError):
+            self.kill()
+            raise
+        finally:
+            del self._process
+
+    def kill(self):
+        """Kill the ``exiftool`` process without waiting for it."""
+        process = getattr(self, "_process", None)
+        self.running = False
+        if process is not None and process.returncode is None:
+            process.kill()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.terminate()
+
+    async def execute(self, *params):
+        """Execute the given batch of parameters with ``exiftool``.
+
+        See :py:meth:`ExifTool.execute()`, stderr output is stored in
+        :py:attr:`last_stderr`.
+        """
+        if not self.running:
+            raise ValueError("ExifTool instance not running.")
+        async with self._lock:
+            self._process.stdin.write(b"\n".join(params + (b"-echo4", sentinel, b"-execute\n")))
+            output, self.last_stderr = await self._read_output(sentinel, self.timeout)
+            return output
+
+    async def execute_batch(self, *commands):
+        """Execute several batches of parameters in a single exchange.
+
+        See :py:meth:`ExifTool.execute_batch()`.
+        """
+        if not self.running:
+            raise ValueError("ExifTool instance not running.")
+        if not commands:
+            return []
+        timeout_ = None if self.timeout is None else self.timeout * len(commands)
+        async with self._lock:
+            self._process.stdin.write(_batch_params(commands, echo=True))
+            output, stderr = await self._read_output(b"{ready%d}" % len(commands), timeout_)
+            self.last_stderr = [e.strip() for e in numbered_sentinel.split(stderr)]
+        return [o.strip() for o in numbered_sentinel.split(output)]
+
+    async def _read_output(self, sentinel_, timeout_=None):
+        """Send the pending input and read stdout and stderr up to ``sentinel_``, return both."""
+        process = self._process
+        try:
+            _drained, output, stderr = await asyncio.wait_for(asyncio.gather(
+                process.stdin.drain(),
+                self._read_until(process.stdout, sentinel_),
+                self._read_until(process.stderr, sentinel_)), timeout_)
+            return output, stderr
+        except asyncio.TimeoutError:
+            self.kill()
+            raise ExifToolTimeout("ExifTool did not answer within %s seconds." % timeout_)
+        except (ConnectionError, ExifToolExited):
+            self.kill()
+            raise ExifToolExited("ExifTool process exited.")
+
+    @staticmethod
+    async def _read_until(stream, sentinel_):
+        reader = OutputReader(sentinel_)
+        while True:
+            data = await stream.read(reader.block_size)
+            if not data:
+                raise ExifToolExited("ExifTool process closed its output.")
+            if reader.feed(data):
+                return reader.getvalue()
+
+    async def execute_json(self, *params):
+        """Execute the given batch of parameters and parse the JSON output.
+
+        See :py:meth:`ExifTool.execute_json()`.
+        """
+        params = map(fsencode, params)
+        output = await self.execute(b"-j", *params)
+        return json.loads(output.decode("utf-8"))
+
+    async def get_metadata_batch(self, filenames):
+        """Return all meta-data for the given files."""
+        return await self.execute_json(*filenames)
+
+    async def get_tags_batch(self, tags, filenames):
+        """Return only specified tags for the given files.
+
+        See :py:meth:`ExifTool.get_tags_batch()`.
+        """
+        return await self.execute_json(*_tags_params(tags, filenames))
+
+
+class AsyncExifToolPool(object):
+    """A pool of :py:class:`AsyncExifTool` processes driven by one event loop.
+
+    Up to ``size`` processes are started on demand.  Every call checks
+    out an idle process, so up to ``size`` commands run concurrently
+    without a thread per process.  An instance that was interrupted
+    while a command was running, e.g. by cancellation, is killed
+    instead of being reused.
+
+    ::
+
+        async with AsyncExifToolPool(16) as pool:
+            await asyncio.gather(*(pool.execute(*cmd) for cmd in commands))
+    """
+
+    def __init__(self, size, executable_=None):
+        self.size = max(1, size)
+        self.executable = executable_
+        self._instances = set()
+        self._idle = None
+        self._closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @asynccontextmanager
+    async def instance(self):
+        """Check out an instance for the duration of the block."""
+        et = await self._checkout()
+        try:
+            yield et
+        except BaseException:
+            # The process may be in the middle of a command
+            self._instances.discard(et)
+            et.kill()
+            raise
+        else:
+            if self._closed:
+                self._instances.discard(et)
+                await et.terminate()
+            else:
+                self._idle.put_nowait(et)
+
+    async def _checkout(self):
+        if self._closed:
+            raise ValueError("AsyncExifToolPool is closed.")
+        if self._idle is None:
+            self._idle = asyncio.LifoQueue()
+        if self._idle.empty() and len(self._instances) < self.size:
+            et = AsyncExifTool(self.executable)
+            self._instances.add(et)
+            try:
+                await et.start()
+            except BaseException:
+                self._instances.discard(et)
+                raise
+            return et
+        et = await self._idle.get()
+        if et is None:
+            # The pool was closed, wake the next waiting checkout as well
+            self._idle.put_nowait(None)
+            raise ValueError("AsyncExifToolPool is closed.")
+        return et
+
+    async def execute(self, *params):
+        async with self.instance() as et:
+            return await et.execute(*params)
+
+    async def execute_batch(self, *commands):
+        async with self.instance() as et:
+            return await et.execute_batch(*commands)
+
+    async def execute_json(self, *params):
+        async with self.instance() as et:
+            return await et.execute_json(*params)
+
+    async def get_tags_batch(self, tags, filenames):
+        async with self.instance() as et:
+            return await et.get_tags_batch(tags, filenames)
+
+    async def close(self):
+        """Terminate all idle processes.
+
+        Checked out processes are terminated when they are returned,
+        calls waiting for a process raise ``ValueError``.
+        """
+        self._closed = True
+        if self._idle is None:
+            return
+        instances = []
+        while not self._idle.empty():
+            et = self._idle.get_nowait()
+            if et is not None:
+                self._instances.discard(et)
+                instances.append(et)
+        self._idle.put_nowait(None)
+        await asyncio.gather(*(et.terminate() for et in instances))
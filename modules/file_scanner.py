@@ -0,0 +1,241 @@
+import fnmatch
+import os
+import queue
+import re
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+from modules.exif_reader import IMG_FILE_TYPES
+from modules.log import init_logging
+
+LOGGER = init_logging(__name__)
+
+# End of the files of a scan
+_DONE = object()
+
+# Found file and its path relative to the scanned root, eg. 1998/box_03/IMG_0001.tif
+ScannedFile = namedtuple('ScannedFile', ('path', 'name'))
+
+
+def _compile(patterns) -> list:
+    """ Case insensitive regular expressions of glob patterns, see FileScanner """
+    return [(re.compile(fnmatch.translate(pattern), re.IGNORECASE), '/' in pattern) for pattern in patterns or ()]
+
+
+def _matches(patterns: list, name: str, relative_name: str) -> bool:
+    return any(pattern.match(relative_name if relative else name) for pattern, relative in patterns)
+
+
+def _root_prefixes(roots: list) -> list:
+    """
+        Prefixes of the relative names of the files of several roots, the name of the root or
+        as many trailing directories as needed to tell roots of the same name apart eg. a/1998/ and b/1998/
+    """
+    if len(roots) < 2:
+        return [''] * len(roots)
+
+    paths = [Path(os.path.abspath(root)) for root in roots]
+    parts = [((path.drive.replace(':', ''),) if path.drive else ()) + path.parts[1:] for path in paths]
+    depths = [1] * len(roots)
+
+    while True:
+        prefixes = ['/'.join(p[max(0, len(p) - depth):]) for p, depth in zip(parts, depths)]
+        extend = [idx for idx, prefix in enumerate(prefixes) if depths[idx] < len(parts[idx]) and
+                  any(other != paths[idx] and prefixes[o] == prefix for o, other in enumerate(paths))]
+
+        if not extend:
+            return [f'{prefix}/' if prefix else '' for prefix in prefixes]
+
+        for idx in extend:
+            depths[idx] += 1
+
+
+class FileScanner:
+    """
+        Finds the image files below root directories with os.scandir
+
+        Subtrees are scanned in parallel by workers threads and found files are handed to
+        the consumer through a queue of up to max_queued files. Scanners stall while the
+        consumer falls behind, so memory stays bounded no matter how large the tree is.
+        Files are yielded in the order they are found.
+
+        Glob patterns without a slash match file and directory names, patterns with a slash
+        match the path relative to the root eg. 1998/box_*. Excluded directories are not
+        entered. Symbolic links to directories are not followed.
+    """
+    # Files to find
+    include = tuple(f'*{suffix}' for suffix in IMG_FILE_TYPES)
+
+    # Hidden files eg. ._IMG_0001.tif resource forks and Synology thumbnail directories
+    exclude = ('.*', '@eaDir')
+
+    # Number of directories scanned in parallel
+    workers = 4
+
+    # Found files waiting for the consumer
+    max_queued = 1000
+
+    def __init__(self, roots, include=None, exclude=None, recursive: bool=True, workers: int=None,
+                 max_queued: int=None):
+        """
+            :param roots: directories to scan
+            :param include: glob patterns of the files to find, defaults to FileScanner.include
+            :param exclude: glob patterns of files and directories to skip, defaults to FileScanner.exclude
+            :param recursive: scan subdirectories
+            :param workers: number of scanner threads, defaults to FileScanner.workers
+            :param max_queued: found files waiting for the consumer, defaults to FileScanner.max_queued
+        """
+        self.roots = [Path(root) for root in roots]
+        self.include = _compile(include if include is not None else self.include)
+        self.exclude = _compile(exclude if exclude is not None else self.exclude)
+        self.recursive = recursive
+        self.workers = max(1, workers or self.workers)
+
+        self.scanned_dirs = 0
+        self.found = 0
+
+        self._queue = queue.Queue(max_queued or self.max_queued)
+        self._stop = threading.Event()
+        self._lock = threading.Condition()
+        self._threads = list()
+
+        # Directories to scan and the prefix of their relative names, scanned depth first
+        # Names of several roots are prefixed with the name of their root, see _root_prefixes
+        self._dirs = list(reversed(list(zip(self.roots, _root_prefixes(self.roots)))))
+        self._pending = len(self._dirs)
+
+    def start(self) -> 'FileScanner':
+        if not self._pending:
+            self._queue.put(_DONE)
+            return self
+
+        for idx in range(self.workers if self.recursive else min(self.workers, self._pending)):
+            thread = threading.Thread(target=self._scan, name=f'TiffyScanner_{idx}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        return self
+
+    def chunks(self, max_items: int):
+        """ Yield lists of up to max_items ScannedFile's, as soon as at least one file was found """
+        while True:
+            try:
+                item = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+
+            if item is _DONE:
+                return
+
+            chunk = [item]
+            while len(chunk) < max_items:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+                if item is _DONE:
+                    yield chunk
+                    return
+                chunk.append(item)
+
+            yield chunk
+
+    def __iter__(self):
+        for chunk in self.chunks(self.max_queued):
+            yield from chunk
+
+    def stop(self):
+        """ Stop scanning, may be called from any thread """
+        self._stop.set()
+        with self._lock:
+            self._lock.notify_all()
+
+    def close(self):
+        """ Stop scanning and wait for the scanner threads """
+        self.stop()
+
+        for thread in self._threads:
+            thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _put(self, item) -> bool:
+        """ Wait for room in the queue, returns False if the scan was stopped """
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def _scan(self):
+        while True:
+            with self._lock:
+                while not self._dirs and self._pending and not self._stop.is_set():
+                    self._lock.wait()
+
+                if self._stop.is_set() or not self._pending:
+                    return
+                directory, prefix = self._dirs.pop()
+
+            try:
+                self._scan_dir(directory, prefix)
+            except Exception as e:
+                LOGGER.exception('Could not scan directory %s: %s', directory, e)
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                    self.scanned_dirs += 1
+                    done = not self._pending
+                    self._lock.notify_all()
+
+            if done:
+                LOGGER.info('Found %s files in %s directories.', self.found, self.scanned_dirs)
+                self._put(_DONE)
+                return
+
+    def _scan_dir(self, directory: Path, prefix: str):
+        try:
+            entries = os.scandir(directory)
+        except OSError as e:
+            LOGGER.warning('Could not scan directory %s: %s', directory, e)
+            return
+
+        with entries:
+            for entry in entries:
+                if self._stop.is_set():
+                    return
+
+                name = f'{prefix}{entry.name}'
+                if _matches(self.exclude, entry.name, name):
+                    continue
+
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    is_file = not is_dir and entry.is_file()
+                except OSError as e:
+                    LOGGER.debug('Could not stat %s: %s', entry.path, e)
+                    continue
+
+                if is_dir:
+                    if self.recursive:
+                        with self._lock:
+                            self._dirs.append((Path(entry.path), f'{name}/'))
+                            self._pending += 1
+                            self._lock.notify()
+                elif is_file and _matches(self.include, entry.name, name):
+                    if not self._put(ScannedFile(Path(entry.path), name)):
+                        return
+
+                    with self._lock:
+                        self.found += 1
@@ -0,0 +1,27 @@
+import logging
+
+from PyQt5.QtCore import pyqtSignal, QObject
+
+
+class _HandlerSignal(QObject):
+    log_message = pyqtSignal(str)
+
+
+class QPlainTextEditHandler(logging.Handler):
+    """ Log handler that appends text to QPlainTextEdit """
+
+    def __init__(self):
+        super(QPlainTextEditHandler, self).__init__()
+        self.signal_cls = _HandlerSignal()
+        self.log_message = self.signal_cls.log_message
+
+    def emit(self, record):
+        msg = None
+
+        try:
+            msg = self.format(record)
+            self.log_message.emit(msg)
+        except Exception as e:
+            # MS Visual Studio 15.4.x BUG ?, channel is not defined
+            print(e)
+            pass
@@ -3,6 +3,7 @@ from PyQt5 import QtCore, QtWidgets
 from modules.widgets.menu_file import FileMenu
 from modules.widgets.menu_info import InfoMenu
 from modules.widgets.menu_language import LanguageMenu
+from modules.widgets.menu_run import RunMenu
 from modules.detect_language import get_translation
 from modules.log import init_logging
 
@@ -22,8 +23,10 @@ class MainWindowMenu(QtCore.QObject):
         # File menu already added through UI definition file
         self.file_menu = FileMenu(ui)
 
+        self.run_menu = RunMenu(ui)
         self.lang_menu = LanguageMenu(ui)
         self.info_menu = InfoMenu(ui)
 
+        self.ui.menuBar().addMenu(self.run_menu)
         self.ui.menuBar().addMenu(self.lang_menu)
         self.ui.menuBar().addMenu(self.info_menu)
@@ -56,6 +56,7 @@ class MainWindow(QtWidgets.QMainWindow):
         # --- App will bind itself to start btn ---
         self.excel_data = None
         self.img_app = ImgMetaDataApp(self)
+        self.img_app.closed.connect(self.app.quit)
 
         self.system_tray = QtWidgets.QSystemTrayIcon(self.rk_icon, self)
         self.system_tray.hide()
@@ -76,8 +77,19 @@ class MainWindow(QtWidgets.QMainWindow):
 
         return False
 
+    def showEvent(self, show_event):
+        super(MainWindow, self).showEvent(show_event)
+        # Have hot exiftool processes ready once the user starts a run
+        self.img_app.warm_up()
+
     def closeEvent(self, close_event):
         close_event.ignore()
+
+        # Files in progress get completed and recorded, the rest can be resumed on the next start.
+        # The window stays responsive meanwhile and the app quits once the run finished.
+        if self.img_app.close_exif_worker():
+            return
+
         self.app.quit()
 
     def translations(self):
@@ -0,0 +1,94 @@
+import fnmatch
+import re
+from collections import OrderedDict
+from pathlib import Path
+from typing import Union
+
+from modules.exif_job import ExifJob
+from modules.log import init_logging
+
+LOGGER = init_logging(__name__)
+
+
+class JobPlanner:
+    """
+        Matches image files to spreadsheet rows and creates their ExifJob's
+
+        The name of an image file without ignored name parts and page digits has to be
+        the start of a spreadsheet file name, eg. IMG_0101_RECTO.tif matches IMG_01 and IMG_01a.
+    """
+    # Actual Exiftool tag names of the spreadsheet columns following the file column
+    exiftool_tags = ['-Title', '-Creator', '-Description', '-Subject', '-Rights']
+
+    # Spreadsheet key: Exiftool tag name written with its value
+    tag_map = OrderedDict(zip(('title', 'author', 'description', 'keywords', 'copyright'),
+                              (tag.lstrip('-') for tag in exiftool_tags)))
+
+    dpi_tags = ['-ResolutionUnit', '-XResolution', '-YResolution']
+
+    def __init__(self, excel_data: dict=None, dpi: tuple=None, ignored_name_patterns=('_VERSO?$', '_RECTO?$'),
+                 ignore_last_digits: bool=True, tag_map: dict=None):
+        """
+            :param excel_data: spreadsheet file name: dict of column values, None to not update tags
+            :param dpi: resolution unit, x and y resolution to write eg. ('2', '300.0', '300.0') or None
+            :param ignored_name_patterns: regular expressions of file name parts to ignore eg. _RECTO
+            :param ignore_last_digits: ignore the last two digits of file names indicating the page
+            :param tag_map: spreadsheet key: Exiftool tag name, defaults to JobPlanner.tag_map
+        """
+        self.excel_data = excel_data
+        self.dpi = dpi
+        self.tag_map = tag_map if tag_map is not None else self.tag_map
+        self.ignore_last_digits = ignore_last_digits
+
+        self.name_pattern = re.compile('|'.join(ignored_name_patterns)) if ignored_name_patterns else None
+
+    def plan(self, img_files):
+        """
+            Yield scanned file, ExifJob of every image file, the job is None if no spreadsheet row matches
+
+            :param img_files: iterable of ScannedFile's, see FileScanner
+        """
+        for img_file in img_files:
+            if self.excel_data is None:
+                # No excel data to update
+                yield img_file, self.create_job(img_file.path, None, img_file.name)
+                continue
+
+            file_match = self.match_file_name(img_file.path.stem)
+
+            if file_match:
+                yield img_file, self.create_job(img_file.path, self.excel_data[file_match[0]], img_file.name)
+            else:
+                yield img_file, None
+
+    def match_file_name(self, name: str) -> list:
+        # Remove Name parts to ignore eg. _RECTO
+        file_name = self.name_pattern.sub('', name) if self.name_pattern else name
+
+        if self.ignore_last_digits:
+            # Last two digits of file name indicate page number and are ignored
+            file_name = re.sub(r'\d\d$', '', file_name)
+
+        # Match name against excel row entries
+        return fnmatch.filter(self.excel_data.keys(), f'{file_name}*')
+
+    def create_job(self, img_file: Path, img_dict: Union[dict, None], name: str=None) -> ExifJob:
+        tags, dpi = dict(), dict()
+
+        if self.dpi:
+            # Update units from user settings and update resolution, eg 300dpi or 118,11 ppc
+            for tag, value in zip(self.dpi_tags, self.dpi):
+                dpi[tag.lstrip('-')] = value
+
+        if img_dict:
+            # Update image tags from excel data
+            for key, tag in self.tag_map.items():
+                dict_value = img_dict.get(key)
+                if not dict_value:
+                    continue
+                tags[tag] = dict_value
+
+        job = ExifJob(img_file, tags, dpi, name)
+        job.stat()
+        LOGGER.debug('Appending job: %s', job.command())
+        return job
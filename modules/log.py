@@ -4,9 +4,7 @@ import logging
 import logging.config
 
 from logging.handlers import QueueHandler, QueueListener
-from PyQt5.QtCore import pyqtSignal, QObject
-
-from modules.app_globals import get_settings_dir, LOG_FILE_NAME
+from modules.app_globals import get_settings_dir, HEADLESS, LOG_FILE_NAME
 
 
 def setup_logging(logging_queue):
@@ -98,36 +96,51 @@ def setup_log_queue_listener(logger, queue):
     return listener
 
 
+def setup_cli_logging(console_level=logging.WARNING):
+    """ Log to the log file and to stderr, stdout is left to the command line output """
+    log_file_path = Path(get_settings_dir()) / Path(LOG_FILE_NAME)
+
+    log_conf = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'formatters': {
+            'simple': {
+                'format': '%(asctime)s %(name)s %(levelname)s: %(message)s',
+                'datefmt': '%d.%m.%Y %H:%M'
+                },
+            'file_formatter': {
+                'format': '%(asctime)s.%(msecs)03d %(name)s %(levelname)s: %(message)s',
+                'datefmt': '%d.%m.%Y %H:%M:%S'
+                },
+            },
+        'handlers': {
+            'console': {
+                'level': console_level, 'class': 'logging.StreamHandler',
+                'stream': 'ext://sys.stderr', 'formatter': 'simple'
+                },
+            'file': {
+                'level': 'DEBUG', 'class': 'logging.handlers.RotatingFileHandler',
+                'filename': log_file_path.absolute().as_posix(), 'maxBytes': 5000000, 'backupCount': 4,
+                'formatter': 'file_formatter',
+                },
+            },
+        'loggers': {
+            '': {
+                'handlers': ['file', 'console'], 'propagate': False, 'level': 'DEBUG',
+                }
+            }
+        }
+
+    logging.config.dictConfig(log_conf)
+
+
 def init_logging(logger_name):
-    print('Logger requested by: ',
-          Path(sys._getframe().f_back.f_code.co_filename).name,
-          sys._getframe().f_back.f_code.co_name)
+    if not HEADLESS:
+        print('Logger requested by: ',
+              Path(sys._getframe().f_back.f_code.co_filename).name,
+              sys._getframe().f_back.f_code.co_name)
 
     logger_name = logger_name.replace('modules.', '')
     logger = logging.getLogger(logger_name)
     logger.setLevel(logging.DEBUG)
     return logger
-
-
-class _HandlerSignal(QObject):
-    log_message = pyqtSignal(str)
-
-
-class QPlainTextEditHandler(logging.Handler):
-    """ Log handler that appends text to QPlainTextEdit """
-
-    def __init__(self):
-        super(QPlainTextEditHandler, self).__init__()
-        self.signal_cls = _HandlerSignal()
-        self.log_message = self.signal_cls.log_message
-
-    def emit(self, record):
-        msg = None
-
-        try:
-            msg = self.format(record)
-            self.log_message.emit(msg)
-        except Exception as e:
-            # MS Visual Studio 15.4.x BUG ?, channel is not defined
-            print(e)
-            pass
\ No newline at end of file
@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+# Chunk size for the copy fallback if no zero-copy system call is available
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class NativeWriteError(Exception):
+    """ The native writer can not handle this file, exiftool has to be used instead """
+
+
+class CorruptFileError(NativeWriteError):
+    """ The file header is truncated or damaged, exiftool would fail or stall on it as well """
+
+
+def copy_range(src_fd: int, dst_fd: int, offset: int, count: int, chunk_size: int=COPY_CHUNK_SIZE):
+    """ Copy count bytes starting at offset of src_fd to the current position of dst_fd """
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while count > 0:
+                copied = os.copy_file_range(src_fd, dst_fd, count, offset)
+                if not copied:
+                    break
+                offset += copied
+                count -= copied
+        except OSError:
+            # eg. unsupported by the file system or across devices, continue with the next method
+            pass
+
+    if count > 0 and hasattr(os, 'sendfile') and os.name != 'nt':
+        try:
+            while count > 0:
+                copied = os.sendfile(dst_fd, src_fd, offset, count)
+                if not copied:
+                    break
+                offset += copied
+                count -= copied
+        except OSError:
+            pass
+
+    if count > 0:
+        # Plain buffered copy
+        buffer = bytearray(min(chunk_size, count))
+        with open(src_fd, 'rb', buffering=0, closefd=False) as src, \
+                open(dst_fd, 'wb', buffering=0, closefd=False) as dst, memoryview(buffer) as view:
+            src.seek(offset)
+            while count > 0:
+                read = src.readinto(view[:min(len(buffer), count)])
+                if not read:
+                    break
+                dst.write(view[:read])
+                count -= read
+
+    if count > 0:
+        raise NativeWriteError('File is shorter than expected.')
+
+
+@contextmanager
+def replace_file(file: Path):
+    """
+        Yield a temporary file next to file, opened for binary writing. If the
+        with block succeeds the temporary file atomically replaces file.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=file.parent, prefix=f'.{file.stem}_', suffix='.tiffy_tmp')
+
+    try:
+        with open(fd, 'wb') as tmp_file:
+            yield tmp_file
+        shutil.copymode(file.as_posix(), tmp_name)
+        os.replace(tmp_name, file.as_posix())
+    except BaseException:
+        try:
+            os.remove(tmp_name)
+        except OSError:
+            pass
+        raise
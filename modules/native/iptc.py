@@ -0,0 +1,76 @@
+import struct
+
+from modules.native.common import CorruptFileError
+
+# Exiftool tag name of the IPTC application record datasets
+IPTC_DATASETS = {5: 'ObjectName', 25: 'Keywords', 80: 'By-line', 116: 'CopyrightNotice', 120: 'Caption-Abstract'}
+REPEATABLE = ('Keywords', 'By-line')
+
+# Coded character set dataset 1:90 value of UTF-8
+UTF8_ESCAPE = b'\x1b%G'
+
+PHOTOSHOP_SIGNATURE = b'Photoshop 3.0\x00'
+RESOURCE_IPTC = 0x0404
+
+
+def read_iptc(data: bytes) -> dict:
+    """
+        Return the IPTC datasets of IPTC_DATASETS found in IIM data as exiftool tag name: value
+
+        :raises CorruptFileError: if a dataset exceeds the data
+    """
+    datasets, encoding, pos = list(), 'latin-1', 0
+
+    while pos + 5 <= len(data) and data[pos] == 0x1C:
+        record, dataset, length = struct.unpack('>BBH', data[pos + 1:pos + 5])
+        pos += 5
+
+        if length & 0x8000:
+            # Extended datasets are only used for large binary data
+            size_len = length & 0x7FFF
+            length = int.from_bytes(data[pos:pos + size_len], 'big')
+            pos += size_len
+
+        value = data[pos:pos + length]
+        if len(value) != length:
+            raise CorruptFileError('Truncated IPTC dataset.')
+        pos += length
+
+        if record == 1 and dataset == 90 and value == UTF8_ESCAPE:
+            encoding = 'utf-8'
+        elif record == 2 and dataset in IPTC_DATASETS:
+            datasets.append((IPTC_DATASETS[dataset], value))
+
+    values = dict()
+    for tag, value in datasets:
+        value = value.decode(encoding, 'replace')
+        if tag in values and tag in REPEATABLE:
+            if not isinstance(values[tag], list):
+                values[tag] = [values[tag]]
+            values[tag].append(value)
+        else:
+            values[tag] = value
+
+    return values
+
+
+def iptc_from_photoshop(data: bytes) -> bytes:
+    """ Return the IPTC resource of Photoshop image resource blocks or None """
+    if data.startswith(PHOTOSHOP_SIGNATURE):
+        data = data[len(PHOTOSHOP_SIGNATURE):]
+
+    pos = 0
+    while pos + 12 <= len(data) and data[pos:pos + 4] == b'8BIM':
+        resource_id, name_len = struct.unpack('>HB', data[pos + 4:pos + 7])
+        # Pascal string name padded to even size
+        pos += 6 + name_len + 1 + (name_len + 1) % 2
+        if pos + 4 > len(data):
+            break
+        size = struct.unpack('>I', data[pos:pos + 4])[0]
+        pos += 4
+
+        if resource_id == RESOURCE_IPTC:
+            return data[pos:pos + size]
+        pos += size + size % 2
+
+    return None
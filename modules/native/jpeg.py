@@ -0,0 +1,132 @@
+import os
+import struct
+from pathlib import Path
+
+from modules.native.common import CorruptFileError, NativeWriteError, copy_range, replace_file
+from modules.native.xmp import build_packet
+
+SOI = b'\xff\xd8'
+APP0, APP1, SOS, EOI = 0xE0, 0xE1, 0xDA, 0xD9
+
+XMP_SIGNATURE = b'http://ns.adobe.com/xap/1.0/\x00'
+EXTENDED_XMP_SIGNATURE = b'http://ns.adobe.com/xmp/extension/\x00'
+
+# Segment length field is 16 bit and includes itself
+MAX_SEGMENT_PAYLOAD = 0xFFFF - 2
+
+# Stop looking for the start of scan after this many header bytes
+MAX_HEADER_SIZE = 16 * 1024 * 1024
+
+
+class JpegSegment:
+    """ Marker segment of the JPEG header """
+    __slots__ = ('marker', 'data')
+
+    def __init__(self, marker: int, data: bytes):
+        self.marker = marker
+        self.data = data
+
+    @property
+    def is_xmp(self) -> bool:
+        return self.marker == APP1 and self.data.startswith(XMP_SIGNATURE)
+
+    @property
+    def is_extended_xmp(self) -> bool:
+        return self.marker == APP1 and self.data.startswith(EXTENDED_XMP_SIGNATURE)
+
+    def to_bytes(self) -> bytes:
+        return struct.pack('>BBH', 0xFF, self.marker, len(self.data) + 2) + self.data
+
+
+def read_header(f) -> (list, int):
+    """
+        Read the marker segments of a JPEG file up to the start of scan
+
+        :returns: list of JpegSegment, offset of the SOS marker
+        :raises NativeWriteError: if the file is not a JPEG or has stray bytes or markers before the scan
+        :raises CorruptFileError: if the header is truncated
+    """
+    if f.read(2) != SOI:
+        raise NativeWriteError('Not a JPEG file.')
+
+    segments = list()
+
+    while f.tell() < MAX_HEADER_SIZE:
+        byte = f.read(1)
+        if not byte:
+            raise CorruptFileError('Truncated JPEG header.')
+        if byte != b'\xff':
+            raise NativeWriteError('Unexpected data between JPEG segments.')
+
+        # Markers may be preceded by fill bytes
+        marker = b'\xff'
+        while marker == b'\xff':
+            marker = f.read(1)
+
+        if not marker:
+            raise CorruptFileError('Truncated JPEG header.')
+
+        marker = marker[0]
+        if marker == SOS:
+            return segments, f.tell() - 2
+        if marker == EOI or 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            raise NativeWriteError('Unexpected JPEG marker before start of scan.')
+
+        length_bytes = f.read(2)
+        if len(length_bytes) != 2:
+            raise CorruptFileError('Truncated JPEG header.')
+
+        length = struct.unpack('>H', length_bytes)[0] - 2
+        data = f.read(length)
+        if length < 0 or len(data) != length:
+            raise CorruptFileError('Truncated JPEG segment.')
+
+        segments.append(JpegSegment(marker, data))
+
+    raise NativeWriteError('JPEG header too large.')
+
+
+def write_xmp(file: Path, tags: dict):
+    """
+        Update the XMP Dublin Core properties of a JPEG file
+
+        Only the header up to the start of scan is parsed and rewritten. The compressed
+        image data is copied with zero-copy system calls where available and the result
+        atomically replaces the original file.
+
+        :raises NativeWriteError: if exiftool needs to be used instead
+    """
+    with open(file, 'rb') as src:
+        segments, scan_offset = read_header(src)
+
+    if any(s.is_extended_xmp for s in segments):
+        raise NativeWriteError('Extended XMP is not supported.')
+
+    xmp_segments = [s for s in segments if s.is_xmp]
+    existing = xmp_segments[0].data[len(XMP_SIGNATURE):] if xmp_segments else None
+
+    # JPEG files are always rewritten, padding would only waste space
+    packet = build_packet(existing, tags, padding=0)
+    if len(XMP_SIGNATURE) + len(packet) > MAX_SEGMENT_PAYLOAD:
+        raise NativeWriteError('XMP packet exceeds the size of a JPEG segment.')
+
+    xmp_segment = JpegSegment(APP1, XMP_SIGNATURE + packet)
+
+    if xmp_segments:
+        idx = segments.index(xmp_segments[0])
+        segments = [s for s in segments if not s.is_xmp]
+        segments.insert(idx, xmp_segment)
+    else:
+        # Place XMP behind the JFIF and Exif segments like exiftool does
+        idx = 0
+        while idx < len(segments) and segments[idx].marker in (APP0, APP1):
+            idx += 1
+        segments.insert(idx, xmp_segment)
+
+    header = SOI + b''.join(s.to_bytes() for s in segments)
+
+    # The source needs to be closed before it gets replaced on Windows
+    with replace_file(file) as dst, open(file, 'rb') as src:
+        dst.write(header)
+        dst.flush()
+        copy_range(src.fileno(), dst.fileno(), scan_offset, os.fstat(src.fileno()).st_size - scan_offset)
@@ -0,0 +1,155 @@
+import mmap
+import os
+import struct
+from pathlib import Path
+
+from modules.native import jpeg, tiff
+from modules.native.common import CorruptFileError, NativeWriteError
+from modules.native.iptc import iptc_from_photoshop, read_iptc
+from modules.native.xmp import read_properties
+
+TAG_IMAGE_WIDTH, TAG_IMAGE_HEIGHT = 256, 257
+TAG_STRIP_OFFSETS, TAG_STRIP_BYTE_COUNTS = 273, 279
+TAG_TILE_OFFSETS, TAG_TILE_BYTE_COUNTS = 324, 325
+TAG_IPTC = 33723
+
+# TIFF tag: exiftool tag name of the ASCII tags of IFD0
+EXIF_TEXT_TAGS = {270: 'ImageDescription', 315: 'Artist', 33432: 'Copyright'}
+
+# Start of frame markers carrying the image dimensions
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+EXIF_SIGNATURE = b'Exif\x00\x00'
+
+# Search the end of image marker in this many trailing bytes
+EOI_SEARCH_SIZE = 64 * 1024
+
+
+def _text(data: bytes) -> str:
+    data = data.rstrip(b'\x00').strip()
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        return data.decode('latin-1')
+
+
+def _single(values: tuple):
+    return values[0] if len(values) == 1 else list(values)
+
+
+def _read_ifd0(buf, metadata: dict, group: str='EXIF'):
+    """ Read text, resolution and dimension tags of IFD0 of a TIFF structure """
+    header = tiff.TiffHeader(buf)
+    header.check_values()
+    entries = header.entries
+
+    for tag, name in EXIF_TEXT_TAGS.items():
+        if tag in entries:
+            metadata[f'EXIF:{name}'] = _text(header.raw(buf, entries[tag]))
+
+    for name, tag in tiff.DPI_TAGS.items():
+        if tag in entries:
+            metadata[f'{group}:{name}'] = _single(header.numbers(buf, entries[tag]))
+
+    for name, tag in (('ImageWidth', TAG_IMAGE_WIDTH), ('ImageHeight', TAG_IMAGE_HEIGHT)):
+        if tag in entries:
+            metadata[f'{group}:{name}'] = _single(header.numbers(buf, entries[tag]))
+
+    return header
+
+
+def _check_image_data(buf, header: tiff.TiffHeader):
+    """ Detect TIFF files truncated within their image data eg. by an aborted copy """
+    entries = header.entries
+
+    for offsets_tag, counts_tag in ((TAG_STRIP_OFFSETS, TAG_STRIP_BYTE_COUNTS),
+                                    (TAG_TILE_OFFSETS, TAG_TILE_BYTE_COUNTS)):
+        if offsets_tag not in entries or counts_tag not in entries:
+            continue
+
+        offsets = header.numbers(buf, entries[offsets_tag])
+        counts = header.numbers(buf, entries[counts_tag])
+        end = max((o + c for o, c in zip(offsets, counts)), default=0)
+
+        if end > header.file_size:
+            raise CorruptFileError('TIFF image data is truncated.')
+
+
+def _read_tiff(mm, metadata: dict):
+    header = _read_ifd0(mm, metadata)
+    _check_image_data(mm, header)
+    entries = header.entries
+
+    if tiff.TAG_XMP in entries:
+        metadata.update({f'XMP:{k}': v for k, v in read_properties(header.raw(mm, entries[tiff.TAG_XMP])).items()})
+
+    if TAG_IPTC in entries:
+        metadata.update({f'IPTC:{k}': v for k, v in read_iptc(header.raw(mm, entries[TAG_IPTC])).items()})
+
+
+def _read_jpeg(mm, metadata: dict):
+    segments, scan_offset = jpeg.read_header(mm)
+
+    if mm.rfind(b'\xff\xd9', max(scan_offset, len(mm) - EOI_SEARCH_SIZE)) == -1:
+        raise CorruptFileError('JPEG image data is truncated.')
+
+    for segment in segments:
+        if segment.marker == jpeg.APP0 and segment.data.startswith(b'JFIF\x00') and len(segment.data) >= 12:
+            unit, x_res, y_res = struct.unpack('>BHH', segment.data[7:12])
+            metadata.update({'JFIF:ResolutionUnit': unit, 'JFIF:XResolution': x_res, 'JFIF:YResolution': y_res})
+        elif segment.marker == jpeg.APP1 and segment.data.startswith(EXIF_SIGNATURE):
+            _read_ifd0(segment.data[len(EXIF_SIGNATURE):], metadata)
+        elif segment.is_extended_xmp:
+            raise NativeWriteError('Extended XMP is not supported.')
+        elif segment.is_xmp:
+            packet = segment.data[len(jpeg.XMP_SIGNATURE):]
+            metadata.update({f'XMP:{k}': v for k, v in read_properties(packet).items()})
+        elif segment.marker == 0xED:
+            iptc = iptc_from_photoshop(segment.data)
+            if iptc:
+                metadata.update({f'IPTC:{k}': v for k, v in read_iptc(iptc).items()})
+        elif segment.marker in SOF_MARKERS and len(segment.data) >= 5:
+            height, width = struct.unpack('>HH', segment.data[1:5])
+            metadata.update({'File:ImageWidth': width, 'File:ImageHeight': height})
+
+
+def read_metadata(file: Path) -> dict:
+    """
+        Read the XMP, IPTC and EXIF text tags, resolution and dimensions from the file header.
+        Keys are exiftool group:tag names as returned by ExifTool.get_metadata_batch,
+        pixel data is never read.
+
+        :raises CorruptFileError: if the header or image data is truncated or damaged
+        :raises NativeWriteError: if the file has to be read by exiftool
+    """
+    suffix = file.suffix.casefold()
+    metadata = {'SourceFile': file.as_posix()}
+
+    with open(file, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < 16:
+            raise CorruptFileError('File is too small for an image.')
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            try:
+                if suffix in ('.tif', '.tiff'):
+                    _read_tiff(mm, metadata)
+                elif suffix in ('.jpg', '.jpeg'):
+                    _read_jpeg(mm, metadata)
+                else:
+                    raise NativeWriteError('No native reader for this file type.')
+            except (struct.error, IndexError) as e:
+                raise CorruptFileError(f'Damaged header: {e}')
+
+    return metadata
+
+
+def check_file(file: Path):
+    """
+        Raise CorruptFileError if the header of file is truncated or damaged,
+        all other problems are left to exiftool
+    """
+    try:
+        read_metadata(file)
+    except CorruptFileError:
+        raise
+    except (NativeWriteError, OSError, ValueError):
+        pass
@@ -0,0 +1,386 @@
+import mmap
+import os
+import struct
+from collections import OrderedDict
+from fractions import Fraction
+from pathlib import Path
+
+from modules.native.common import CorruptFileError, NativeWriteError
+from modules.native.xmp import DEFAULT_PADDING, build_packet
+
+TAG_X_RESOLUTION, TAG_Y_RESOLUTION, TAG_RESOLUTION_UNIT = 282, 283, 296
+TAG_XMP = 700
+
+# Exiftool tag name: TIFF tag of the resolution tags
+DPI_TAGS = OrderedDict([('ResolutionUnit', TAG_RESOLUTION_UNIT), ('XResolution', TAG_X_RESOLUTION),
+                        ('YResolution', TAG_Y_RESOLUTION)])
+
+BYTE, ASCII, SHORT, LONG, RATIONAL, UNDEFINED, LONG8 = 1, 2, 3, 4, 5, 7, 16
+
+# Size in bytes of a single value of the TIFF field types
+TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 13: 4, 16: 8, 17: 8, 18: 8}
+
+# Limit to detect IFD offsets pointing into garbage
+MAX_IFD_ENTRIES = 4096
+
+
+class TiffEntry:
+    """ Directory entry of a TIFF image file directory """
+    __slots__ = ('tag', 'type', 'count', 'offset', 'value_offset')
+
+    def __init__(self, tag: int, type_: int, count: int, offset: int, value_offset: int):
+        self.tag = tag
+        self.type = type_
+        self.count = count
+        # File offset of the directory entry itself
+        self.offset = offset
+        # File offset of the value, inside the entry for small values
+        self.value_offset = value_offset
+
+    @property
+    def size(self) -> int:
+        return TYPE_SIZES.get(self.type, 1) * self.count
+
+
+class TiffHeader:
+    """
+        Parsed header and first image file directory of a TIFF or BigTIFF file
+
+        Values pointing beyond the end of the file eg. a damaged MakerNote offset are
+        not fatal by themselves, see check_values.
+
+        :param buf: bytes like object of the whole file eg. a mmap
+        :raises NativeWriteError: if the file is not a TIFF or its directory is unusual
+        :raises CorruptFileError: if the directory is truncated or damaged
+    """
+    def __init__(self, buf):
+        self.file_size = len(buf)
+        # Tags with a value beyond the end of the file
+        self.invalid_tags = set()
+
+        if buf[:2] == b'II':
+            self.byte_order = '<'
+        elif buf[:2] == b'MM':
+            self.byte_order = '>'
+        else:
+            raise NativeWriteError('Not a TIFF file.')
+
+        version = self.unpack('H', buf, 2)
+        if version == 42:
+            self.big = False
+            self.ifd_pointer_offset = 4
+        elif version == 43 and self.unpack('HH', buf, 4) == (8, 0):
+            self.big = True
+            self.ifd_pointer_offset = 8
+        else:
+            raise NativeWriteError('Not a TIFF file.')
+
+        self.ifd_offset = self.unpack(self.offset_format, buf, self.ifd_pointer_offset)
+        self.entries = OrderedDict()
+        self._read_ifd(buf)
+
+    @property
+    def offset_format(self) -> str:
+        return 'Q' if self.big else 'I'
+
+    @property
+    def entry_size(self) -> int:
+        return 20 if self.big else 12
+
+    @property
+    def count_size(self) -> int:
+        """ Size of the number of entries field of a directory """
+        return 8 if self.big else 2
+
+    def unpack(self, fmt: str, buf, offset: int):
+        fmt = self.byte_order + fmt
+        end = offset + struct.calcsize(fmt)
+        if offset < 0 or end > self.file_size:
+            raise CorruptFileError('TIFF structure points beyond the end of the file.')
+
+        values = struct.unpack(fmt, buf[offset:end])
+        return values if len(values) > 1 else values[0]
+
+    def pack(self, fmt: str, *values) -> bytes:
+        return struct.pack(self.byte_order + fmt, *values)
+
+    def _read_ifd(self, buf):
+        if self.ifd_offset < self.ifd_pointer_offset:
+            raise CorruptFileError('Invalid TIFF directory offset.')
+        if self.ifd_offset % 2:
+            # Violates the specification but readable, leave it to exiftool
+            raise NativeWriteError('TIFF directory offset is not word aligned.')
+
+        num_entries = self.unpack('Q' if self.big else 'H', buf, self.ifd_offset)
+        if not num_entries or num_entries > MAX_IFD_ENTRIES:
+            raise CorruptFileError('Invalid number of TIFF directory entries.')
+
+        entry_offset = self.ifd_offset + self.count_size
+        value_field_size = 8 if self.big else 4
+
+        for _idx in range(num_entries):
+            if self.big:
+                tag, type_, count = self.unpack('HHQ', buf, entry_offset)
+            else:
+                tag, type_, count = self.unpack('HHI', buf, entry_offset)
+
+            value_field = entry_offset + self.entry_size - value_field_size
+            entry = TiffEntry(tag, type_, count, entry_offset, value_field)
+
+            if entry.size > value_field_size:
+                entry.value_offset = self.unpack(self.offset_format, buf, value_field)
+                if entry.value_offset + entry.size > self.file_size:
+                    self.invalid_tags.add(tag)
+
+            self.entries[tag] = entry
+            entry_offset += self.entry_size
+
+        # Offset of the pointer to the next directory
+        self.next_ifd_pointer_offset = entry_offset
+        self.next_ifd_offset = self.unpack(self.offset_format, buf, entry_offset)
+
+    def check_values(self, tags=()):
+        """
+            :param tags: tags to read or write, their values need to be complete
+            :raises CorruptFileError: if the value of one of tags points beyond the end of the file
+            :raises NativeWriteError: if the value of any other tag does, exiftool copes with that
+        """
+        truncated = self.invalid_tags.intersection(tags)
+        if truncated:
+            raise CorruptFileError(f'Value of TIFF tag {min(truncated)} points beyond the end of the file.')
+        if self.invalid_tags:
+            raise NativeWriteError(f'Value of TIFF tag {min(self.invalid_tags)} points beyond the end of the file.')
+
+    def raw(self, buf, entry: TiffEntry) -> bytes:
+        """ Raw value bytes of entry """
+        return bytes(buf[entry.value_offset:entry.value_offset + entry.size])
+
+    def numbers(self, buf, entry: TiffEntry) -> tuple:
+        """ Values of a numeric entry, RATIONALs as floats """
+        fmt = {BYTE: 'B', SHORT: 'H', LONG: 'I', LONG8: 'Q', RATIONAL: 'II'}.get(entry.type)
+        if fmt is None:
+            raise NativeWriteError(f'TIFF tag {entry.tag} is not numeric.')
+
+        values = struct.unpack(f'{self.byte_order}{entry.count}{fmt}', self.raw(buf, entry))
+        if entry.type == RATIONAL:
+            return tuple(n / d if d else 0.0 for n, d in zip(values[::2], values[1::2]))
+        return values
+
+    def value_field(self, entry: TiffEntry) -> int:
+        """ File offset of the count/offset field of entry """
+        return entry.offset + self.entry_size - (8 if self.big else 4)
+
+    def entry_bytes(self, tag: int, type_: int, count: int, value: bytes) -> bytes:
+        """ Directory entry with value being the raw offset or inline value field """
+        if self.big:
+            return self.pack('HHQ', tag, type_, count) + value
+        return self.pack('HHI', tag, type_, count) + value
+
+
+def _read_packet(mm, entry: TiffEntry) -> bytes:
+    # Some writers terminate the packet with null bytes
+    return bytes(mm[entry.value_offset:entry.value_offset + entry.count]).rstrip(b'\x00')
+
+
+def _append(f, data: bytes) -> int:
+    """ Append data word aligned to the end of the file, returns its offset """
+    end = f.seek(0, os.SEEK_END)
+    if end % 2:
+        f.write(b'\x00')
+        end += 1
+
+    f.write(data)
+    return end
+
+
+def _check_offset(header: TiffHeader, offset: int):
+    if not header.big and offset > 0xFFFFFFFF:
+        raise NativeWriteError('File too large for a classic TIFF offset.')
+
+
+def _relocate_ifd(f, mm, header: TiffHeader, new_entry: bytes, new_tag: int):
+    """ Append a copy of the first directory with new_entry added and point the header to it """
+    entries = list()
+    for entry in header.entries.values():
+        raw = bytes(mm[entry.offset:entry.offset + header.entry_size])
+        entries.append((entry.tag, raw))
+
+    entries.append((new_tag, new_entry))
+    entries.sort(key=lambda e: e[0])
+
+    count_format = 'Q' if header.big else 'H'
+    ifd = header.pack(count_format, len(entries)) + b''.join(raw for _tag, raw in entries) + \
+        header.pack(header.offset_format, header.next_ifd_offset)
+
+    ifd_offset = _append(f, ifd)
+    _check_offset(header, ifd_offset)
+    f.flush()
+
+    # Directory data is in place, now switch the header over to it
+    f.seek(header.ifd_pointer_offset)
+    f.write(header.pack(header.offset_format, ifd_offset))
+
+
+def write_xmp(file: Path, tags: dict):
+    """
+        Update the XMP Dublin Core properties of a TIFF file in place
+
+        The packet of tag 700 in the first directory is overwritten if the new packet fits
+        into the space of the old one including its padding. Otherwise the new packet is
+        appended to the end of the file and the directory entry is repointed to it. Files
+        without XMP get a relocated copy of the first directory with the XMP entry added.
+        Only the packet and a few directory bytes are written, the image data is never touched.
+
+        :raises NativeWriteError: if exiftool needs to be used instead
+    """
+    with open(file, 'r+b') as f:
+        if os.fstat(f.fileno()).st_size < 16:
+            raise NativeWriteError('Not a TIFF file.')
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE) as mm:
+            header = TiffHeader(mm)
+            header.check_values((TAG_XMP,))
+            entry = header.entries.get(TAG_XMP)
+
+            if entry is not None:
+                if entry.type not in (BYTE, UNDEFINED):
+                    raise NativeWriteError('Unexpected type of the TIFF XMP tag.')
+
+                existing = _read_packet(mm, entry)
+
+                try:
+                    packet = build_packet(existing, tags, size=entry.count)
+                except NativeWriteError:
+                    # Does not fit, the packet needs to move to the end of the file
+                    packet = None
+
+                if packet is not None:
+                    mm[entry.value_offset:entry.value_offset + entry.count] = packet
+                    mm.flush()
+                    return
+            else:
+                existing = None
+
+            packet = build_packet(existing, tags, padding=DEFAULT_PADDING)
+
+        offset = _append(f, packet)
+        _check_offset(header, offset)
+        value = header.pack(header.offset_format, offset)
+
+        if entry is not None:
+            f.flush()
+            # Count and offset are written in one go after the packet data is complete
+            f.seek(header.value_field(entry) - (8 if header.big else 4))
+            f.write(header.pack(header.offset_format, len(packet)) + value)
+        else:
+            # Packet with padding is always larger than an inline value
+            new_entry = header.entry_bytes(TAG_XMP, BYTE, len(packet), value)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                _relocate_ifd(f, mm, header, new_entry, TAG_XMP)
+
+
+def to_rational(value) -> (int, int):
+    """ Convert a resolution value eg. '300.0' or '118,11' to a TIFF RATIONAL numerator, denominator """
+    try:
+        fraction = Fraction(f'{value}'.strip().replace(',', '.')).limit_denominator(1000000)
+    except (ValueError, ZeroDivisionError):
+        raise NativeWriteError(f'Invalid resolution value: {value}')
+
+    if fraction <= 0 or fraction.numerator > 0xFFFFFFFF:
+        raise NativeWriteError(f'Resolution value out of range: {value}')
+
+    return fraction.numerator, fraction.denominator
+
+
+def _dpi_values(dpi: dict) -> dict:
+    """ TIFF tag: expected raw value of the resolution tags to write """
+    values = dict()
+
+    for name, value in dpi.items():
+        if name not in DPI_TAGS:
+            raise NativeWriteError(f'Tag {name} is not a resolution tag.')
+
+        if DPI_TAGS[name] == TAG_RESOLUTION_UNIT:
+            try:
+                unit = int(f'{value}'.strip())
+            except ValueError:
+                unit = 0
+            if unit not in (1, 2, 3):
+                raise NativeWriteError(f'Invalid resolution unit: {value}')
+            values[TAG_RESOLUTION_UNIT] = unit
+        else:
+            values[DPI_TAGS[name]] = to_rational(value)
+
+    return values
+
+
+def _resolution_entry(header: TiffHeader, tag: int) -> TiffEntry:
+    entry = header.entries.get(tag)
+    expected_type = SHORT if tag == TAG_RESOLUTION_UNIT else RATIONAL
+
+    # Missing tags require a new directory entry, leave that to exiftool
+    if entry is None or entry.type != expected_type or entry.count != 1:
+        raise NativeWriteError(f'TIFF tag {tag} missing or of unexpected type.')
+
+    return entry
+
+
+def read_dpi(buf) -> dict:
+    """ Read the raw resolution values of the first directory, TIFF tag: value """
+    header = TiffHeader(buf)
+    values = dict()
+
+    for tag in DPI_TAGS.values():
+        entry = header.entries.get(tag)
+        if entry is None or entry.count != 1:
+            continue
+        if tag == TAG_RESOLUTION_UNIT and entry.type == SHORT:
+            values[tag] = header.unpack('H', buf, entry.value_offset)
+        elif entry.type == RATIONAL:
+            values[tag] = header.unpack('II', buf, entry.value_offset)
+
+    return values
+
+
+def write_dpi(file: Path, dpi: dict):
+    """
+        Patch the resolution tags of the first directory in place
+
+        ResolutionUnit is a SHORT stored inside its directory entry, the resolutions are
+        RATIONALs at fixed offsets. All tags need to exist, are verified after writing
+        by reading the file again and nothing else of the file is changed.
+
+        :param dpi: exiftool tag name: value eg. {'ResolutionUnit': '2', 'XResolution': '300.0'}
+        :raises NativeWriteError: if exiftool needs to be used instead
+    """
+    values = _dpi_values(dpi)
+
+    with open(file, 'r+b') as f:
+        if os.fstat(f.fileno()).st_size < 16:
+            raise NativeWriteError('Not a TIFF file.')
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE) as mm:
+            header = TiffHeader(mm)
+            header.check_values(values)
+            entries = {tag: _resolution_entry(header, tag) for tag in values}
+
+            x_entry, y_entry = entries.get(TAG_X_RESOLUTION), entries.get(TAG_Y_RESOLUTION)
+            if x_entry and y_entry and x_entry.value_offset == y_entry.value_offset \
+                    and values[TAG_X_RESOLUTION] != values[TAG_Y_RESOLUTION]:
+                raise NativeWriteError('X and Y resolution share their value.')
+
+            for tag, value in values.items():
+                entry = entries[tag]
+                if tag == TAG_RESOLUTION_UNIT:
+                    data = header.pack('H', value)
+                else:
+                    data = header.pack('II', *value)
+                mm[entry.value_offset:entry.value_offset + len(data)] = data
+
+            mm.flush()
+
+    with open(file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        written = read_dpi(mm)
+
+    if any(written.get(tag) != value for tag, value in values.items()):
+        raise NativeWriteError('Verification of the written resolution failed.')
@@ -0,0 +1,44 @@
+from pathlib import Path
+
+from modules.native import jpeg, tiff
+from modules.native.common import NativeWriteError
+from modules.native.tiff import DPI_TAGS
+from modules.native.xmp import XMP_TAGS
+
+JPEG_TYPES = ('.jpg', '.jpeg')
+TIFF_TYPES = ('.tif', '.tiff')
+
+
+def can_write_native(file: Path, tags: dict, dpi: dict) -> bool:
+    """ Quick check by file type and tags whether write_native may handle this update """
+    suffix = file.suffix.casefold()
+
+    if suffix in JPEG_TYPES:
+        return bool(tags) and not dpi and all(tag in XMP_TAGS for tag in tags)
+
+    if suffix in TIFF_TYPES:
+        return bool(tags or dpi) and all(tag in XMP_TAGS for tag in tags) and all(tag in DPI_TAGS for tag in dpi)
+
+    return False
+
+
+def write_native(file: Path, tags: dict, dpi: dict):
+    """
+        Write metadata without exiftool
+
+        :param file: image file
+        :param tags: exiftool tag name: value of XMP tags to write
+        :param dpi: exiftool tag name: value of resolution tags to write
+        :raises NativeWriteError: if the update needs to be done by exiftool
+    """
+    if not can_write_native(file, tags, dpi):
+        raise NativeWriteError('No native writer for this file type and tags.')
+
+    if file.suffix.casefold() in TIFF_TYPES:
+        # Resolution first, it fails before anything is written if tags are missing
+        if dpi:
+            tiff.write_dpi(file, dpi)
+        if tags:
+            tiff.write_xmp(file, tags)
+    else:
+        jpeg.write_xmp(file, tags)
@@ -0,0 +1,254 @@
+import re
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from io import BytesIO
+from itertools import count
+
+from modules.native.common import NativeWriteError
+
+NS_X = 'adobe:ns:meta/'
+NS_RDF = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+NS_DC = 'http://purl.org/dc/elements/1.1/'
+NS_XML = 'http://www.w3.org/XML/1998/namespace'
+NS_XMP_NOTE = 'http://ns.adobe.com/xmp/note/'
+
+# Prefixes of the namespaces created by Tiffy
+DEFAULT_PREFIXES = {NS_X: 'x', NS_RDF: 'rdf', NS_DC: 'dc'}
+
+# Exiftool tag name: (Dublin Core property, rdf container type)
+XMP_TAGS = OrderedDict([
+    ('Title', ('title', 'Alt')),
+    ('Creator', ('creator', 'Seq')),
+    ('Description', ('description', 'Alt')),
+    ('Subject', ('subject', 'Bag')),
+    ('Rights', ('rights', 'Alt')),
+    ])
+
+PACKET_HEADER = b"<?xpacket begin='\xef\xbb\xbf' id='W5M0MpCehiHzreSzNTczkc9d'?>\n"
+PACKET_TRAILER = b"<?xpacket end='w'?>"
+PADDING_LINE = b' ' * 99 + b'\n'
+
+# Recommended amount of padding to allow in place updates of the packet
+DEFAULT_PADDING = 2048
+
+_invalid_xml_chars = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def _rdf(name: str) -> str:
+    return f'{{{NS_RDF}}}{name}'
+
+
+def _dc(name: str) -> str:
+    return f'{{{NS_DC}}}{name}'
+
+
+def _read_prefixes(packet: bytes) -> dict:
+    """ Namespace uri: prefix declared in packet, the first declaration of an uri wins """
+    prefixes = dict()
+
+    try:
+        for _event, (prefix, uri) in ET.iterparse(BytesIO(packet), events=('start-ns',)):
+            if prefix and uri not in prefixes:
+                prefixes[uri] = prefix
+    except ET.ParseError as e:
+        raise NativeWriteError(f'Could not parse existing XMP: {e}')
+
+    return prefixes
+
+
+def _parse_packet(packet: bytes) -> (ET.Element, dict):
+    """ Parsed packet and its namespace uri: prefix """
+    prefixes = _read_prefixes(packet)
+
+    try:
+        root = ET.fromstring(packet)
+    except ET.ParseError as e:
+        raise NativeWriteError(f'Could not parse existing XMP: {e}')
+
+    if root.find(f'.//{{{NS_XMP_NOTE}}}HasExtendedXMP') is not None or \
+            any(k == f'{{{NS_XMP_NOTE}}}HasExtendedXMP' for d in root.iter(_rdf('Description')) for k in d.attrib):
+        raise NativeWriteError('Extended XMP is not supported.')
+
+    return root, prefixes
+
+
+def _escape(text: str, attribute: bool=False) -> str:
+    text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    if attribute:
+        text = text.replace('"', '&quot;').replace('\n', '&#10;').replace('\r', '&#13;').replace('\t', '&#09;')
+    return text
+
+
+def _serialize(root: ET.Element, prefixes: dict) -> str:
+    """
+        Serialize root like ET.tostring with the namespace uri: prefix of prefixes. Prefixes are
+        not registered with ET.register_namespace, that would change the output of every other
+        thread. Namespaces without a prefix or with a prefix already in use get ns0 style prefixes.
+    """
+    uri_prefixes = {NS_XML: 'xml'}
+    used = {'xml', 'xmlns'}
+
+    def qname(name: str) -> str:
+        if not name.startswith('{'):
+            return name
+
+        uri, local = name[1:].split('}', 1)
+        if uri not in uri_prefixes:
+            prefix = prefixes.get(uri) or DEFAULT_PREFIXES.get(uri)
+            if not prefix or prefix in used:
+                prefix = next(f'ns{idx}' for idx in count() if f'ns{idx}' not in used)
+            uri_prefixes[uri] = prefix
+            used.add(prefix)
+
+        return f'{uri_prefixes[uri]}:{local}'
+
+    # Collect the namespaces up front, they are declared on the root element
+    for element in root.iter():
+        qname(element.tag)
+        for name in element.attrib:
+            qname(name)
+
+    parts = list()
+
+    def write(element: ET.Element, declarations: list):
+        tag = qname(element.tag)
+        parts.append(f'<{tag}')
+        for prefix, uri in declarations:
+            parts.append(f' xmlns:{prefix}="{_escape(uri, True)}"')
+        for name, value in element.attrib.items():
+            parts.append(f' {qname(name)}="{_escape(value, True)}"')
+
+        if element.text or len(element):
+            parts.append('>')
+            if element.text:
+                parts.append(_escape(element.text))
+            for child in element:
+                write(child, [])
+            parts.append(f'</{tag}>')
+        else:
+            parts.append(' />')
+
+        if element.tail:
+            parts.append(_escape(element.tail))
+
+    write(root, sorted((prefix, uri) for uri, prefix in uri_prefixes.items() if uri != NS_XML))
+    return ''.join(parts)
+
+
+def _new_root() -> ET.Element:
+    root = ET.Element(f'{{{NS_X}}}xmpmeta')
+    ET.SubElement(root, _rdf('RDF'))
+    return root
+
+
+def _set_property(description: ET.Element, descriptions: list, prop: str, container: str, value: str):
+    keep_items = list()
+
+    for d in descriptions:
+        # Shorthand attribute form
+        d.attrib.pop(_dc(prop), None)
+
+        for element in d.findall(_dc(prop)):
+            if container == 'Alt':
+                # Keep alternative languages, only the default language is replaced
+                for li in element.iter(_rdf('li')):
+                    if li.get(f'{{{NS_XML}}}lang', 'x-default') != 'x-default':
+                        keep_items.append(li)
+            d.remove(element)
+
+    element = ET.SubElement(description, _dc(prop))
+    items = ET.SubElement(element, _rdf(container))
+    li = ET.SubElement(items, _rdf('li'))
+    li.text = value
+
+    if container == 'Alt':
+        li.set(f'{{{NS_XML}}}lang', 'x-default')
+        items.extend(keep_items)
+
+
+def build_packet(existing: bytes=None, tags: dict=None, padding: int=DEFAULT_PADDING, size: int=None) -> bytes:
+    """
+        Return a XMP packet with the Dublin Core properties of the exiftool tags in tags set.
+        All other properties of an existing packet are kept.
+
+        :param existing: current XMP packet of the file or None
+        :param tags: exiftool tag name: value, see XMP_TAGS
+        :param padding: minimum bytes of whitespace padding to allow later in place updates
+        :param size: pad the packet to exactly this many bytes
+        :raises NativeWriteError: if the existing packet or the values can not be handled
+    """
+    if existing and existing.strip(b' \t\r\n\x00'):
+        root, prefixes = _parse_packet(existing)
+    else:
+        root, prefixes = _new_root(), dict()
+
+    rdf = root if root.tag == _rdf('RDF') else root.find(_rdf('RDF'))
+    if rdf is None:
+        raise NativeWriteError('Existing XMP contains no rdf:RDF element.')
+
+    descriptions = rdf.findall(_rdf('Description'))
+    if descriptions:
+        description = descriptions[0]
+    else:
+        description = ET.SubElement(rdf, _rdf('Description'), {_rdf('about'): ''})
+        descriptions.append(description)
+
+    for tag, value in (tags or dict()).items():
+        if tag not in XMP_TAGS:
+            raise NativeWriteError(f'Tag {tag} is not supported.')
+
+        value = f'{value}'
+        if _invalid_xml_chars.search(value):
+            raise NativeWriteError(f'Value of {tag} contains characters not allowed in XMP.')
+
+        prop, container = XMP_TAGS[tag]
+        _set_property(description, descriptions, prop, container, value)
+
+    xml = _serialize(root, prefixes).encode('utf-8')
+    packet_size = len(PACKET_HEADER) + len(xml) + 1 + len(PACKET_TRAILER)
+
+    if size is not None:
+        if packet_size > size:
+            raise NativeWriteError('XMP packet does not fit into the available space.')
+        padding = size - packet_size
+    else:
+        padding = max(0, padding)
+
+    padding_bytes = PADDING_LINE * (padding // len(PADDING_LINE)) + b' ' * (padding % len(PADDING_LINE))
+    return PACKET_HEADER + xml + b'\n' + padding_bytes + PACKET_TRAILER
+
+
+def read_properties(packet: bytes) -> dict:
+    """
+        Return the Dublin Core properties of XMP_TAGS found in packet as exiftool tag name: value.
+        Containers with several items are returned as list like exiftool does.
+
+        :raises NativeWriteError: if the packet can not be parsed
+    """
+    try:
+        root = ET.fromstring(packet.rstrip(b'\x00'))
+    except ET.ParseError as e:
+        raise NativeWriteError(f'Could not parse XMP: {e}')
+
+    properties = dict()
+
+    for tag, (prop, container) in XMP_TAGS.items():
+        values = list()
+
+        for description in root.iter(_rdf('Description')):
+            if _dc(prop) in description.attrib:
+                values.append(description.attrib[_dc(prop)])
+
+            for element in description.findall(_dc(prop)):
+                items = list(element.iter(_rdf('li')))
+                if container == 'Alt':
+                    # Prefer the default language like exiftool does
+                    items = [li for li in items if li.get(f'{{{NS_XML}}}lang', 'x-default') == 'x-default'] or items[:1]
+                if not items and element.text and element.text.strip():
+                    values.append(element.text.strip())
+                values.extend(li.text or '' for li in items)
+
+        if values:
+            properties[tag] = values if len(values) > 1 else values[0]
+
+    return properties
@@ -0,0 +1,164 @@
+import json
+import os
+import time
+from pathlib import Path
+
+from modules.app_globals import get_settings_dir
+from modules.exif_job import ExifJob
+from modules.log import init_logging
+
+LOGGER = init_logging(__name__)
+
+JOURNAL_DIR = 'journals'
+
+
+class RunJournal:
+    """
+        Append-only checkpoint journal of a run
+
+        One JSON record per line: a run header, the planned jobs with their values and
+        the files that completed. A run that was cancelled, closed or crashed before its
+        finished record can be resumed with the jobs that did not complete. Completed
+        files are buffered and written every flush_count files or flush_interval seconds.
+    """
+    # Write buffered records after this many files or seconds
+    flush_count = 500
+    flush_interval = 2.0
+
+    # Planned jobs per line
+    plan_chunk_size = 1000
+
+    # Number of journals to keep
+    max_journals = 5
+
+    def __init__(self, journal_file: Path):
+        self.journal_file = Path(journal_file)
+        self._file = open(self.journal_file, 'a', encoding='utf-8')
+        self._done = list()
+        self._last_flush = time.monotonic()
+
+    @staticmethod
+    def journal_dir() -> Path:
+        settings_dir = get_settings_dir()
+        if not settings_dir:
+            raise OSError('No settings directory available for the run journal.')
+
+        journal_dir = Path(settings_dir, JOURNAL_DIR)
+        journal_dir.mkdir(exist_ok=True)
+        return journal_dir
+
+    @classmethod
+    def create(cls, img_path: Path, journal_dir: Path=None) -> 'RunJournal':
+        journal_dir = journal_dir or cls.journal_dir()
+        cls.remove_old(journal_dir)
+
+        now = time.time()
+        journal = cls(Path(journal_dir, time.strftime('run_%Y%m%d_%H%M%S', time.localtime(now)) +
+                           f'_{int(now * 1000) % 1000:03d}.jsonl'))
+        journal._write({'run': {'path': Path(img_path).as_posix() if img_path else None, 'started': now}})
+        journal._file.flush()
+        return journal
+
+    @classmethod
+    def remove_old(cls, journal_dir: Path):
+        journals = sorted(journal_dir.glob('run_*.jsonl'))
+        for journal_file in journals[:max(0, len(journals) - cls.max_journals + 1)]:
+            try:
+                journal_file.unlink()
+            except OSError as e:
+                LOGGER.error('Could not remove old run journal %s: %s', journal_file, e)
+
+    @classmethod
+    def last_unfinished(cls, journal_dir: Path=None):
+        """ Return the journal file of the latest run that did not finish or None """
+        journal_dir = journal_dir or cls.journal_dir()
+        journals = sorted(journal_dir.glob('run_*.jsonl'))
+
+        if journals and not cls.read(journals[-1])['finished']:
+            return journals[-1]
+        return None
+
+    @staticmethod
+    def read(journal_file: Path) -> dict:
+        """ Return the run header, planned jobs in order, completed files and finished state of a journal """
+        run, planned, done, finished = dict(), dict(), set(), False
+
+        with open(journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Last line of a crashed run may be incomplete
+                    continue
+
+                if 'run' in record:
+                    run = record['run']
+                elif 'plan' in record:
+                    # A file is planned once, even if a journal lists it again
+                    for entry in record['plan']:
+                        planned.setdefault(entry['f'], entry)
+                elif 'done' in record:
+                    done.update(record['done'])
+                elif 'finished' in record:
+                    finished = True
+
+        return dict(run=run, planned=list(planned.values()), done=done, finished=finished)
+
+    @classmethod
+    def load(cls, journal_file: Path) -> (dict, list):
+        """ Return the run header and ExifJob's of the planned files that did not complete """
+        journal = cls.read(journal_file)
+        jobs = [ExifJob(Path(entry['f']), entry['t'], entry['d'], entry.get('n'))
+                for entry in journal['planned'] if entry['f'] not in journal['done']]
+
+        LOGGER.info('Run journal %s: %s of %s files did not complete.',
+                    journal_file.name, len(jobs), len(journal['planned']))
+        return journal['run'], jobs
+
+    @staticmethod
+    def _key(file: Path) -> str:
+        return Path(os.path.abspath(file)).as_posix()
+
+    def plan(self, jobs: list):
+        for idx in range(0, len(jobs), self.plan_chunk_size):
+            self._write({'plan': [self._entry(job) for job in jobs[idx:idx + self.plan_chunk_size]]})
+        self._file.flush()
+
+    @classmethod
+    def _entry(cls, job) -> dict:
+        entry = {'f': cls._key(job.file), 't': job.tags, 'd': job.dpi}
+        if job.name != job.file.name:
+            # Files of subdirectories are reported by their relative path
+            entry['n'] = job.name
+        return entry
+
+    def done(self, file: Path):
+        self._done.append(self._key(file))
+
+        if len(self._done) >= self.flush_count or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self._done:
+            self._write({'done': self._done})
+            self._done = list()
+
+        self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def finish(self):
+        """ Mark the run as complete, it will not be offered for resuming """
+        self.flush()
+        self._write({'finished': time.time()})
+        self.close()
+
+    def close(self):
+        if self._file.closed:
+            return
+
+        self.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str) + '\n')
@@ -0,0 +1,216 @@
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+from modules.exif_job import ExifJob
+from modules.native.common import copy_range, replace_file
+from modules.native.writer import can_write_native
+from modules.log import init_logging
+
+LOGGER = init_logging(__name__)
+
+# File system types of /proc/mounts served over the network
+NETWORK_FS_TYPES = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'afs', '9p', 'ceph', 'glusterfs', 'davfs',
+                    'fuse.sshfs', 'fuse.rclone', 'fuse.glusterfs', 'fuse.cephfs'}
+
+
+class StagingError(Exception):
+    """ A staged file can not be written back """
+
+
+def is_network_path(file: Path) -> bool:
+    """ Return True if file is located on a network share """
+    path = os.path.abspath(file)
+
+    if os.name == 'nt':
+        if path.startswith('\\\\'):
+            return True
+
+        import ctypes
+        drive_remote = 4
+        root = os.path.splitdrive(path)[0] + '\\'
+        return ctypes.windll.kernel32.GetDriveTypeW(root) == drive_remote
+
+    try:
+        with open('/proc/mounts', 'r') as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return False
+
+    path = os.path.realpath(path)
+    best, fs_type = '', None
+
+    for mount_point, mount_type in mounts:
+        # Spaces in mount points are escaped as \040
+        mount_point = mount_point.replace('\\040', ' ')
+        if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) and len(mount_point) >= len(best):
+            best, fs_type = mount_point, mount_type
+
+    return fs_type in NETWORK_FS_TYPES
+
+
+class StagedFile:
+    """ Local copy of a job's file """
+    __slots__ = ('source', 'local', 'size', 'mtime_ns', 'job')
+
+    def __init__(self, source: Path, local: Path, size: int, mtime_ns: int, job: ExifJob):
+        self.source = source
+        self.local = local
+        self.size = size
+        self.mtime_ns = mtime_ns
+        # Job writing the local copy
+        self.job = job
+
+
+class Stager:
+    """
+        Copies files from network shares to a local scratch directory and back
+
+        Exiftool rewrites files with many small reads and writes which are latency bound
+        on network shares. Staged files are copied with large sequential reads, written
+        locally and copied back to a temporary file next to the original which atomically
+        replaces it. The write back fails if the original was modified in the meantime.
+
+        The scratch space in use is limited to budget bytes. A batch is staged once its
+        total size fits into the budget, a single batch larger than the budget is staged
+        while nothing else is.
+
+        Files the built-in writers update in place are not staged, patching a few KB of
+        their headers is far cheaper than copying the whole file down and back.
+    """
+    # Read size of the copies from and to the network share
+    chunk_size = 16 * 1024 * 1024
+
+    # Only stage files located on network shares
+    network_only = True
+
+    def __init__(self, budget: int=4 * 1024 ** 3, scratch_dir: str=None, native_write: bool=True):
+        """
+            :param budget: bytes of local scratch space for staged files
+            :param scratch_dir: parent directory of the scratch directory, defaults to the temp directory
+            :param native_write: jobs get written by the built-in writers if possible, see ExifWriter
+        """
+        self.budget = budget
+        self.native_write = native_write
+        self.scratch_dir = tempfile.mkdtemp(prefix='tiffy_staging_', dir=scratch_dir)
+
+        self.used = 0
+        self._budget_changed = threading.Condition()
+        self._network = dict()
+
+        self.staged_bytes = 0
+        self.staged_files = 0
+
+    def needs_staging(self, job: ExifJob) -> bool:
+        if self.native_write and can_write_native(job.file, job.tags, job.dpi):
+            return False
+
+        if not self.network_only:
+            return True
+
+        if job.device not in self._network:
+            self._network[job.device] = is_network_path(job.file)
+            LOGGER.debug('Device %s of %s is a network share: %s', job.device, job.file, self._network[job.device])
+        return self._network[job.device]
+
+    def stage(self, jobs: list) -> dict:
+        """
+            Copy the files of jobs that need staging to the scratch directory. Files that can
+            not be staged are left out and get written in place.
+
+            :returns: ExifJob: StagedFile
+        """
+        jobs = [job for job in jobs if self.needs_staging(job)]
+        if not jobs:
+            return dict()
+
+        reserved = sum(job.size for job in jobs)
+        self._acquire(reserved)
+        staged = dict()
+
+        try:
+            for job in jobs:
+                try:
+                    staged[job] = self._copy_in(job)
+                except OSError as e:
+                    LOGGER.warning('Could not stage %s, writing it in place: %s', job.file, e)
+        finally:
+            # Return the budget of files that were not staged or changed size
+            self._release(reserved - sum(s.size for s in staged.values()))
+
+        return staged
+
+    def _copy_in(self, job: ExifJob) -> StagedFile:
+        local_dir = tempfile.mkdtemp(dir=self.scratch_dir)
+        # Keep the file name, results are reported by name
+        local = Path(local_dir, job.file.name)
+
+        try:
+            with open(job.file, 'rb') as src, open(local, 'wb') as dst:
+                st = os.fstat(src.fileno())
+                copy_range(src.fileno(), dst.fileno(), 0, st.st_size, self.chunk_size)
+        except OSError:
+            shutil.rmtree(local_dir, ignore_errors=True)
+            raise
+
+        local_job = ExifJob(local, job.tags, job.dpi, job.name)
+        local_job.size, local_job.device = st.st_size, job.device
+
+        self.staged_files += 1
+        self.staged_bytes += st.st_size
+        return StagedFile(job.file, local, st.st_size, st.st_mtime_ns, local_job)
+
+    def commit(self, staged: StagedFile):
+        """
+            Atomically replace the original with the written local copy
+
+            :raises StagingError: if the original was modified since it was staged
+        """
+        self._check_unchanged(staged)
+
+        with replace_file(staged.source) as dst, open(staged.local, 'rb') as src:
+            copy_range(src.fileno(), dst.fileno(), 0, os.fstat(src.fileno()).st_size, self.chunk_size)
+            dst.flush()
+            os.fsync(dst.fileno())
+            # Last check right before the rename
+            self._check_unchanged(staged)
+
+    @staticmethod
+    def _check_unchanged(staged: StagedFile):
+        try:
+            st = os.stat(staged.source)
+        except OSError as e:
+            raise StagingError(f'Original file is not accessible: {e}')
+
+        if (st.st_size, st.st_mtime_ns) != (staged.size, staged.mtime_ns):
+            raise StagingError('Original file was modified while it was staged.')
+
+    def release(self, staged_files):
+        """ Delete local copies and return their budget """
+        size = 0
+
+        for staged in staged_files:
+            shutil.rmtree(staged.local.parent, ignore_errors=True)
+            size += staged.size
+
+        self._release(size)
+
+    def _acquire(self, size: int):
+        with self._budget_changed:
+            while self.used and self.used + size > self.budget:
+                self._budget_changed.wait()
+            self.used += size
+
+    def _release(self, size: int):
+        if not size:
+            return
+
+        with self._budget_changed:
+            self.used -= size
+            self._budget_changed.notify_all()
+
+    def close(self):
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+        LOGGER.info('Staged %s files with %s bytes.', self.staged_files, self.staged_bytes)
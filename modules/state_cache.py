@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from modules.app_globals import get_settings_dir
+from modules.exif_job import ExifJob
+from modules.native.common import NativeWriteError
+from modules.native.reader import read_metadata
+from modules.log import init_logging
+
+LOGGER = init_logging(__name__)
+
+STATE_CACHE_FILE = 'tiffy_state.db'
+
+
+class StateCache:
+    """
+        Persistent record of the metadata Tiffy has written
+
+        Every written file is stored with its path, size, mtime, inode and a hash of the
+        applied tags. A file whose stat and payload hash still match on the next run
+        does not need to be read or written again. Least recently used entries are
+        evicted above max_entries.
+    """
+    # Number of files to remember, least recently used entries are evicted above
+    max_entries = 500000
+
+    # Commit pending writes after this many changes
+    commit_interval = 500
+
+    schema = ('CREATE TABLE IF NOT EXISTS files ('
+              'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, '
+              'payload_hash TEXT, payload TEXT, last_used REAL)')
+
+    def __init__(self, db_file: str=None):
+        if db_file is None:
+            settings_dir = get_settings_dir()
+            if not settings_dir:
+                raise OSError('No settings directory available for the state cache.')
+            db_file = os.path.join(settings_dir, STATE_CACHE_FILE)
+
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._hits = list()
+
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(self.schema)
+        self.conn.execute('CREATE INDEX IF NOT EXISTS files_last_used ON files (last_used)')
+        self.conn.commit()
+
+    @staticmethod
+    def _key(file: Path) -> str:
+        return Path(os.path.abspath(file)).as_posix()
+
+    @staticmethod
+    def _payload(tags: dict, dpi: dict) -> str:
+        return json.dumps({'tags': {k: f'{v}' for k, v in (tags or dict()).items()},
+                           'dpi': {k: f'{v}' for k, v in (dpi or dict()).items()}}, sort_keys=True)
+
+    @classmethod
+    def payload_hash(cls, tags: dict, dpi: dict) -> str:
+        return hashlib.sha256(cls._payload(tags, dpi).encode('utf-8')).hexdigest()
+
+    def is_current(self, file: Path, tags: dict, dpi: dict) -> bool:
+        """ Return True if file is unmodified since tags and dpi were written to it """
+        key = self._key(file)
+
+        with self._lock:
+            row = self.conn.execute('SELECT size, mtime_ns, inode, payload_hash FROM files WHERE path=?',
+                                    (key,)).fetchone()
+        if not row:
+            return False
+
+        try:
+            st = os.stat(file)
+        except OSError:
+            return False
+
+        if row != (st.st_size, st.st_mtime_ns, st.st_ino, self.payload_hash(tags, dpi)):
+            return False
+
+        with self._lock:
+            self._hits.append(key)
+        return True
+
+    def store(self, file: Path, tags: dict, dpi: dict):
+        """ Record that file currently contains tags and dpi """
+        try:
+            st = os.stat(file)
+        except OSError as e:
+            LOGGER.debug('Could not stat %s for the state cache: %s', file, e)
+            return
+
+        payload = self._payload(tags, dpi)
+        payload_hash = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+        with self._lock:
+            self.conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)',
+                              (self._key(file), st.st_size, st.st_mtime_ns, st.st_ino, payload_hash, payload,
+                               time.time()))
+            self._changed()
+
+    def discard(self, file: Path):
+        with self._lock:
+            self.conn.execute('DELETE FROM files WHERE path=?', (self._key(file),))
+            self._changed()
+
+    def _changed(self):
+        self._pending += 1
+        if self._pending >= self.commit_interval:
+            self.conn.commit()
+            self._pending = 0
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+    def evict(self) -> int:
+        """ Remove least recently used entries above max_entries, returns the number of removed entries """
+        with self._lock:
+            count = self.conn.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+            excess = count - self.max_entries
+            if excess <= 0:
+                return 0
+
+            self.conn.execute('DELETE FROM files WHERE path IN '
+                              '(SELECT path FROM files ORDER BY last_used ASC LIMIT ?)', (excess,))
+            self.conn.commit()
+
+        LOGGER.info('Evicted %s entries from the state cache.', excess)
+        return excess
+
+    def flush(self):
+        """ Write pending changes and last used times of cache hits """
+        with self._lock:
+            if self._hits:
+                now = time.time()
+                self.conn.executemany('UPDATE files SET last_used=? WHERE path=?', ((now, k) for k in self._hits))
+                self._hits = list()
+            self.conn.commit()
+            self._pending = 0
+
+    def verify(self, progress_callback=None) -> (int, int):
+        """
+            Remove entries of files that were deleted, modified or no longer contain the recorded
+            values. The values are read from the file headers, files that can not be read natively
+            are only checked by stat.
+
+            :param progress_callback: optional callable receiving (checked, total)
+            :returns: number of checked entries, number of removed entries
+        """
+        self.flush()
+
+        with self._lock:
+            rows = self.conn.execute('SELECT path, size, mtime_ns, inode, payload FROM files').fetchall()
+
+        stale = list()
+
+        for idx, (path, size, mtime_ns, inode, payload) in enumerate(rows):
+            file = Path(path)
+
+            try:
+                st = os.stat(file)
+                valid = (st.st_size, st.st_mtime_ns, st.st_ino) == (size, mtime_ns, inode)
+            except OSError:
+                valid = False
+
+            if valid:
+                payload = json.loads(payload)
+                try:
+                    valid = ExifJob(file, payload['tags'], payload['dpi']).matches(read_metadata(file))
+                except (NativeWriteError, OSError, ValueError):
+                    # Stat already matched, leave files the native reader does not support alone
+                    pass
+
+            if not valid:
+                stale.append((path,))
+
+            if progress_callback:
+                progress_callback(idx + 1, len(rows))
+
+        with self._lock:
+            self.conn.executemany('DELETE FROM files WHERE path=?', stale)
+            self.conn.commit()
+
+        LOGGER.info('Verified state cache: %s entries checked, %s removed.', len(rows), len(stale))
+        return len(rows), len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute('DELETE FROM files')
+            self.conn.commit()
+            self._hits = list()
+
+    def close(self):
+        self.flush()
+        self.evict()
+        with self._lock:
+            self.conn.close()
@@ -1,12 +1,13 @@
 import time
 from pathlib import Path
 
-from PyQt5.QtCore import QEvent, Qt, QObject
+from PyQt5.QtCore import QEvent, Qt, QObject, QThread, pyqtSignal
 from PyQt5 import QtWidgets
 
 from modules import TiffySettings
 from modules.exif_worker import Exif
 from modules.app_read_excel import OpenExcel
+from modules.state_cache import StateCache
 from modules.gui.gui_utils import ConnectCall
 from modules.gui.icon_resource import IconRsc
 from modules.detect_language import get_translation
@@ -20,12 +21,28 @@ lang.install()
 _ = lang.gettext
 
 
+class StateCacheVerifier(QThread):
+    verified = pyqtSignal(int, int)
+
+    def run(self):
+        try:
+            cache = StateCache()
+            checked, removed = cache.verify()
+            cache.close()
+        except Exception as e:
+            LOGGER.error('Could not verify state cache: %s', e)
+            checked, removed = 0, 0
+
+        self.verified.emit(checked, removed)
+
+
 class FileMenu(QObject):
 
     def __init__(self, ui: QtWidgets.QMainWindow, menu: QtWidgets.QMenu=None):
         super(FileMenu, self).__init__(parent=ui)
         self.ui = ui
         self.img_viewer = None
+        self.cache_verifier = None
         self.menu = menu or ui.menuDatei
         self.recent_menu = QtWidgets.QMenu(_('Zuletzt geöffnet'), self.menu)
 
@@ -49,6 +66,14 @@ class FileMenu(QObject):
         self.recent_menu.aboutToShow.connect(self.update_recent_files_menu)
         self.menu.addMenu(self.recent_menu)
 
+        # ---- State cache ----
+        self.verify_cache_action = QtWidgets.QAction(IconRsc.get_icon('refresh'), _('Zwischenspeicher prüfen'),
+                                                     self.menu)
+        self.verify_cache_action.triggered.connect(self.verify_state_cache)
+        self.menu.addAction(self.verify_cache_action)
+
+        self.menu.addSeparator()
+
         # ---- Exit ----
         action_exit = QtWidgets.QAction(IconRsc.get_icon('close'), _("Beenden"), self)
         action_exit.triggered.connect(self.ui.close)
@@ -60,6 +85,23 @@ class FileMenu(QObject):
 
         self.recent_menu.setEnabled(enabled)
 
+    def verify_state_cache(self):
+        if self.cache_verifier and self.cache_verifier.isRunning():
+            return
+
+        self.verify_cache_action.setEnabled(False)
+        self.ui.statusBar().showMessage(_('Zwischenspeicher wird geprüft ...'))
+
+        self.cache_verifier = StateCacheVerifier(self)
+        self.cache_verifier.verified.connect(self.state_cache_verified)
+        self.cache_verifier.start()
+
+    def state_cache_verified(self, checked: int, removed: int):
+        self.verify_cache_action.setEnabled(True)
+        self.ui.statusBar().showMessage(
+            _('Zwischenspeicher geprüft: {0} Einträge, {1} veraltete Einträge entfernt.').format(checked, removed),
+            8000)
+
     def update_recent_files_menu(self):
         self.recent_menu.clear()
 
@@ -0,0 +1,56 @@
+from PyQt5.QtWidgets import QMenu, QAction
+
+from modules.gui.icon_resource import IconRsc
+from modules.detect_language import get_translation
+from modules.log import init_logging
+
+LOGGER = init_logging(__name__)
+
+# translate strings
+lang = get_translation()
+lang.install()
+_ = lang.gettext
+
+
+class RunMenu(QMenu):
+    """ Pause, cancel and resume the image process """
+    def __init__(self, ui):
+        super(RunMenu, self).__init__(_('Vorgang'), ui)
+        self.ui = ui
+
+        self.pause_action = QAction(_('Pausieren'), self)
+        self.pause_action.setCheckable(True)
+        self.pause_action.toggled.connect(self.pause)
+        self.addAction(self.pause_action)
+
+        self.cancel_action = QAction(IconRsc.get_icon('close'), _('Abbrechen'), self)
+        self.cancel_action.triggered.connect(self.cancel)
+        self.addAction(self.cancel_action)
+
+        self.addSeparator()
+
+        self.resume_action = QAction(IconRsc.get_icon('refresh'), _('Letzten Vorgang fortsetzen'), self)
+        self.resume_action.triggered.connect(self.resume_last_run)
+        self.addAction(self.resume_action)
+
+        self.aboutToShow.connect(self.update_actions)
+
+    def update_actions(self):
+        running = self.ui.img_app.is_running()
+
+        self.pause_action.setEnabled(running)
+        self.pause_action.blockSignals(True)
+        self.pause_action.setChecked(self.ui.img_app.is_paused())
+        self.pause_action.blockSignals(False)
+
+        self.cancel_action.setEnabled(running)
+        self.resume_action.setEnabled(not running)
+
+    def pause(self, paused: bool):
+        self.ui.img_app.pause_exif_worker(paused)
+
+    def cancel(self):
+        self.ui.img_app.cancel_exif_worker()
+
+    def resume_last_run(self):
+        self.ui.img_app.resume_last_run()
@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+# Application modules must not set up the GUI logging
+os.environ.setdefault('TIFFY_HEADLESS', '1')
+
+from modules.app_globals import get_exif_executable
+from modules.exiftool import ExifTool
+
+EXIFTOOL_AVAILABLE = bool(shutil.which(get_exif_executable()) or Path(get_exif_executable()).is_file())
+
+
+@unittest.skipUnless(EXIFTOOL_AVAILABLE, 'exiftool not available')
+class ExifToolTestCase(unittest.TestCase):
+    """ Writes files to a temporary directory and verifies them with exiftool """
+    @classmethod
+    def setUpClass(cls):
+        cls.et = ExifTool(get_exif_executable())
+        cls.et.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.et.terminate()
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix='tiffy_test_'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir.as_posix(), ignore_errors=True)
+
+    def read(self, file: Path, *params) -> dict:
+        """ Metadata read by exiftool as group:tag: value, params default to all XMP tags """
+        metadata = self.et.execute_json(*(params or ('-XMP:all',)), file.as_posix())[0]
+        metadata.pop('SourceFile')
+        return metadata
+
+    def validate(self, file: Path) -> dict:
+        """ Result of exiftool -validate, number of errors, warnings and minor warnings plus the warnings """
+        return self.read(file, '-validate', '-warning', '-error', '-a')
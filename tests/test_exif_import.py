@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+# Application modules must not set up the GUI logging
+os.environ.setdefault('TIFFY_HEADLESS', '1')
+
+from modules.app_globals import get_exif_executable
+from modules.exif_import import ExifImport
+from modules.exif_job import ExifJob
+from modules.exif_result import ExifResult
+
+# Directory name containing the ' - ' separator of exiftool messages
+BOX_DIR = 'Box 3 - 1998'
+
+
+def _tiff(path: Path):
+    """ Minimal uncompressed 1x1 pixel TIFF """
+    entries = [(256, 3, 1), (257, 3, 1), (258, 3, 8), (259, 3, 1), (262, 3, 1), (273, 4, 8 + 2 + 8 * 12 + 4),
+               (278, 3, 1), (279, 4, 1)]
+    data = bytearray(b'II*\x00\x08\x00\x00\x00') + len(entries).to_bytes(2, 'little')
+
+    for tag, typ, value in entries:
+        data += tag.to_bytes(2, 'little') + typ.to_bytes(2, 'little') + (1).to_bytes(4, 'little')
+        data += value.to_bytes(4, 'little')
+
+    path.write_bytes(bytes(data + b'\x00\x00\x00\x00\x80'))
+
+
+class ParseOutputTest(unittest.TestCase):
+    def setUp(self):
+        self.jobs = [ExifJob(Path(f'/archive/{BOX_DIR}/{name}'), {'Title': 'Lorem'}, name=f'{BOX_DIR}/{name}')
+                     for name in ('ok.tif', 'bad.tif', 'same.tif')]
+        self.paths = [job.file.as_posix() for job in self.jobs]
+
+    def test_error_of_path_with_separator(self):
+        stdout = ''.join(f'======== {path}\n' for path in self.paths) + \
+            f'Nothing changed in {self.paths[2]}\n' \
+            '    1 image files updated\n    1 image files unchanged\n    1 files weren\'t updated due to errors\n'
+        stderr = f'Error: Bad IFD or truncated file in IFD0 - {self.paths[1]}\n'
+
+        ok, bad, same = ExifImport.parse_output(self.jobs, stdout, stderr)
+
+        self.assertEqual(ok.status, ExifResult.UPDATED)
+        self.assertEqual(bad.status, ExifResult.FAILED)
+        self.assertEqual(bad.errors, ('Error: Bad IFD or truncated file in IFD0',))
+        self.assertEqual(bad.file, f'{BOX_DIR}/bad.tif')
+        self.assertEqual(same.status, ExifResult.UNCHANGED)
+
+    def test_warning_of_longest_matching_path(self):
+        jobs = [ExifJob(Path('/archive/1998/a.tif')), ExifJob(Path('/archive - x/1998/a.tif'))]
+        stdout = ''.join(f'======== {job.file.as_posix()}\n' for job in jobs) + '    2 image files updated\n'
+        stderr = 'Warning: Lorem - ipsum - /archive - x/1998/a.tif\n'
+
+        short, long = ExifImport.parse_output(jobs, stdout, stderr)
+
+        self.assertEqual(short.warnings, ())
+        self.assertEqual(long.warnings, ('Warning: Lorem - ipsum',))
+
+
+@unittest.skipUnless(shutil.which(get_exif_executable()) or Path(get_exif_executable()).is_file(),
+                     'exiftool not available')
+class ImportTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='tiffy_test_')
+        self.box_dir = Path(self.tmp_dir, BOX_DIR)
+        self.box_dir.mkdir()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_corrupt_file_in_directory_with_separator(self):
+        _tiff(self.box_dir / 'ok.tif')
+        (self.box_dir / 'bad.tif').write_bytes((self.box_dir / 'ok.tif').read_bytes()[:40])
+
+        jobs = [ExifJob(self.box_dir / name, {'Title': 'Lorem'}) for name in ('ok.tif', 'bad.tif')]
+        results = {result.file: result for result in ExifImport().run(jobs)}
+
+        self.assertEqual(results['ok.tif'].status, ExifResult.UPDATED)
+        self.assertEqual(results['bad.tif'].status, ExifResult.FAILED)
+
+
+if __name__ == '__main__':
+    unittest.main()
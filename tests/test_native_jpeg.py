@@ -0,0 +1,155 @@
+import struct
+import unittest
+from io import BytesIO
+from pathlib import Path
+
+from tests.helpers import ExifToolTestCase
+
+from modules.exif_job import ExifJob
+from modules.exif_writer import ExifWriter
+from modules.native import jpeg
+from modules.native.common import NativeWriteError
+from modules.native.xmp import NS_DC, build_packet, read_properties
+
+TAGS = {'Title': 'Brief an Anna', 'Creator': 'Müller', 'Description': 'Box 3 - 1998 <gefaltet> & "fleckig"',
+        'Subject': 'Korrespondenz', 'Rights': 'Stadtarchiv'}
+
+XMP_START = '<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+XMP_END = '</rdf:RDF></x:xmpmeta>'
+
+# Scan data including stuffed bytes, restart and end of image markers
+SCAN_DATA = b'\x00\x12\xff\x00\x34\xff\xd0\x56' * 64 + b'\xff\xd9'
+
+
+def _segment(marker: int, data: bytes) -> bytes:
+    return struct.pack('>BBH', 0xFF, marker, len(data) + 2) + data
+
+
+def _xmp_segment(xml: str) -> bytes:
+    return _segment(jpeg.APP1, jpeg.XMP_SIGNATURE + xml.encode('utf-8'))
+
+
+def _jpeg(path: Path, *segments: bytes) -> bytes:
+    """ Minimal 1x1 pixel baseline JPEG with segments behind the JFIF segment """
+    header = jpeg.SOI + _segment(jpeg.APP0, b'JFIF\x00\x01\x01\x01\x00\x48\x00\x48\x00\x00') + b''.join(segments)
+    header += _segment(0xDB, b'\x00' + b'\x01' * 64) + _segment(0xC0, b'\x08\x00\x01\x00\x01\x01\x01\x11\x00')
+    header += _segment(0xC4, b'\x00\x01' + b'\x00' * 16) + _segment(0xC4, b'\x10\x01' + b'\x00' * 16)
+
+    data = header + _segment(jpeg.SOS, b'\x01\x01\x00\x00\x3f\x00') + SCAN_DATA
+    path.write_bytes(data)
+    return data
+
+
+def _scan(data: bytes) -> bytes:
+    """ Bytes from the start of scan marker to the end of the file """
+    _segments, scan_offset = jpeg.read_header(BytesIO(data))
+    return data[scan_offset:]
+
+
+class BuildPacketTest(unittest.TestCase):
+    def test_new_packet(self):
+        packet = build_packet(None, TAGS, padding=0)
+
+        self.assertEqual(read_properties(packet), TAGS)
+        self.assertIn(b'<dc:title>', packet)
+
+    def test_exact_size(self):
+        existing = build_packet(None, {'Title': 'Lorem'})
+        packet = build_packet(existing, {'Title': 'Ipsum'}, size=len(existing))
+
+        self.assertEqual(len(packet), len(existing))
+        self.assertEqual(read_properties(packet), {'Title': 'Ipsum'})
+        self.assertRaises(NativeWriteError, build_packet, existing, {'Title': 'x' * len(existing)}, size=len(existing))
+
+    def test_prefixes_of_other_packets_are_not_used(self):
+        # Binds the dc prefix to another namespace
+        existing = f'{XMP_START}<rdf:Description rdf:about="" xmlns:dc="http://example.com/dc/" ' \
+            f'xmlns:my="{NS_DC}" dc:Box="3"></rdf:Description>{XMP_END}'.encode('utf-8')
+
+        packet = build_packet(existing, {'Title': 'Lorem'}, padding=0)
+        self.assertIn(b'<my:title>', packet)
+        self.assertIn(b'dc:Box="3"', packet)
+        self.assertEqual(read_properties(packet), {'Title': 'Lorem'})
+
+        self.assertIn(b'<dc:title>', build_packet(None, {'Title': 'Lorem'}, padding=0))
+
+    def test_extended_xmp(self):
+        existing = f'{XMP_START}<rdf:Description rdf:about="" xmlns:xmpNote="http://ns.adobe.com/xmp/note/" ' \
+            f'xmpNote:HasExtendedXMP="0123456789ABCDEF0123456789ABCDEF"/>{XMP_END}'.encode('utf-8')
+
+        self.assertRaises(NativeWriteError, build_packet, existing, {'Title': 'Lorem'})
+
+
+class WriteXmpTest(ExifToolTestCase):
+    def assertXmp(self, file: Path, expected: dict):
+        metadata = self.read(file)
+        self.assertEqual({tag: metadata.get(f'XMP:{tag}') for tag in expected}, expected)
+
+    def test_new_packet(self):
+        file = self.tmp_dir / 'new.jpg'
+        original = _jpeg(file)
+
+        jpeg.write_xmp(file, TAGS)
+
+        self.assertXmp(file, TAGS)
+        self.assertEqual(self.validate(file)['ExifTool:Validate'], '0 0 0')
+        self.assertEqual(_scan(file.read_bytes()), _scan(original))
+
+    def test_existing_packet(self):
+        file = self.tmp_dir / 'existing.jpg'
+        _jpeg(file)
+        self.et.execute(b'-overwrite_original', b'-EXIF:Artist=Anna', b'-XMP-dc:Title=Alt',
+                        b'-XMP-dc:Title-de=Titel', b'-XMP-dc:Subject=Brief', b'-XMP-tiff:Make=Nikon',
+                        file.as_posix().encode())
+        original = file.read_bytes()
+
+        jpeg.write_xmp(file, {'Title': 'Neu', 'Subject': 'Karte'})
+
+        metadata = self.read(file, '-XMP:all', '-EXIF:Artist')
+        self.assertEqual(metadata['XMP:Title'], 'Neu')
+        self.assertEqual(metadata['XMP:Title-de'], 'Titel')
+        self.assertEqual(metadata['XMP:Subject'], 'Karte')
+        self.assertEqual(metadata['XMP:Make'], 'Nikon')
+        self.assertEqual(metadata['EXIF:Artist'], 'Anna')
+        self.assertEqual(self.validate(file)['ExifTool:Validate'], '0 0 0')
+        self.assertEqual(_scan(file.read_bytes()), _scan(original))
+
+    def test_foreign_prefixes(self):
+        file = self.tmp_dir / 'prefixes.jpg'
+        original = _jpeg(file, _xmp_segment(
+            f'{XMP_START}<rdf:Description rdf:about="" xmlns:dc="http://ns.adobe.com/tiff/1.0/" '
+            f'xmlns:my="{NS_DC}" dc:Make="Nikon">'
+            f'<my:title><rdf:Alt><rdf:li xml:lang="x-default">Alt</rdf:li></rdf:Alt></my:title>'
+            f'</rdf:Description>{XMP_END}'))
+
+        jpeg.write_xmp(file, {'Title': 'Neu'})
+
+        metadata = self.read(file)
+        self.assertEqual(metadata['XMP:Title'], 'Neu')
+        self.assertEqual(metadata['XMP:Make'], 'Nikon')
+        self.assertEqual(_scan(file.read_bytes()), _scan(original))
+
+    def test_extended_xmp_falls_back(self):
+        file = self.tmp_dir / 'extended.jpg'
+        guid = b'0123456789ABCDEF0123456789ABCDEF'
+        extended = b'<x:xmpmeta xmlns:x="adobe:ns:meta/"/>'
+        original = _jpeg(file, _xmp_segment(
+            f'{XMP_START}<rdf:Description rdf:about="" xmlns:xmpNote="http://ns.adobe.com/xmp/note/" '
+            f'xmpNote:HasExtendedXMP="{guid.decode()}"/>{XMP_END}'),
+            _segment(jpeg.APP1, jpeg.EXTENDED_XMP_SIGNATURE + guid + struct.pack('>II', len(extended), 0) + extended))
+
+        self.assertRaises(NativeWriteError, jpeg.write_xmp, file, {'Title': 'Lorem'})
+        self.assertEqual(file.read_bytes(), original)
+
+    def test_oversized_packet_falls_back(self):
+        file = self.tmp_dir / 'oversized.jpg'
+        original = _jpeg(file)
+        tags = {'Description': 'Lorem ipsum ' * 6000}
+
+        self.assertRaises(NativeWriteError, jpeg.write_xmp, file, tags)
+        self.assertEqual(file.read_bytes(), original)
+        self.assertIsNone(ExifWriter.write_native(ExifJob(file, tags), 0.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,214 @@
+import struct
+import unittest
+from pathlib import Path
+
+from tests.helpers import ExifToolTestCase
+
+from modules.native import tiff
+from modules.native.common import CorruptFileError, NativeWriteError
+from modules.native.xmp import build_packet
+
+WIDTH = HEIGHT = 8
+
+# Pixel data with a distinct value per pixel
+PIXELS = bytes(range(WIDTH * HEIGHT))
+
+# Does not fit into the padding of a packet
+DESCRIPTION = ' '.join(['Lorem ipsum'] * 300)
+
+# Byte order, BigTIFF
+FORMATS = (('<', False), ('>', False), ('<', True), ('>', True))
+
+
+def _tiff(path: Path, byte_order: str='<', big: bool=False, xmp: bytes=None, resolution_type: int=tiff.RATIONAL,
+          shared_resolution: bool=False, y_resolution: bool=True) -> bytes:
+    """
+        Uncompressed 8x8 pixel grayscale TIFF with one strip of PIXELS, values are placed
+        in front of the first directory
+
+        :param resolution_type: TIFF type of the resolution tags, LONG or RATIONAL
+        :param shared_resolution: X and Y resolution point to the same value
+        :param y_resolution: add the YResolution tag
+    """
+    header_size = 16 if big else 8
+    data = bytearray(header_size) + PIXELS
+    resolution = struct.pack(f'{byte_order}II', 300, 1)
+
+    def value(raw: bytes) -> int:
+        if len(data) % 2:
+            data.append(0)
+        data.extend(raw)
+        return len(data) - len(raw)
+
+    if resolution_type != tiff.RATIONAL:
+        x_offset = y_offset = 300
+    elif big:
+        # BigTIFF directory entries hold RATIONALs inline
+        x_offset = y_offset = struct.unpack(f'{byte_order}Q', resolution)[0]
+    else:
+        x_offset = value(resolution)
+        y_offset = x_offset if shared_resolution else value(resolution)
+
+    # Tag, type, count, inline value or offset
+    entries = [(256, tiff.SHORT, 1, WIDTH), (257, tiff.SHORT, 1, HEIGHT), (258, tiff.SHORT, 1, 8),
+               (259, tiff.SHORT, 1, 1), (262, tiff.SHORT, 1, 1), (273, tiff.LONG, 1, header_size),
+               (277, tiff.SHORT, 1, 1), (278, tiff.SHORT, 1, HEIGHT), (279, tiff.LONG, 1, len(PIXELS)),
+               (tiff.TAG_X_RESOLUTION, resolution_type, 1, x_offset), (tiff.TAG_RESOLUTION_UNIT, tiff.SHORT, 1, 2)]
+    if y_resolution:
+        entries.insert(-1, (tiff.TAG_Y_RESOLUTION, resolution_type, 1, y_offset))
+    if xmp is not None:
+        entries.append((tiff.TAG_XMP, tiff.UNDEFINED, len(xmp), value(xmp)))
+
+    value_format = 'Q' if big else 'I'
+    value_size = struct.calcsize(value_format)
+    ifd_offset = value(b'')
+
+    data += struct.pack(f'{byte_order}{"Q" if big else "H"}', len(entries))
+    for tag, type_, count, value_ in entries:
+        data += struct.pack(f'{byte_order}HH{value_format}', tag, type_, count)
+        if type_ == tiff.SHORT:
+            data += struct.pack(f'{byte_order}H', value_).ljust(value_size, b'\x00')
+        elif type_ == tiff.LONG:
+            data += struct.pack(f'{byte_order}I', value_).ljust(value_size, b'\x00')
+        else:
+            data += struct.pack(f'{byte_order}{value_format}', value_)
+    data += bytes(value_size)
+
+    order = b'II' if byte_order == '<' else b'MM'
+    if big:
+        data[:16] = order + struct.pack(f'{byte_order}HHHQ', 43, 8, 0, ifd_offset)
+    else:
+        data[:8] = order + struct.pack(f'{byte_order}HI', 42, ifd_offset)
+
+    path.write_bytes(bytes(data))
+    return bytes(data)
+
+
+class TiffTestCase(ExifToolTestCase):
+    def assertPixelsUnchanged(self, file: Path):
+        """ Strip located by exiftool contains the original pixel data """
+        metadata = self.read(file, '-StripOffsets', '-StripByteCounts')
+        offset, count = metadata['EXIF:StripOffsets'], metadata['EXIF:StripByteCounts']
+        self.assertEqual(file.read_bytes()[offset:offset + count], PIXELS)
+
+    def assertValid(self, file: Path, original: dict):
+        """ Exiftool -validate finds no problems beyond those of the original file """
+        self.assertEqual(self.validate(file), original)
+
+
+class WriteXmpTest(TiffTestCase):
+    def _write(self, byte_order: str, big: bool, xmp: bytes=None, tags: dict=None) -> (Path, bytes):
+        file = self.tmp_dir / f'{"big" if big else "classic"}_{"II" if byte_order == "<" else "MM"}.tif'
+        original = _tiff(file, byte_order, big, xmp)
+        validation = self.validate(file)
+
+        tiff.write_xmp(file, tags or {'Title': 'Brief an Anna', 'Subject': 'Korrespondenz'})
+
+        self.assertPixelsUnchanged(file)
+        self.assertValid(file, validation)
+        return file, original
+
+    def test_in_place(self):
+        existing = build_packet(None, {'Title': 'Alt', 'Creator': 'Müller'})
+
+        for byte_order, big in FORMATS:
+            with self.subTest(byte_order=byte_order, big=big):
+                file, original = self._write(byte_order, big, existing)
+
+                data = file.read_bytes()
+                self.assertEqual(len(data), len(original))
+                # Only the packet changed
+                start = original.index(existing)
+                self.assertEqual(data[:start], original[:start])
+                self.assertEqual(data[start + len(existing):], original[start + len(existing):])
+
+                metadata = self.read(file)
+                self.assertEqual(metadata['XMP:Title'], 'Brief an Anna')
+                self.assertEqual(metadata['XMP:Subject'], 'Korrespondenz')
+                self.assertEqual(metadata['XMP:Creator'], 'Müller')
+
+    def test_append(self):
+        existing = build_packet(None, {'Title': 'Alt', 'Creator': 'Müller'}, padding=0)
+
+        for byte_order, big in FORMATS:
+            with self.subTest(byte_order=byte_order, big=big):
+                file, original = self._write(byte_order, big, existing, {'Description': DESCRIPTION})
+
+                data = file.read_bytes()
+                self.assertGreater(len(data), len(original))
+                # Old packet is left as it was, the new one is appended
+                self.assertIn(existing, data[:len(original)])
+
+                metadata = self.read(file)
+                self.assertEqual(metadata['XMP:Description'], DESCRIPTION)
+                self.assertEqual(metadata['XMP:Creator'], 'Müller')
+
+                # Written with padding, the next update fits in place
+                tiff.write_xmp(file, {'Title': 'Neu'})
+                self.assertEqual(len(file.read_bytes()), len(data))
+                self.assertEqual(self.read(file)['XMP:Title'], 'Neu')
+
+    def test_relocate_directory(self):
+        for byte_order, big in FORMATS:
+            with self.subTest(byte_order=byte_order, big=big):
+                file, original = self._write(byte_order, big)
+
+                data = file.read_bytes()
+                # Everything but the directory pointer of the header is kept
+                pointer_offset = 8 if big else 4
+                self.assertEqual(data[:pointer_offset], original[:pointer_offset])
+                self.assertEqual(data[pointer_offset + (8 if big else 4):len(original)],
+                                 original[pointer_offset + (8 if big else 4):])
+
+                metadata = self.read(file, '-XMP:all', '-XResolution', '-ResolutionUnit')
+                self.assertEqual(metadata['XMP:Title'], 'Brief an Anna')
+                self.assertEqual(metadata['XMP:Subject'], 'Korrespondenz')
+                self.assertEqual(metadata['EXIF:XResolution'], 300)
+                self.assertEqual(metadata['EXIF:ResolutionUnit'], 2)
+
+
+class WriteDpiTest(TiffTestCase):
+    dpi = {'ResolutionUnit': '3', 'XResolution': '118,11', 'YResolution': '236.22'}
+
+    def test_to_rational(self):
+        self.assertEqual(tiff.to_rational('118,11'), (11811, 100))
+        self.assertEqual(tiff.to_rational(' 300.00 '), (300, 1))
+        self.assertEqual(tiff.to_rational(72), (72, 1))
+        for value in ('', 'abc', '0', '-300', '1/0'):
+            self.assertRaises(NativeWriteError, tiff.to_rational, value)
+
+    def test_write(self):
+        for byte_order, big in FORMATS:
+            with self.subTest(byte_order=byte_order, big=big):
+                file = self.tmp_dir / f'{"big" if big else "classic"}_{"II" if byte_order == "<" else "MM"}.tif'
+                original = _tiff(file, byte_order, big)
+                validation = self.validate(file)
+
+                tiff.write_dpi(file, self.dpi)
+
+                metadata = self.read(file, '-ResolutionUnit', '-XResolution', '-YResolution')
+                self.assertEqual(metadata, {'EXIF:ResolutionUnit': 3, 'EXIF:XResolution': 118.11,
+                                            'EXIF:YResolution': 236.22})
+                self.assertEqual(len(file.read_bytes()), len(original))
+                self.assertPixelsUnchanged(file)
+                self.assertValid(file, validation)
+
+    def test_fallbacks(self):
+        files = {'missing': dict(y_resolution=False), 'long': dict(resolution_type=tiff.LONG),
+                 'shared': dict(shared_resolution=True)}
+
+        for name, kwargs in files.items():
+            with self.subTest(name):
+                file = self.tmp_dir / f'{name}.tif'
+                original = _tiff(file, **kwargs)
+
+                with self.assertRaises(NativeWriteError) as context:
+                    tiff.write_dpi(file, self.dpi)
+
+                # Left to exiftool instead of failing as damaged
+                self.assertNotIsInstance(context.exception, CorruptFileError)
+                self.assertEqual(file.read_bytes(), original)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,6 +7,7 @@ from modules.gui.gui_utils import GuiExceptionHook
 from modules.log import init_logging, setup_log_queue_listener
 from modules.settings import TiffySettings
 from modules.gui.main_app import MainApp
+from modules.exif_pool import ExifToolPool
 
 VERSION = '0.75'
 
@@ -74,6 +75,7 @@ def main():
     # ---- Application Result ----
     LOGGER.debug('---------------------------------------')
     LOGGER.debug('Qt application finished with exitcode %s', result)
+    ExifToolPool.close_shared()
     TiffySettings.save()
     #
     #
@@ -0,0 +1,15 @@
+"""
+    Command line entry point running without a display, see modules.cli
+
+        python tiffy_cli.py --xlsx list.xlsx --images /archive/box_01 --map title=K --dpi 300
+"""
+import os
+import sys
+
+# Has to be set before any application module is imported
+os.environ['TIFFY_HEADLESS'] = '1'
+
+from modules.cli import main
+
+if __name__ == '__main__':
+    sys.exit(main())